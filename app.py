@@ -1,10 +1,16 @@
 """Flask API server for the YSJ Student Chatbot."""
 
 import os
-from flask import Flask, send_from_directory, request, jsonify
+import json
+import threading
+from flask import Flask, Response, send_from_directory, request, jsonify, stream_with_context
 from pathlib import Path
 from dotenv import load_dotenv
 from src.chatbot import YSJChatbot
+from src.session_store import SESSION_COOKIE, resolve_session_id
+from src.jobs import JobQueue, create_worker
+from src.manifest import raw_data_dir
+from src.metrics import REGISTRY, trace
 
 # Load environment variables
 load_dotenv()
@@ -12,8 +18,63 @@ load_dotenv()
 app = Flask(__name__, static_folder='frontend/build')
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-key-for-ysj-chatbot')
 
-# Initialize the chatbot
-chatbot = YSJChatbot()
+# Uploads are ingested in the background; run `python -m src.jobs` instead with INGEST_WORKER=external
+external_worker = os.getenv('INGEST_WORKER', 'thread') == 'external'
+
+def check_server_workers(workers):
+    """Refuse to run several server processes that would each write the index files."""
+    if workers > 1 and not external_worker:
+        raise RuntimeError(
+            f"{workers} server workers would each own a writable index and overwrite each other's "
+            "documents. Set INGEST_WORKER=external and run `python -m src.jobs` alongside them."
+        )
+
+# GUNICORN_WORKERS is read by gunicorn.conf.py and WEB_CONCURRENCY by uvicorn
+check_server_workers(int(os.getenv('GUNICORN_WORKERS') or os.getenv('WEB_CONCURRENCY') or '1'))
+
+# Initialize the chatbot (retriever, embedder and LLM are shared by all sessions).
+# Without a local worker, the index is served from the shared snapshot the worker publishes.
+chatbot = YSJChatbot(read_only=external_worker)
+
+# Opened per process on first use, so a preloading server can fork safely
+jobs = None
+ingestion_worker = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+def get_jobs():
+    """This process's connection to the ingestion job queue."""
+    start_ingestion_worker()
+    return jobs
+
+def start_ingestion_worker():
+    """Open the job queue and, unless INGEST_WORKER=external, start the worker thread (once per process)."""
+    global jobs, ingestion_worker, _worker_pid
+    if _worker_pid == os.getpid():
+        return
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        jobs = JobQueue(os.getenv('JOB_DB', 'data/processed/jobs.sqlite'))
+        ingestion_worker = None
+        if not external_worker:
+            ingestion_worker = create_worker(chatbot.rag_pipeline, jobs).start()
+        _worker_pid = os.getpid()
+
+@app.before_request
+def ensure_ingestion_worker():
+    """Start this process's ingestion worker if the server did not already."""
+    start_ingestion_worker()
+
+def get_session_id(data=None):
+    """Session from the request body's ``session_id`` or the session cookie, if any."""
+    return resolve_session_id((data or {}).get('session_id'), request.cookies.get(SESSION_COOKIE))
+
+def with_session_cookie(response, session_id):
+    """Issue the session cookie to clients that did not send one."""
+    if request.cookies.get(SESSION_COOKIE) != session_id:
+        response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax')
+    return response
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -24,13 +85,59 @@ def chat():
     if not message:
         return jsonify({'error': 'Message cannot be empty'}), 400
     
-    # Get response from chatbot
-    response = chatbot.chat(message)
+    # Optional metadata filter for retrieval, e.g. {"department": "Computing", "year": {"gte": 2024}}
+    filters = data.get('filters') or None
+    if filters is not None and not isinstance(filters, dict):
+        return jsonify({'error': 'filters must be an object'}), 400
     
-    return jsonify({
+    session_id = get_session_id(data) or chatbot.sessions.new_session_id()
+    
+    # Get response from chatbot; with "timings": true the response says where the time went
+    with trace('chat', breakdown=bool(data.get('timings'))) as request_trace:
+        response = chatbot.chat(message, session_id, filters=filters)
+    
+    payload = {
         'response': response,
-        'history': chatbot.get_chat_history()
-    })
+        'session_id': session_id,
+        'history': chatbot.get_chat_history(session_id)
+    }
+    if data.get('timings'):
+        payload['timings'] = request_trace.breakdown()
+    return with_session_cookie(jsonify(payload), session_id)
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream a chat response as Server-Sent Events.
+    
+    Events: ``sources`` (retrieved documents, sent first), ``token`` (one per
+    generated chunk), then ``done`` with the full response, or ``error``.
+    """
+    data = request.get_json()
+    message = data.get('message', '').strip()
+    
+    if not message:
+        return jsonify({'error': 'Message cannot be empty'}), 400
+    
+    # Optional metadata filter for retrieval, e.g. {"department": "Computing", "year": {"gte": 2024}}
+    filters = data.get('filters') or None
+    if filters is not None and not isinstance(filters, dict):
+        return jsonify({'error': 'filters must be an object'}), 400
+    
+    session_id = get_session_id(data) or chatbot.sessions.new_session_id()
+    
+    def generate():
+        with trace('chat_stream'):
+            for event in chatbot.stream_chat(message, session_id, filters=filters):
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    return with_session_cookie(Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Let nginx flush each event immediately
+        }
+    ), session_id)
 
 @app.route('/api/upload', methods=['POST'])
 def upload_document():
@@ -43,25 +150,54 @@ def upload_document():
         return jsonify({'error': 'No selected file'}), 400
     
     # Save the file temporarily
-    upload_dir = Path('data/raw')
+    upload_dir = raw_data_dir()
     upload_dir.mkdir(parents=True, exist_ok=True)
     file_path = upload_dir / file.filename
     file.save(file_path)
     
-    # Process the document
-    result = chatbot.add_documents([str(file_path)])
+    # Queue the document for background ingestion
+    job_id = get_jobs().enqueue(str(file_path))
+    if ingestion_worker is not None:
+        ingestion_worker.notify()
     
     return jsonify({
-        'message': result,
-        'filename': file.filename
+        'message': f'File "{file.filename}" uploaded and queued for processing.',
+        'filename': file.filename,
+        'job_id': job_id,
+        'status': 'queued'
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report an upload's ingestion status and progress."""
+    job = get_jobs().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify({
+        'job_id': job['id'],
+        'filename': Path(job['file_path']).name,
+        'status': job['status'],
+        'stage': job['stage'],
+        'chunks': job['chunks'],
+        'attempts': job['attempts'],
+        'max_attempts': job['max_attempts'],
+        'error': job['error']
     })
 
 @app.route('/api/clear', methods=['POST'])
 def clear_chat():
-    """Clear the chat history."""
-    chatbot.clear_chat_history()
+    """Clear the caller's chat history."""
+    session_id = get_session_id(request.get_json(silent=True))
+    if session_id is not None:
+        chatbot.clear_chat_history(session_id)
     return jsonify({'status': 'success'})
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose this process's metrics in the Prometheus text format."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 # Serve React App
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
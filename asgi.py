@@ -0,0 +1,27 @@
+"""ASGI entry point for the YSJ Student Chatbot.
+
+Serves chat on the event loop and everything else through the Flask app:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Several worker processes need a separate ingestion worker; set the count
+with WEB_CONCURRENCY so the app can check for it:
+
+    INGEST_WORKER=external WEB_CONCURRENCY=2 uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import os
+from app import app as flask_app, chatbot, start_ingestion_worker
+from src.async_server import AsyncChatServer
+
+app = AsyncChatServer(
+    chatbot,
+    wsgi_app=flask_app,
+    max_concurrency=int(os.getenv("ASYNC_MAX_CONCURRENCY", "32")),
+    max_queue=int(os.getenv("ASYNC_MAX_QUEUE", "64")),
+    retrieval_threads=int(os.getenv("ASYNC_RETRIEVAL_THREADS", "8")),
+    retry_after=int(os.getenv("ASYNC_RETRY_AFTER", "2"))
+)
+
+# Each uvicorn worker process runs its own ingestion worker (unless INGEST_WORKER=external)
+start_ingestion_worker()
@@ -0,0 +1,80 @@
+"""
+Offline benchmark of the semantic answer cache.
+
+Replays the questions in tests/test_queries.json, each followed by a few
+paraphrases, through YSJChatbot with the stub LLM, once with the cache and
+once without, and reports hit rate and latency:
+
+    python -m benchmarks.answer_cache --llm-latency 0.8 --rounds 3
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from src.chatbot import YSJChatbot
+from src.llm import StubLLM
+
+QUERIES_FILE = Path(__file__).parent.parent / "tests" / "test_queries.json"
+
+def paraphrases(question: str) -> List[str]:
+    """Cheap surface variations of a question, as real users produce."""
+    stripped = question.rstrip("?")
+    return [
+        question,
+        question.lower(),
+        f"{stripped}, please?",
+        f"Can you tell me: {stripped.lower()}?",
+    ]
+
+def run(chatbot: YSJChatbot, questions: List[str]) -> Dict[str, Any]:
+    """Ask every question and collect per-question latencies."""
+    latencies = []
+    for question in questions:
+        start = time.perf_counter()
+        chatbot.chat(question)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "latency_ms_mean": float(np.mean(latencies)),
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+        "llm_calls": chatbot.llm.calls,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data/processed", help="Vector store directory")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Stub LLM latency in seconds")
+    parser.add_argument("--rounds", type=int, default=2, help="Times the whole question set is replayed")
+    parser.add_argument("--threshold", type=float, default=None, help="Override the similarity threshold")
+    args = parser.parse_args()
+
+    base_questions = [item["question"] for item in json.loads(QUERIES_FILE.read_text())["queries"]]
+    questions = [variant for _ in range(args.rounds) for q in base_questions for variant in paraphrases(q)]
+
+    results = {}
+    for label in ("no_cache", "cache"):
+        chatbot = YSJChatbot(data_dir=args.data_dir, llm=StubLLM(latency=args.llm_latency))
+        if label == "no_cache":
+            chatbot.answer_cache = None
+        elif args.threshold is not None:
+            chatbot.answer_cache.threshold = args.threshold
+        results[label] = run(chatbot, questions)
+        if chatbot.answer_cache is not None:
+            results[label].update(chatbot.answer_cache.stats())
+
+    print(f"{len(questions)} questions, stub LLM latency {args.llm_latency:.2f}s\n")
+    print(f"{'mode':<10} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'LLM calls':>10} {'hit rate':>9}")
+    for label, row in results.items():
+        print(f"{label:<10} {row['latency_ms_mean']:>9.1f} {row['latency_ms_p50']:>9.1f} "
+              f"{row['latency_ms_p95']:>9.1f} {row['llm_calls']:>10} {row.get('hit_rate', 0.0):>9.2%}")
+
+    saved = results["no_cache"]["latency_ms_mean"] - results["cache"]["latency_ms_mean"]
+    print(f"\nMean latency saved per question: {saved:.1f} ms")
+
+if __name__ == "__main__":
+    main()
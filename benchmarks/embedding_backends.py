@@ -0,0 +1,120 @@
+"""
+Throughput and latency of the embedding backends.
+
+Encodes the same texts with each EMBEDDING_BACKEND at several batch sizes
+and reports texts per second and per-batch latency. It also reports how
+closely each backend's vectors match PyTorch's, since stored indexes are
+built with those: ``onnx`` should stay above 0.9999 cosine similarity and
+``onnx-int8`` above 0.99.
+
+    python -m benchmarks.embedding_backends --backends torch,onnx,onnx-int8 --batch-sizes 1,8,32,128
+    python -m benchmarks.embedding_backends --threads 4 --corpus data/raw/handbook.txt --json
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+QUERIES_FILE = Path(__file__).parent.parent / "tests" / "test_queries.json"
+
+# Minimum cosine similarity to the PyTorch vectors for a backend to share an index with them
+TOLERANCE = {"onnx": 0.9999, "onnx-int8": 0.99}
+
+def load_texts(corpus: str, count: int) -> List[str]:
+    """``count`` texts: paragraphs of ``corpus`` if given, else test questions and chunk-sized passages."""
+    if corpus:
+        paragraphs = [p.strip() for p in Path(corpus).read_text(encoding="utf-8").split("\n\n") if p.strip()]
+    else:
+        questions = [item["question"] for item in json.loads(QUERIES_FILE.read_text())["queries"]]
+        rng = random.Random(0)
+        words = " ".join(questions).split()
+        passages = [" ".join(rng.choice(words) for _ in range(rng.randint(40, 200))) for _ in range(count)]
+        paragraphs = questions + passages
+    return [paragraphs[i % len(paragraphs)] for i in range(count)]
+
+def bench_backend(backend: str, model_name: str, texts: List[str], batch_sizes: List[int],
+                  repeat: int) -> Dict[str, Any]:
+    """Load one backend, then time encoding ``texts`` at each batch size."""
+    from src.embeddings import load_sentence_transformer
+
+    start = time.perf_counter()
+    model = load_sentence_transformer(model_name, backend)
+    result: Dict[str, Any] = {"load_s": time.perf_counter() - start, "batches": {}}
+    model.encode(texts[:8], batch_size=8)  # Warm up
+
+    for batch_size in batch_sizes:
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for i in range(0, len(texts), batch_size):
+                batch_start = time.perf_counter()
+                model.encode(texts[i:i + batch_size], batch_size=batch_size)
+                latencies.append((time.perf_counter() - batch_start) * 1000)
+        elapsed = time.perf_counter() - start
+        result["batches"][batch_size] = {
+            "texts_per_s": len(texts) * repeat / elapsed,
+            "batch_ms_p50": float(np.percentile(latencies, 50)),
+            "batch_ms_p95": float(np.percentile(latencies, 95)),
+        }
+
+    result["vectors"] = np.asarray(model.encode(texts, batch_size=32), dtype=np.float32)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8", help="Comma-separated backends")
+    parser.add_argument("--batch-sizes", default="1,8,32,128", help="Comma-separated batch sizes")
+    parser.add_argument("--texts", type=int, default=512, help="Number of texts to encode")
+    parser.add_argument("--corpus", default="", help="Text file to take paragraphs from")
+    parser.add_argument("--repeat", type=int, default=2, help="Passes over the texts per batch size")
+    parser.add_argument("--threads", type=int, default=0, help="EMBEDDING_THREADS for ONNX backends")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"), help="Embedding model")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    if args.threads:
+        os.environ["EMBEDDING_THREADS"] = str(args.threads)
+    backends = args.backends.split(",")
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+    texts = load_texts(args.corpus, args.texts)
+
+    results = {backend: bench_backend(backend, args.model, texts, batch_sizes, args.repeat) for backend in backends}
+
+    # Agreement with the PyTorch vectors the index was built with
+    reference = results.get("torch", {}).get("vectors")
+    for backend, result in results.items():
+        vectors = result.pop("vectors")
+        if reference is None or backend == "torch":
+            continue
+        cosine = np.sum(vectors * reference, axis=1) / (
+            np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1))
+        result["cosine_min"] = float(cosine.min())
+        result["cosine_mean"] = float(cosine.mean())
+        result["compatible"] = bool(cosine.min() >= TOLERANCE[backend])
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{len(texts)} texts, model {args.model}, threads {args.threads or 'default'}\n")
+    print(f"{'backend':<10} {'batch':>6} {'texts/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for backend, result in results.items():
+        for batch_size, row in result["batches"].items():
+            print(f"{backend:<10} {batch_size:>6} {row['texts_per_s']:>9.1f} "
+                  f"{row['batch_ms_p50']:>9.2f} {row['batch_ms_p95']:>9.2f}")
+    print(f"\n{'backend':<10} {'load s':>7} {'min cos':>9} {'mean cos':>9} {'compatible':>11}")
+    for backend, result in results.items():
+        if "cosine_min" in result:
+            print(f"{backend:<10} {result['load_s']:>7.2f} {result['cosine_min']:>9.5f} "
+                  f"{result['cosine_mean']:>9.5f} {str(result['compatible']):>11}")
+        else:
+            print(f"{backend:<10} {result['load_s']:>7.2f} {'-':>9} {'-':>9} {'-':>11}")
+
+if __name__ == "__main__":
+    main()
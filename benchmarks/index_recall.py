@@ -0,0 +1,132 @@
+"""
+Recall, latency and memory report for the VectorStore index modes.
+
+Compares each approximate index mode against the exact flat baseline, using
+either the vectors of an existing store or a synthetic corpus. Memory is the
+size of the FAISS index, which each process holds in RAM unless it maps a
+snapshot, plus the full-precision vectors the fp16/sq8 modes re-rank from,
+which are memory-mapped and only paged in for the candidates a search reads:
+
+    python -m benchmarks.index_recall --store data/processed/vector_store
+    python -m benchmarks.index_recall --synthetic 50000 --k 5
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from src.vector_store import VectorStore
+
+# Index settings compared by default
+DEFAULT_CONFIGS: List[Dict[str, Any]] = [
+    {"index_type": "flat", "index_params": {}},
+    {"index_type": "ivf", "index_params": {"nprobe": 4}},
+    {"index_type": "ivf", "index_params": {"nprobe": 16}},
+    {"index_type": "hnsw", "index_params": {"ef_search": 32}},
+    {"index_type": "hnsw", "index_params": {"ef_search": 128}},
+    {"index_type": "ivfpq", "index_params": {"nprobe": 16}},
+    {"index_type": "fp16", "index_params": {"rerank": 50}},
+    {"index_type": "sq8", "index_params": {"rerank": 20}},
+    {"index_type": "sq8", "index_params": {"rerank": 50}},
+]
+
+def synthetic_vectors(n: int, dimension: int = 384, seed: int = 0) -> np.ndarray:
+    """Generate clustered, normalized vectors that resemble sentence embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 50), dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.3 * rng.normal(size=(n, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def build_store(vectors: np.ndarray, index_type: str, index_params: Dict[str, int]) -> VectorStore:
+    """Build a store of the given mode, training on the full corpus."""
+    store = VectorStore(dimension=vectors.shape[1])
+    store.index.add(vectors)
+    store.documents.extend({"text": ""} for _ in range(len(vectors)))
+    store.rebuild(index_type=index_type, index_params=index_params)
+    return store
+
+def evaluate(store: VectorStore, queries: np.ndarray, ground_truth: np.ndarray, k: int) -> Dict[str, float]:
+    """Measure recall@k against the ground truth and per-query latency."""
+    latencies = []
+    hits = 0
+    for query, truth in zip(queries, ground_truth):
+        start = time.perf_counter()
+        _, indices = store.search_batch(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(indices[0].tolist()) & set(truth.tolist()))
+
+    return {
+        "recall": hits / (len(queries) * k),
+        "latency_ms_mean": float(np.mean(latencies)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+    }
+
+def memory_usage(store: VectorStore) -> Dict[str, float]:
+    """Index size and size of the mapped full-precision vectors, in MB."""
+    return {
+        "index_mb": len(faiss.serialize_index(store.index)) / 2 ** 20,
+        "mapped_mb": (store.exact.nbytes if store.exact is not None else 0) / 2 ** 20,
+    }
+
+def run_report(vectors: np.ndarray, k: int = 5, num_queries: int = 200,
+               configs: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Run every configuration and return one result row per index setting."""
+    rng = np.random.default_rng(1)
+    sample = vectors[rng.integers(0, len(vectors), num_queries)]
+    queries = (sample + 0.05 * rng.normal(size=sample.shape)).astype(np.float32)
+
+    baseline = build_store(vectors, "flat", {})
+    _, ground_truth = baseline.index.search(queries, k)
+
+    rows = []
+    for config in configs or DEFAULT_CONFIGS:
+        start = time.perf_counter()
+        store = build_store(vectors, config["index_type"], config["index_params"])
+        build_seconds = time.perf_counter() - start
+
+        row = {
+            "index_type": config["index_type"],
+            "index_params": config["index_params"],
+            "build_seconds": build_seconds,
+        }
+        row.update(evaluate(store, queries, ground_truth, k))
+        row.update(memory_usage(store))
+        rows.append(row)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", help="Path prefix of a saved vector store")
+    parser.add_argument("--synthetic", type=int, default=20000, help="Synthetic corpus size when no store is given")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.store:
+        vectors = VectorStore.load(args.store).get_vectors()
+        print(f"Loaded {len(vectors)} vectors from {args.store}")
+    else:
+        vectors = synthetic_vectors(args.synthetic)
+        print(f"Generated {len(vectors)} synthetic vectors")
+
+    rows = run_report(vectors, k=args.k, num_queries=args.queries)
+
+    print(f"\n{'index':<8} {'params':<22} {'recall@' + str(args.k):>9} {'mean ms':>9} {'p95 ms':>9} "
+          f"{'build s':>9} {'index MB':>9} {'mapped MB':>10}")
+    for row in rows:
+        params = ",".join(f"{key}={value}" for key, value in row["index_params"].items()) or "-"
+        print(f"{row['index_type']:<8} {params:<22} {row['recall']:>9.3f} "
+              f"{row['latency_ms_mean']:>9.3f} {row['latency_ms_p95']:>9.3f} {row['build_seconds']:>9.2f} "
+              f"{row['index_mb']:>9.1f} {row['mapped_mb']:>10.1f}")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(rows, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Throughput of batched retrieval through RAGPipeline.query_batch.
+
+Runs a question file through the pipeline and reports queries per second,
+optionally next to a one-question-at-a-time loop over RAGPipeline.query:
+
+    python -m benchmarks.query_batch --questions tests/test_queries.json --repeat 200 --compare
+
+A question file is either JSON (a list of strings, or {"queries": [{"question": ...}]})
+or plain text with one question per line.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import List
+
+from src.rag_pipeline import RAGPipeline
+
+QUERIES_FILE = Path(__file__).parent.parent / "tests" / "test_queries.json"
+
+def load_questions(path: Path) -> List[str]:
+    """Read questions from a JSON or plain-text file."""
+    text = path.read_text(encoding="utf-8")
+    if path.suffix == ".json":
+        data = json.loads(text)
+        items = data["queries"] if isinstance(data, dict) else data
+        return [item["question"] if isinstance(item, dict) else str(item) for item in items]
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data/processed", help="Vector store directory")
+    parser.add_argument("--questions", type=Path, default=QUERIES_FILE, help="Question file")
+    parser.add_argument("--repeat", type=int, default=1, help="Times the question list is repeated")
+    parser.add_argument("--batch-size", type=int, default=256, help="Questions encoded and searched per batch")
+    parser.add_argument("--top-k", type=int, default=3, help="Results per question")
+    parser.add_argument("--compare", action="store_true", help="Also time a sequential RAGPipeline.query loop")
+    parser.add_argument("--use-cache", action="store_true", help="Keep the embedding cache (repeats become cache hits)")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    # Suffix repeats so they are distinct texts, not cache or dedup hits
+    questions = [q if r == 0 else f"{q} ({r})" for r in range(args.repeat) for q in questions]
+
+    rag = RAGPipeline(data_dir=args.data_dir)
+    if not args.use_cache:
+        rag.embedding_model.cache = None
+    print(f"{len(questions)} questions against {rag.vector_store.live_count} chunks "
+          f"({rag.vector_store.index_type} index), top_k={args.top_k}\n")
+
+    start = time.perf_counter()
+    _, ids, _ = rag.query_batch(questions, top_k=args.top_k, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+    hits = int((ids >= 0).sum())
+    print(f"query_batch (batch {args.batch_size}): {elapsed:.2f}s, {len(questions) / elapsed:.1f} queries/s, {hits} hits")
+
+    if args.compare:
+        start = time.perf_counter()
+        for question in questions:
+            rag.query(question, top_k=args.top_k, mode="dense")
+        sequential = time.perf_counter() - start
+        print(f"query loop:               {sequential:.2f}s, {len(questions) / sequential:.1f} queries/s")
+        print(f"\nSpeed-up: {sequential / elapsed:.1f}x")
+
+if __name__ == "__main__":
+    main()
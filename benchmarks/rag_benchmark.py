@@ -0,0 +1,206 @@
+"""
+End-to-end performance benchmark of the RAG stack, offline.
+
+Generates a synthetic handbook corpus, ingests it through DocumentProcessor,
+EmbeddingModel and VectorStore, rebuilds the index, cold-starts a chatbot in
+a fresh process and replays generated questions through RAGPipeline and
+YSJChatbot with the stub LLM standing in for ChatGroq. The metrics are
+written as JSON; with ``--baseline`` they are compared against a previous
+run and the exit status is 1 if any got worse by more than ``--tolerance``:
+
+    python -m benchmarks.rag_benchmark --docs 200 --output bench.json
+    python -m benchmarks.rag_benchmark --docs 200 --baseline bench.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+ROOT = Path(__file__).parent.parent
+
+# Whether each metric is better when lower or higher, for baseline comparisons
+METRIC_DIRECTIONS = {
+    "ingest_seconds": "lower",
+    "ingest_chunks_per_s": "higher",
+    "extract_chunks_per_s": "higher",
+    "index_build_seconds": "lower",
+    "startup_seconds": "lower",
+    "retrieval_ms_p50": "lower",
+    "retrieval_ms_p95": "lower",
+    "retrieval_ms_p99": "lower",
+    "chat_ms_p50": "lower",
+    "chat_ms_p95": "lower",
+    "chat_ms_p99": "lower",
+    "peak_rss_mb": "lower",
+    "store_mb": "lower",
+}
+
+TOPICS = ["extensions", "fees", "accommodation", "library", "exams", "enrolment", "wellbeing",
+          "placements", "parking", "graduation", "timetables", "scholarships", "visas", "IT support"]
+WORDS = ("students must submit the form to the faculty office before the deadline and keep a copy "
+         "of the confirmation email which the module leader reviews within ten working days while "
+         "late requests need evidence from a doctor or support service and appeals go to the registry").split()
+
+def generate_corpus(directory: Path, docs: int, sections: int, seed: int = 0) -> Tuple[List[Path], List[str]]:
+    """Write ``docs`` Markdown handbook pages and return them with questions about their contents."""
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    files, questions = [], []
+    for i in range(docs):
+        topic = TOPICS[i % len(TOPICS)]
+        lines = [f"# {topic.title()} guide {i}", ""]
+        for j in range(sections):
+            code = f"COM{rng.randint(1000, 9999)}"
+            lines += [f"## {topic.title()} section {j}", ""]
+            for _ in range(rng.randint(2, 5)):
+                sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 30)))
+                lines += [f"{sentence.capitalize()} for module {code}.", ""]
+            questions.append(f"What do I need to know about {topic} for module {code}?")
+        path = directory / f"{topic.replace(' ', '_')}_{i}.md"
+        path.write_text("\n".join(lines), encoding="utf-8")
+        files.append(path)
+    return files, questions
+
+def percentiles(latencies: List[float], prefix: str) -> Dict[str, float]:
+    return {f"{prefix}_ms_p{p}": float(np.percentile(latencies, p)) for p in (50, 95, 99)}
+
+def directory_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) / 2 ** 20
+
+def bench_ingest(files: List[Path], data_dir: Path) -> Dict[str, float]:
+    """Extract and chunk alone, then the full ingest (extract, embed, index, save)."""
+    from src.document_processor import DocumentProcessor
+    from src.rag_pipeline import RAGPipeline
+
+    start = time.perf_counter()
+    chunks = sum(len(DocumentProcessor.process_document(str(path))) for path in files)
+    extract_seconds = time.perf_counter() - start
+
+    rag = RAGPipeline(data_dir=str(data_dir))
+    rag.warm_up()  # Model loading is measured by the startup phase
+    start = time.perf_counter()
+    rag.process_documents([str(path) for path in files])
+    ingest_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rag.vector_store.rebuild()
+    index_build_seconds = time.perf_counter() - start
+
+    return {
+        "chunks": chunks,
+        "extract_chunks_per_s": chunks / extract_seconds,
+        "ingest_seconds": ingest_seconds,
+        "ingest_chunks_per_s": chunks / ingest_seconds,
+        "index_build_seconds": index_build_seconds,
+    }
+
+def bench_startup(data_dir: Path, question: str) -> Dict[str, Any]:
+    """Cold-start a chatbot in a fresh interpreter with ``benchmarks.startup``."""
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--data-dir", str(data_dir), "--question", question, "--json"],
+        cwd=ROOT, env=os.environ.copy(), check=True, capture_output=True, text=True
+    ).stdout
+    phases = json.loads(output[output.index("{"):])
+    return {"startup_seconds": sum(phases.values()), "startup_phases": phases}
+
+def bench_queries(data_dir: Path, questions: List[str], llm_latency: float, top_k: int) -> Dict[str, float]:
+    """Retrieval and full chat latency per question, with the stub LLM."""
+    from src.chatbot import YSJChatbot
+    from src.llm import StubLLM
+
+    chatbot = YSJChatbot(data_dir=str(data_dir), llm=StubLLM(latency=llm_latency))
+    chatbot.answer_cache = None  # Measure every question, not cache hits
+    rag = chatbot.rag_pipeline
+    rag.warm_up()
+    rag.query(questions[0], top_k=top_k)
+
+    retrieval, chat = [], []
+    for question in questions:
+        start = time.perf_counter()
+        rag.query(question, top_k=top_k)
+        retrieval.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        chatbot.chat(question)
+        chat.append((time.perf_counter() - start) * 1000)
+    return {**percentiles(retrieval, "retrieval"), **percentiles(chat, "chat")}
+
+def compare(metrics: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """Describe every metric that is worse than ``baseline`` by more than ``tolerance`` (a fraction)."""
+    regressions = []
+    for name, direction in METRIC_DIRECTIONS.items():
+        old, new = baseline.get(name), metrics.get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old if direction == "lower" else (old - new) / old
+        if change > tolerance:
+            regressions.append(f"{name}: {old:.3f} -> {new:.3f} ({change:+.0%} worse)")
+    return regressions
+
+def check_baseline(metrics: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> int:
+    """Report regressions against ``baseline`` on stderr; the exit status is 1 if there are any."""
+    regressions = compare(metrics, baseline, tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    return 1 if regressions else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100, help="Synthetic documents to generate")
+    parser.add_argument("--sections", type=int, default=8, help="Sections per document")
+    parser.add_argument("--queries", type=int, default=200, help="Questions to replay")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Stub LLM latency in seconds")
+    parser.add_argument("--index-type", default=os.getenv("VECTOR_INDEX_TYPE", "flat"), help="VECTOR_INDEX_TYPE to benchmark")
+    parser.add_argument("--workdir", help="Keep the corpus and store here instead of a temporary directory")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before flagging")
+    args = parser.parse_args()
+
+    # Offline and uncached, so runs measure the same work every time
+    os.environ.update(LLM_BACKEND="stub", EMBEDDING_CACHE="0", ANSWER_CACHE="0", VECTOR_INDEX_TYPE=args.index_type)
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="rag_benchmark_"))
+    data_dir = workdir / "processed"
+
+    try:
+        files, questions = generate_corpus(workdir / "raw", args.docs, args.sections)
+        questions = random.Random(1).choices(questions, k=args.queries)
+
+        metrics: Dict[str, Any] = {}
+        metrics.update(bench_ingest(files, data_dir))
+        metrics.update(bench_startup(data_dir, questions[0]))
+        metrics.update(bench_queries(data_dir, questions, args.llm_latency, args.top_k))
+        metrics["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        metrics["store_mb"] = directory_mb(data_dir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "workdir")},
+        "metrics": metrics,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())["metrics"]
+        status = check_baseline(metrics, baseline, args.tolerance)
+        if status:
+            sys.exit(status)
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.baseline}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Startup-time profile of the chatbot.
+
+Times each phase of bringing up a chatbot in a fresh interpreter: importing
+the app modules, constructing YSJChatbot (lazy), importing and loading the
+EMBEDDING_BACKEND embedding model, importing FAISS and loading the index,
+creating the LLM client and answering the first retrieval:
+
+    python -m benchmarks.startup --data-dir data/processed
+    python -m benchmarks.startup --json
+
+Run it as its own process; modules already imported are not timed again.
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Callable, Dict, List, Tuple
+
+def profile(data_dir: str, question: str) -> List[Tuple[str, float]]:
+    """Run each startup phase in order and return ``(phase, seconds)`` pairs."""
+    state: Dict[str, object] = {}
+
+    def import_app_modules():
+        from src import chatbot as chatbot_module
+        state["module"] = chatbot_module
+
+    def construct_chatbot():
+        state["chatbot"] = state["module"].YSJChatbot(data_dir=data_dir)
+
+    def import_inference_runtime():
+        if state["chatbot"].rag_pipeline.embedding_backend == "torch":
+            import sentence_transformers  # noqa: F401
+        else:
+            import onnxruntime  # noqa: F401
+
+    def load_embedding_model():
+        from src.embeddings import load_sentence_transformer
+        rag = state["chatbot"].rag_pipeline
+        load_sentence_transformer(rag.model_name, rag.embedding_backend)
+
+    def import_faiss():
+        import faiss  # noqa: F401
+
+    def load_index():
+        state["chatbot"].rag_pipeline.warm_up()
+
+    def create_llm_client():
+        state["chatbot"].llm
+
+    def first_query():
+        state["chatbot"].rag_pipeline.query(question)
+
+    phases: List[Tuple[str, Callable[[], None]]] = [
+        ("import app modules", import_app_modules),
+        ("construct YSJChatbot", construct_chatbot),
+        ("import inference runtime", import_inference_runtime),
+        ("load embedding model", load_embedding_model),
+        ("import faiss", import_faiss),
+        ("load index", load_index),
+        ("create LLM client", create_llm_client),
+        ("first query", first_query),
+    ]
+
+    timings = []
+    for name, phase in phases:
+        start = time.perf_counter()
+        phase()
+        timings.append((name, time.perf_counter() - start))
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data/processed", help="Vector store directory")
+    parser.add_argument("--question", default="How do I apply for an extension?", help="Question for the first query")
+    parser.add_argument("--json", action="store_true", help="Print the timings as JSON")
+    args = parser.parse_args()
+
+    # Avoid needing a GROQ_API_KEY unless the caller chose a backend
+    os.environ.setdefault("LLM_BACKEND", "stub")
+    timings = profile(args.data_dir, args.question)
+
+    if args.json:
+        print(json.dumps({name: round(seconds, 4) for name, seconds in timings}, indent=2))
+        return
+
+    total = sum(seconds for _, seconds in timings)
+    print(f"{'phase':<30} {'seconds':>8} {'share':>7}")
+    for name, seconds in timings:
+        print(f"{name:<30} {seconds:>8.3f} {seconds / total:>7.1%}")
+    print(f"{'total':<30} {total:>8.3f}")
+
+if __name__ == "__main__":
+    main()
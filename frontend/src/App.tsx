@@ -76,6 +76,31 @@ const YSJChatbot: React.FC = () => {
     }
   };
 
+  const pollUploadJob = async (jobId: string, fileName: string) => {
+    // Uploads are ingested in the background; report when the job finishes
+    try {
+      const response = await fetch(`/api/jobs/${jobId}`);
+      const job = await response.json();
+
+      if (job.status === 'queued' || job.status === 'running') {
+        setTimeout(() => pollUploadJob(jobId, fileName), 2000);
+        return;
+      }
+
+      const statusMessage: Message = {
+        id: Date.now().toString(),
+        role: 'assistant',
+        content: job.status === 'done'
+          ? `"${fileName}" has been processed and added to my knowledge base.`
+          : `Sorry, I couldn't process "${fileName}"${job.error ? `: ${job.error}` : '.'}`,
+        timestamp: new Date(),
+      };
+      setMessages(prev => [...prev, statusMessage]);
+    } catch (error) {
+      console.error('Error checking upload status:', error);
+    }
+  };
+
   const handleFileUpload = async (event: React.ChangeEvent<HTMLInputElement>) => {
     const file = event.target.files?.[0];
     if (!file) return;
@@ -99,6 +124,10 @@ const YSJChatbot: React.FC = () => {
       };
 
       setMessages(prev => [...prev, systemMessage]);
+
+      if (data.job_id) {
+        pollUploadJob(data.job_id, file.name);
+      }
     } catch (error) {
       console.error('Error uploading file:', error);
       const errorMessage: Message = {
@@ -0,0 +1,40 @@
+"""Gunicorn settings for the YSJ Student Chatbot (picked up by ``gunicorn app:app``).
+
+With GUNICORN_PRELOAD=1 (the default) the master process imports the app
+and loads the embedding model and the index once, before forking. Workers
+then share those pages copy-on-write instead of each loading a copy, and
+start serving without the model load. Database connections, the LLM client
+and the ingestion worker thread are only opened inside each worker.
+"""
+
+import os
+import time
+
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") != "0"
+
+def on_starting(server):
+    """Refuse several workers unless uploads are ingested by a separate process.
+
+    Each worker would otherwise own a writable index on the same files, and
+    a worker with a stale view would overwrite the others' documents.
+    """
+    if server.cfg.workers > 1 and os.getenv("INGEST_WORKER", "thread") != "external":
+        raise RuntimeError(f"{server.cfg.workers} workers need INGEST_WORKER=external "
+                           "and a separate `python -m src.jobs` process")
+
+def when_ready(server):
+    """Load shared read-only assets in the master, before any worker is forked."""
+    if not server.cfg.preload_app:
+        return
+    from app import chatbot
+
+    start = time.perf_counter()
+    chatbot.warm_up()
+    server.log.info("Preloaded embedding model and index in %.1fs", time.perf_counter() - start)
+
+def post_worker_init(worker):
+    """Open per-process resources in each worker."""
+    from app import start_ingestion_worker
+    start_ingestion_worker()
@@ -2,18 +2,20 @@
 Ingestion script to process all documents in data/raw and populate the vector store.
 """
 
+import argparse
 import os
 import shutil
 from pathlib import Path
 from src.rag_pipeline import RAGPipeline
-from tqdm import tqdm
+from src.ingestion import IngestionEngine
+from src.manifest import raw_data_dir
 
-def ingest_data():
+def ingest_data(workers=None, batch_size=256, queue_size=8):
     """Process all documents in data/raw."""
     
     # Paths
     ROOT_DIR = Path(__file__).parent
-    RAW_DIR = ROOT_DIR / "data" / "raw"
+    RAW_DIR = raw_data_dir()
     PROCESSED_DIR = ROOT_DIR / "data" / "processed" # For moving processed files if needed, or just keeping track
     
     print(f"🚀 Starting ingestion from: {RAW_DIR}")
@@ -26,8 +28,9 @@ def ingest_data():
     supported_extensions = {'.pdf', '.docx', '.txt', '.md'}
     files_to_process = []
     
+    # Sub-folders (e.g. one per department) can describe their documents in a metadata.json
     for ext in supported_extensions:
-        files_to_process.extend(list(RAW_DIR.glob(f"*{ext}")))
+        files_to_process.extend(list(RAW_DIR.rglob(f"*{ext}")))
     
     if not files_to_process:
         print("⚠️ No supported documents found in data/raw.")
@@ -40,28 +43,31 @@ def ingest_data():
     print("Initializing RAG pipeline...")
     rag = RAGPipeline()
     
-    # Process
-    success_count = 0
-    errors = []
-    
-    for file_path in tqdm(files_to_process, desc="Processing documents"):
-        try:
-            rag.process_documents([str(file_path)])
-            success_count += 1
-        except Exception as e:
-            errors.append((file_path.name, str(e)))
+    # Process: parallel extraction, batched embedding, one flush at the end
+    engine = IngestionEngine(rag, extract_workers=workers, embed_batch_size=batch_size, queue_size=queue_size)
+    summary = engine.run(files_to_process, remove_missing=True)
     
     # Summary
     print("\n" + "="*50)
     print(f"✅ Ingestion Complete!")
-    print(f"Successfully processed: {success_count}/{len(files_to_process)}")
+    print(f"Successfully processed: {summary['processed_files']}/{len(files_to_process)}")
+    print(f"Unchanged (skipped): {summary['skipped_files']}, removed from store: {summary['removed_files']}")
+    print()
+    engine.print_stats()
     
-    if errors:
+    if summary['errors']:
         print("\n❌ Errors encountered:")
-        for name, err in errors:
-            print(f"- {name}: {err}")
+        for path, err in summary['errors']:
+            print(f"- {Path(path).name}: {err}")
     
     print("="*50)
 
 if __name__ == "__main__":
-    ingest_data()
+    parser = argparse.ArgumentParser(description="Ingest documents from data/raw into the vector store.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Extraction processes (default: CPU count, 0 = in-process)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per embedding batch")
+    parser.add_argument("--queue-size", type=int, default=8, help="Bounded queue length between stages")
+    args = parser.parse_args()
+    
+    ingest_data(workers=args.workers, batch_size=args.batch_size, queue_size=args.queue_size)
@@ -0,0 +1,120 @@
+"""Semantic cache of chatbot answers, consulted before calling the LLM."""
+
+import hashlib
+import threading
+import time
+from typing import List, Dict, Any, Hashable, Optional
+import numpy as np
+
+def context_fingerprint(context_docs: List[Dict[str, Any]]) -> str:
+    """Identify a retrieved context by the chunks it contains (order-insensitive)."""
+    parts = sorted(str(doc.get("id", doc.get("text", ""))) for doc in context_docs)
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+class SemanticAnswerCache:
+    """Answers keyed by question embedding and retrieved-context fingerprint.
+
+    A lookup hits when a previous question's embedding has cosine similarity
+    of at least ``threshold`` with the new one *and* retrieval returned the
+    same chunks for both, so a paraphrase only reuses an answer grounded in
+    identical context. Entries expire after ``ttl_seconds``; when the cache
+    is full the least recently used entry is replaced. Passing the index's
+    version (``RAGPipeline.index_version``) to ``lookup``/``store`` clears
+    the cache whenever the index has changed, since chunk IDs may then
+    refer to different text.
+    """
+
+    def __init__(self, threshold: float = 0.92, ttl_seconds: float = 3600.0, max_entries: int = 2048):
+        """Initialize an empty cache."""
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        self._vectors: Optional[np.ndarray] = None  # (max_entries, dim) unit vectors
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._generation: Optional[Hashable] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return int(self._valid.sum())
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_generation(self, generation: Optional[Hashable]) -> None:
+        """Drop every entry if the underlying store has changed."""
+        if generation is not None and generation != self._generation:
+            self._valid[:] = False
+            self._entries = [None] * self.max_entries
+            self._generation = generation
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._valid[:] = False
+            self._entries = [None] * self.max_entries
+
+    def lookup(self, embedding: np.ndarray, fingerprint: str,
+               generation: Optional[Hashable] = None) -> Optional[str]:
+        """Return a cached answer for a similar question with the same context, if any."""
+        with self._lock:
+            self._check_generation(generation)
+            if self._vectors is None or not self._valid.any():
+                self.misses += 1
+                return None
+
+            now = time.time()
+            similarities = self._vectors @ self._normalize(embedding)
+            similarities[~self._valid] = -1.0
+            for slot in np.argsort(-similarities):
+                if similarities[slot] < self.threshold:
+                    break
+                entry = self._entries[slot]
+                if now - entry["created"] > self.ttl_seconds:
+                    self._valid[slot] = False  # Expired
+                    continue
+                if entry["fingerprint"] == fingerprint:
+                    entry["last_used"] = now
+                    self.hits += 1
+                    return entry["answer"]
+
+            self.misses += 1
+            return None
+
+    def store(self, embedding: np.ndarray, fingerprint: str, answer: str,
+              generation: Optional[Hashable] = None) -> None:
+        """Remember an answer for a question embedding and context."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._check_generation(generation)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+
+            # Reuse a free slot, otherwise replace the least recently used entry
+            free = np.flatnonzero(~self._valid)
+            if len(free):
+                slot = int(free[0])
+            else:
+                slot = min(range(self.max_entries), key=lambda i: self._entries[i]["last_used"])
+
+            now = time.time()
+            self._vectors[slot] = vector
+            self._entries[slot] = {"fingerprint": fingerprint, "answer": answer, "created": now, "last_used": now}
+            self._valid[slot] = True
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters since the cache was created."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
@@ -0,0 +1,314 @@
+"""Asyncio (ASGI) serving path for the YSJ Student Chatbot.
+
+The Flask app handles one request per worker thread, so a slow LLM call
+ties up a whole thread. The ASGI app here serves ``/api/chat`` and
+``/api/chat/stream`` on the event loop instead: retrieval (embedding and
+FAISS search) runs on a bounded thread pool and the LLM call is awaited.
+All other routes go to the Flask app through a small WSGI bridge, so
+``uvicorn asgi:app`` replaces ``gunicorn app:app`` one for one.
+
+Each process admits at most ``max_concurrency`` chat requests at once and
+queues up to ``max_queue`` more. Beyond that, requests are shed straight
+away with ``503 Service Unavailable`` and a ``Retry-After`` header rather
+than waiting in an ever-growing queue.
+"""
+
+import asyncio
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from http.cookies import SimpleCookie
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .metrics import trace
+from .session_store import SESSION_COOKIE, resolve_session_id
+
+class Overloaded(Exception):
+    """Raised when the admission queue is full."""
+
+class AdmissionController:
+    """Per-process concurrency limit with queue-depth load shedding."""
+
+    def __init__(self, max_concurrency: int = 32, max_queue: int = 64):
+        """Admit ``max_concurrency`` requests at once and queue at most ``max_queue``."""
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a concurrency slot; raises ``Overloaded`` if the queue is full."""
+        if self.active >= self.max_concurrency and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded()
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        """Current load and number of shed requests."""
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+class AsyncChatServer:
+    """ASGI application wrapping a ``YSJChatbot``."""
+
+    def __init__(self, chatbot, wsgi_app: Optional[Callable] = None, max_concurrency: int = 32,
+                 max_queue: int = 64, retrieval_threads: int = 8, wsgi_threads: int = 4,
+                 retry_after: int = 2):
+        """Serve ``chatbot``; requests for other paths go to ``wsgi_app`` if given."""
+        self.chatbot = chatbot
+        self.wsgi_app = wsgi_app
+        self.retry_after = retry_after
+        self.admission = AdmissionController(max_concurrency, max_queue)
+
+        # Separate pools so slow uploads cannot starve retrieval
+        self.retrieval_executor = ThreadPoolExecutor(max_workers=retrieval_threads, thread_name_prefix="retrieval")
+        self.wsgi_executor = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix="wsgi")
+
+        self.routes = {
+            ("POST", "/api/chat"): self.chat,
+            ("POST", "/api/chat/stream"): self.chat_stream,
+            ("GET", "/api/health"): self.health,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        handler = self.routes.get((scope["method"], scope["path"]))
+        if handler is not None:
+            await handler(scope, receive, send)
+        elif self.wsgi_app is not None:
+            await self._call_wsgi(scope, receive, send)
+        else:
+            await self._send_json(send, 404, {"error": "Not found"})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def shutdown(self) -> None:
+        """Stop the thread pools."""
+        self.retrieval_executor.shutdown(wait=False)
+        self.wsgi_executor.shutdown(wait=False)
+
+    # ------------------------------------------------------------------
+    # Routes
+    # ------------------------------------------------------------------
+
+    async def chat(self, scope, receive, send):
+        """Handle chat messages (with a ``timings`` breakdown if the body asks for one)."""
+        message, session_id, cookie, data = await self._read_message(scope, receive, send)
+        if message is None:
+            return
+
+        try:
+            async with self.admission.slot():
+                with trace("chat", breakdown=bool(data.get("timings"))) as request_trace:
+                    response = await self.chatbot.achat(message, session_id, executor=self.retrieval_executor,
+                                                        filters=data.get("filters"))
+        except Overloaded:
+            await self._send_overloaded(send)
+            return
+
+        loop = asyncio.get_running_loop()
+        payload = {
+            "response": response,
+            "session_id": session_id,
+            "history": await loop.run_in_executor(self.retrieval_executor, self.chatbot.get_chat_history, session_id)
+        }
+        if data.get("timings"):
+            payload["timings"] = request_trace.breakdown()
+        await self._send_json(send, 200, payload, cookie)
+
+    async def chat_stream(self, scope, receive, send):
+        """Stream a chat response as Server-Sent Events (same events as the Flask route)."""
+        message, session_id, cookie, data = await self._read_message(scope, receive, send)
+        if message is None:
+            return
+
+        try:
+            async with self.admission.slot():
+                with trace("chat_stream"):
+                    await send({
+                        "type": "http.response.start",
+                        "status": 200,
+                        "headers": [
+                            (b"content-type", b"text/event-stream; charset=utf-8"),
+                            (b"cache-control", b"no-cache"),
+                            (b"x-accel-buffering", b"no"),
+                        ] + cookie,
+                    })
+                    async for event in self.chatbot.astream_chat(message, session_id, executor=self.retrieval_executor,
+                                                                 filters=data.get("filters")):
+                        payload = f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                        await send({"type": "http.response.body", "body": payload.encode("utf-8"), "more_body": True})
+                    await send({"type": "http.response.body", "body": b""})
+        except Overloaded:
+            await self._send_overloaded(send)
+
+    async def health(self, scope, receive, send):
+        """Report admission-control load and query embedding batching."""
+        await self._send_json(send, 200, {
+            "status": "ok",
+            "load": self.admission.stats(),
+            "embedding": self.chatbot.rag_pipeline.embedding_stats(),
+        })
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        return body
+
+    @staticmethod
+    def _cookie(scope, name: str) -> Optional[str]:
+        for header, value in scope.get("headers", []):
+            if header == b"cookie":
+                morsel = SimpleCookie(value.decode("latin-1")).get(name)
+                if morsel is not None:
+                    return morsel.value
+        return None
+
+    async def _read_message(self, scope, receive, send
+                            ) -> Tuple[Optional[str], Optional[str], List[Tuple[bytes, bytes]], Dict[str, Any]]:
+        """Parse a chat request body into ``(message, session_id, set-cookie headers, body)``.
+
+        The session comes from the body's ``session_id``, then the session
+        cookie; a new one is issued (with a cookie) if neither is present.
+        Answers 400 and returns no message if ``message`` is missing or
+        ``filters`` (a metadata filter for retrieval) is not an object.
+        """
+        try:
+            data = json.loads(await self._read_body(receive) or b"{}")
+        except ValueError:
+            data = None
+        data = data if isinstance(data, dict) else {}
+        message = str(data.get("message", "")).strip()
+        if not message:
+            await self._send_json(send, 400, {"error": "Message cannot be empty"})
+            return None, None, [], data
+        if not isinstance(data.get("filters") or {}, dict):
+            await self._send_json(send, 400, {"error": "filters must be an object"})
+            return None, None, [], data
+
+        cookie: List[Tuple[bytes, bytes]] = []
+        session_id = resolve_session_id(data.get("session_id"), self._cookie(scope, SESSION_COOKIE))
+        if session_id is None:
+            session_id = self.chatbot.sessions.new_session_id()
+            cookie = [(b"set-cookie", f"{SESSION_COOKIE}={session_id}; Path=/; HttpOnly; SameSite=Lax".encode())]
+        return message, session_id, cookie, data
+
+    @staticmethod
+    async def _send_json(send, status: int, payload: Any, headers: Optional[List[Tuple[bytes, bytes]]] = None):
+        body = json.dumps(payload).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode())] + (headers or []),
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _send_overloaded(self, send):
+        await self._send_json(send, 503, {"error": "Server is busy, please retry shortly"},
+                              [(b"retry-after", str(self.retry_after).encode())])
+
+    async def _call_wsgi(self, scope, receive, send):
+        """Run the WSGI app for this request on the WSGI thread pool."""
+        body = await self._read_body(receive)
+        environ = self._wsgi_environ(scope, body)
+        loop = asyncio.get_running_loop()
+        status, headers, content = await loop.run_in_executor(self.wsgi_executor, self._run_wsgi, environ)
+
+        await send({
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        })
+        await send({"type": "http.response.body", "body": content})
+
+    @staticmethod
+    def _wsgi_environ(scope, body: bytes) -> Dict[str, Any]:
+        server = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", ""),
+            "PATH_INFO": scope["path"],
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": str(server[0]),
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+            "CONTENT_LENGTH": str(len(body)),
+        }
+        for name, value in scope.get("headers", []):
+            key = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if key == "CONTENT_TYPE":
+                environ["CONTENT_TYPE"] = value
+            elif key != "CONTENT_LENGTH":
+                key = f"HTTP_{key}"
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _run_wsgi(self, environ: Dict[str, Any]) -> Tuple[str, List[Tuple[str, str]], bytes]:
+        response: Dict[str, Any] = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = status
+            response["headers"] = headers
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            content = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return response["status"], response["headers"], content
@@ -0,0 +1,263 @@
+"""BM25 inverted index over the chunks of the vector store."""
+
+import json
+import math
+import os
+import re
+import struct
+import threading
+import zipfile
+from array import array
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Set, Tuple
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it my of on or "
+    "the to was what when where which who why will with you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens, without stopwords.
+
+    Module codes and room numbers such as ``COM4001`` stay single tokens.
+    """
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    """Okapi BM25 over chunk IDs, with compact append-only posting lists.
+
+    Chunk IDs are the vector store's positional IDs, which only grow
+    between vacuums, so each term's posting list is stored as delta-encoded
+    uint32 doc IDs with uint16 term frequencies. Postings loaded from disk
+    stay in one concatenated (CSR-style) numpy block; postings for chunks
+    added afterwards go to per-term ``array`` tails, which are merged into
+    the block on ``save``.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """Create an empty index."""
+        self.k1 = k1
+        self.b = b
+
+        self.terms: Dict[str, int] = {}
+        self.doc_lengths = array("I")
+        self.total_length = 0
+
+        # Persisted postings: term i occupies [offsets[i], offsets[i + 1])
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._deltas = np.zeros(0, dtype=np.uint32)
+        self._tfs = np.zeros(0, dtype=np.uint16)
+
+        # Postings added since the last save/load
+        self._tail_deltas: List[array] = []
+        self._tail_tfs: List[array] = []
+        self._last_doc: List[int] = []
+
+        # Numpy views of the arrays block them from growing, so searches and adds take turns
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def _term_id(self, term: str) -> int:
+        term_id = self.terms.get(term)
+        if term_id is None:
+            term_id = self.terms[term] = len(self.terms)
+            self._tail_deltas.append(array("I"))
+            self._tail_tfs.append(array("H"))
+            self._last_doc.append(-1)
+        return term_id
+
+    def add(self, text: str) -> int:
+        """Index the next chunk and return its ID."""
+        tokens = tokenize(text)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+
+        with self._lock:
+            doc_id = len(self.doc_lengths)
+            for term, tf in counts.items():
+                term_id = self._term_id(term)
+                self._tail_deltas[term_id].append(doc_id - self._last_doc[term_id])
+                self._tail_tfs[term_id].append(min(tf, 0xFFFF))
+                self._last_doc[term_id] = doc_id
+
+            self.doc_lengths.append(len(tokens))
+            self.total_length += len(tokens)
+        return doc_id
+
+    def sync(self, documents: Sequence[Dict[str, Any]]) -> int:
+        """Index any chunks of ``documents`` beyond those already indexed; returns how many."""
+        with self._lock:
+            start = len(self)
+            for doc_id in range(start, len(documents)):
+                self.add(documents[doc_id].get("text", ""))
+            return len(self) - start
+
+    @classmethod
+    def build(cls, documents: Iterable[Dict[str, Any]], **kwargs) -> 'BM25Index':
+        """Index every chunk of ``documents`` in order."""
+        index = cls(**kwargs)
+        for document in documents:
+            index.add(document.get("text", ""))
+        return index
+
+    def _raw_postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """One term's delta-encoded doc IDs and term frequencies, block then tail."""
+        if term_id + 1 < len(self._offsets):
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+        else:
+            start = end = 0
+        deltas, tfs = self._deltas[start:end], self._tfs[start:end]
+        tail = self._tail_deltas[term_id]
+        if len(tail):
+            deltas = np.concatenate([deltas, np.frombuffer(tail, dtype=np.uint32)])
+            tfs = np.concatenate([tfs, np.frombuffer(self._tail_tfs[term_id], dtype=np.uint16)])
+        return deltas, tfs
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Decode one term's doc IDs and term frequencies."""
+        deltas, tfs = self._raw_postings(term_id)
+        # The first delta is relative to -1
+        return np.cumsum(deltas, dtype=np.int64) - 1, tfs
+
+    def search(self, query: str, k: int = 3, exclude: Optional[Set[int]] = None,
+               include: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Top-``k`` ``(chunk_id, score)`` pairs, highest score first, skipping ``exclude``.
+
+        With ``include`` (chunk IDs) only those chunks are ranked.
+        """
+        query_terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self)
+            if n_docs == 0 or k <= 0:
+                return []
+
+            doc_lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+            avg_length = self.total_length / n_docs or 1.0
+            scores = np.zeros(n_docs, dtype=np.float32)
+            for term in query_terms:
+                term_id = self.terms.get(term)
+                if term_id is None:
+                    continue
+                doc_ids, tfs = self._postings(term_id)
+                idf = math.log(1.0 + (n_docs - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+                tfs = tfs.astype(np.float32)
+                norm = self.k1 * (1.0 - self.b + self.b * doc_lengths[doc_ids] / avg_length)
+                scores[doc_ids] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+            del doc_lengths  # Release the buffer view before unlocking
+
+        if exclude:
+            scores[np.fromiter(exclude, dtype=np.int64, count=len(exclude))] = 0.0
+        if include is not None:
+            keep = np.zeros(n_docs, dtype=bool)
+            keep[include[include < n_docs]] = True
+            scores[~keep] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in ranked]
+
+    def _compact(self) -> None:
+        """Merge the per-term tails into the persisted posting block."""
+        n_terms = len(self.terms)
+        sizes = np.zeros(n_terms, dtype=np.int64)
+        sizes[:len(self._offsets) - 1] = np.diff(self._offsets)
+        sizes += np.array([len(tail) for tail in self._tail_deltas], dtype=np.int64)
+
+        offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        deltas = np.empty(offsets[-1], dtype=np.uint32)
+        tfs = np.empty(offsets[-1], dtype=np.uint16)
+        for term_id in range(n_terms):
+            term_deltas, term_tfs = self._raw_postings(term_id)
+            deltas[offsets[term_id]:offsets[term_id + 1]] = term_deltas
+            tfs[offsets[term_id]:offsets[term_id + 1]] = term_tfs
+
+        self._offsets, self._deltas, self._tfs = offsets, deltas, tfs
+        self._tail_deltas = [array("I") for _ in range(n_terms)]
+        self._tail_tfs = [array("H") for _ in range(n_terms)]
+
+    def save(self, path: str) -> None:
+        """Write the index to ``path`` (an ``.npz`` file) atomically."""
+        tmp_path = f"{path}.tmp"
+        with self._lock, open(tmp_path, "wb") as f:
+            self._compact()
+            vocabulary = sorted(self.terms, key=self.terms.get)
+            np.savez(
+                f,
+                offsets=self._offsets,
+                deltas=self._deltas,
+                tfs=self._tfs,
+                doc_lengths=np.frombuffer(self.doc_lengths, dtype=np.uint32),
+                last_doc=np.array(self._last_doc, dtype=np.int64),
+                vocabulary=np.frombuffer(json.dumps(vocabulary).encode("utf-8"), dtype=np.uint8),
+                params=np.array([self.k1, self.b]),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False) -> 'BM25Index':
+        """Read an index written with ``save``.
+
+        With ``mmap`` the posting block is memory-mapped read-only, so
+        processes loading the same file share its pages.
+        """
+        with (_MappedArchive(path) if mmap else np.load(path)) as data:
+            k1, b = data["params"]
+            index = cls(k1=float(k1), b=float(b))
+            vocabulary = json.loads(data["vocabulary"].tobytes().decode("utf-8"))
+            index.terms = {term: i for i, term in enumerate(vocabulary)}
+            index._offsets = data["offsets"]
+            index._deltas = data["deltas"]
+            index._tfs = data["tfs"]
+            index.doc_lengths = array("I", data["doc_lengths"].tobytes())
+            index._last_doc = data["last_doc"].tolist()
+        index.total_length = int(np.frombuffer(index.doc_lengths, dtype=np.uint32).sum(dtype=np.int64))
+        index._tail_deltas = [array("I") for _ in vocabulary]
+        index._tail_tfs = [array("H") for _ in vocabulary]
+        return index
+
+class _MappedArchive:
+    """Read-only memory maps of the arrays in an uncompressed ``.npz`` file."""
+
+    def __init__(self, path: str):
+        self.arrays: Dict[str, np.ndarray] = {}
+        with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+            for info in archive.infolist():
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise ValueError(f"{path} is compressed and cannot be memory-mapped")
+                # The member's data follows its local file header
+                f.seek(info.header_offset)
+                name_length, extra_length = struct.unpack("<HH", f.read(30)[26:30])
+                f.seek(info.header_offset + 30 + name_length + extra_length)
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+                self.arrays[info.filename[:-len(".npy")]] = np.memmap(
+                    path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                    order="F" if fortran_order else "C"
+                ) if np.prod(shape) else np.zeros(shape, dtype=dtype)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def __enter__(self) -> '_MappedArchive':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse ranked ID lists: each ID scores ``sum(1 / (k + rank))``, highest first."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
@@ -1,29 +1,62 @@
 """Chatbot interface for the YSJ Student Chatbot."""
 
+import asyncio
+import contextvars
 import os
-from typing import Dict, List, Any, Optional
+import threading
+from concurrent.futures import Executor
+from typing import Dict, List, Any, AsyncIterator, Iterator, Optional
 from pathlib import Path
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
 from langchain_core.prompts import PromptTemplate
 from .rag_pipeline import RAGPipeline
+from .llm import create_llm
+from .answer_cache import SemanticAnswerCache, context_fingerprint
+from .context_builder import ContextBuilder
+from .session_store import SessionStore
+from .metrics import REGISTRY, span
 
 # Load environment variables
 load_dotenv()
 
+# Session used when callers do not pass a session ID
+DEFAULT_SESSION = "default"
+
+ANSWER_CACHE_LOOKUPS = REGISTRY.counter("ysj_answer_cache_lookups_total", "Semantic answer cache lookups.", ["result"])
+
 class YSJChatbot:
     """Main chatbot class for interacting with the RAG pipeline."""
     
-    def __init__(self, data_dir: str = "data/processed"):
-        """Initialize the chatbot with a RAG pipeline."""
-        self.rag_pipeline = RAGPipeline(data_dir=data_dir)
-        self.chat_history: List[Dict[str, str]] = []
+    def __init__(self, data_dir: str = "data/processed", llm=None, read_only: bool = False):
+        """Initialize the chatbot with a RAG pipeline.
+        
+        ``llm`` overrides the chat model; by default LLM_BACKEND selects
+        Groq or the offline stub. With ``read_only`` the chatbot serves the
+        shared index snapshot and picks up new ones between requests.
+        The embedding model, index, LLM client and session database are
+        all opened on first use.
+        """
+        self.rag_pipeline = RAGPipeline(data_dir=data_dir, read_only=read_only)
         
-        # Initialize Groq LLM
-        self.llm = ChatGroq(
-            model="llama-3.3-70b-versatile",
-            temperature=0.7,
-            groq_api_key=os.getenv("GROQ_API_KEY")
+        # Conversation history per session and the LLM (Groq unless LLM_BACKEND=stub)
+        self._sessions: Optional[SessionStore] = None
+        self._llm = llm
+        self._init_lock = threading.Lock()
+        
+        # Semantic cache of answers to similar questions (ANSWER_CACHE=0 disables it)
+        self.answer_cache: Optional[SemanticAnswerCache] = None
+        if os.getenv("ANSWER_CACHE", "1") != "0":
+            self.answer_cache = SemanticAnswerCache(
+                threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92")),
+                ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+                max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "2048"))
+            )
+        
+        # Merges, deduplicates and trims retrieved chunks to CONTEXT_MAX_TOKENS (empty CONTEXT_MAX_DISTANCE: no cutoff)
+        max_distance = os.getenv("CONTEXT_MAX_DISTANCE", "1.5")
+        self.context_builder = ContextBuilder(
+            max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "1000")),
+            max_distance=float(max_distance) if max_distance else None
         )
         
         # Create a prompt template
@@ -40,6 +73,42 @@ class YSJChatbot:
             input_variables=["context", "question"]
         )
     
+    @property
+    def sessions(self) -> SessionStore:
+        """Conversation history per session; retriever and LLM are shared."""
+        if self._sessions is None:
+            with self._init_lock:
+                if self._sessions is None:
+                    self._sessions = SessionStore(
+                        path=os.getenv("SESSION_DB") or None,
+                        max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "10000")),
+                        max_messages=int(os.getenv("SESSION_MAX_MESSAGES", "100")),
+                        idle_seconds=float(os.getenv("SESSION_IDLE_SECONDS", "86400")),
+                        window=int(os.getenv("SESSION_HISTORY_WINDOW", "20"))
+                    )
+        return self._sessions
+    
+    @property
+    def llm(self):
+        """The chat model, created on first use."""
+        if self._llm is None:
+            with self._init_lock:
+                if self._llm is None:
+                    self._llm = create_llm()
+        return self._llm
+    
+    @llm.setter
+    def llm(self, llm) -> None:
+        self._llm = llm
+    
+    def warm_up(self) -> None:
+        """Load the embedding model and index now instead of on the first request.
+        
+        Network clients and database connections stay unopened, so servers
+        can call this before forking workers.
+        """
+        self.rag_pipeline.warm_up()
+    
     def add_documents(self, file_paths: List[str]) -> None:
         """Add documents to the chatbot's knowledge base."""
         if not file_paths:
@@ -56,54 +125,228 @@ class YSJChatbot:
         except Exception as e:
             return f"Error processing documents: {str(e)}"
     
-    def chat(self, message: str) -> str:
-        """Process a user message and return a response."""
-        if not message.strip():
-            return "Please enter a valid message."
-            
-        # Add user message to chat history
-        self.chat_history.append({"role": "user", "content": message})
+    def _prepare(self, message: str, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Retrieve context for a message (within a metadata filter, if given) and build the LLM prompt.
         
-        try:
-            # Get relevant documents from RAG pipeline
-            context_docs = self.rag_pipeline.query(message, top_k=3)
-            
-            # Format context
-            context = "\n\n".join([doc["text"] for doc in context_docs])
-            
-            # Generate response using LLM
+        Returns the retrieved documents that made it into the context, the
+        prompt and, when the semantic cache already holds an answer for this
+        question and context, that answer under ``cached``.
+        """
+        # Swap in a newer index snapshot, if one was published since the last request
+        self.rag_pipeline.refresh()
+        
+        # Read before retrieving, so an index swapped in meanwhile cannot be credited with this context
+        generation = self.rag_pipeline.index_version
+        
+        # Get relevant documents from RAG pipeline
+        query_embedding, retrieved = self.rag_pipeline.retrieve(message, top_k=3, filters=filters)
+        
+        with span("context"):
+            context, context_docs = self.context_builder.build(retrieved)
+        
+        # Reuse the answer to a similar question grounded in the same context
+        fingerprint = context_fingerprint(context_docs)
+        cached = None
+        if self.answer_cache is not None:
+            cached = self.answer_cache.lookup(query_embedding, fingerprint, generation)
+            ANSWER_CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+        
+        with span("prompt"):
             if context.strip():
                 # Use RAG approach if we have context
                 prompt = self.prompt_template.format(
                     context=context,
                     question=message
                 )
-                response = self.llm.invoke(prompt)
-                response_text = response.content
             else:
                 # Fallback to direct LLM query if no context
-                response = self.llm.invoke(
-                    f"As a York St John University assistant, please answer: {message}"
-                )
+                prompt = f"As a York St John University assistant, please answer: {message}"
+        
+        return {
+            "context_docs": context_docs,
+            "prompt": prompt,
+            "cached": cached,
+            "cache_key": (query_embedding, fingerprint, generation),
+        }
+    
+    def _remember_answer(self, prepared: Dict[str, Any], response_text: str) -> None:
+        """Store a fresh LLM answer in the semantic cache."""
+        if self.answer_cache is not None:
+            query_embedding, fingerprint, generation = prepared["cache_key"]
+            self.answer_cache.store(query_embedding, fingerprint, response_text, generation)
+    
+    @staticmethod
+    def _sources(context_docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Summarize the documents the answer is grounded in for clients."""
+        return [
+            {"id": doc.get("id"), "source": doc.get("source"), "score": doc.get("score")}
+            for doc in context_docs
+        ]
+    
+    def chat(self, message: str, session_id: Optional[str] = None,
+             filters: Optional[Dict[str, Any]] = None) -> str:
+        """Process a user message in a session and return a response.
+        
+        ``filters`` limits retrieval to chunks whose metadata matches (see
+        ``RAGPipeline.retrieve``).
+        """
+        if not message.strip():
+            return "Please enter a valid message."
+            
+        # Add user message to chat history
+        self.sessions.append(session_id or DEFAULT_SESSION, "user", message)
+        
+        try:
+            prepared = self._prepare(message, filters)
+            
+            if prepared["cached"] is not None:
+                response_text = prepared["cached"]
+            else:
+                # Generate response using LLM
+                with span("llm"):
+                    response = self.llm.invoke(prepared["prompt"])
                 response_text = response.content
+                self._remember_answer(prepared, response_text)
             
             # Add assistant response to chat history
-            self.chat_history.append({"role": "assistant", "content": response_text})
+            self.sessions.append(session_id or DEFAULT_SESSION, "assistant", response_text)
             
             return response_text
             
         except Exception as e:
             error_msg = f"Sorry, I encountered an error: {str(e)}"
-            self.chat_history.append({"role": "assistant", "content": error_msg})
+            self.sessions.append(session_id or DEFAULT_SESSION, "assistant", error_msg)
             return error_msg
     
-    def get_chat_history(self) -> List[Dict[str, str]]:
-        """Get the chat history."""
-        return self.chat_history
+    def stream_chat(self, message: str, session_id: Optional[str] = None,
+                    filters: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Process a user message, yielding the response as it is generated.
+        
+        Yields a ``sources`` event with the retrieved documents first, then
+        one ``token`` event per streamed chunk, and finally a ``done`` event
+        carrying the full response (or an ``error`` event). The exchange is
+        added to the session's history once the stream completes.
+        """
+        if not message.strip():
+            yield {"type": "error", "error": "Please enter a valid message."}
+            return
+        
+        # Add user message to chat history
+        self.sessions.append(session_id or DEFAULT_SESSION, "user", message)
+        
+        try:
+            prepared = self._prepare(message, filters)
+            yield {"type": "sources", "sources": self._sources(prepared["context_docs"])}
+            
+            if prepared["cached"] is not None:
+                response_text = prepared["cached"]
+                yield {"type": "token", "content": response_text}
+            else:
+                parts = []
+                with span("llm"):
+                    for chunk in self.llm.stream(prepared["prompt"]):
+                        if chunk.content:
+                            parts.append(chunk.content)
+                            yield {"type": "token", "content": chunk.content}
+                response_text = "".join(parts)
+                self._remember_answer(prepared, response_text)
+            
+        except Exception as e:
+            error_msg = f"Sorry, I encountered an error: {str(e)}"
+            self.sessions.append(session_id or DEFAULT_SESSION, "assistant", error_msg)
+            yield {"type": "error", "error": error_msg}
+            return
+        
+        # Add assistant response to chat history
+        self.sessions.append(session_id or DEFAULT_SESSION, "assistant", response_text)
+        yield {"type": "done", "response": response_text}
+    
+    async def _aadd_message(self, executor: Optional[Executor], session_id: Optional[str],
+                            role: str, content: str) -> None:
+        """Add a message to a session's history on ``executor``; with SESSION_DB it is a blocking SQLite write."""
+        loop = asyncio.get_running_loop()
+        # The session store is opened on first use, so look it up off the event loop too
+        await loop.run_in_executor(executor, lambda: self.sessions.append(session_id or DEFAULT_SESSION, role, content))
+    
+    async def achat(self, message: str, session_id: Optional[str] = None,
+                    executor: Optional[Executor] = None, filters: Optional[Dict[str, Any]] = None) -> str:
+        """Async ``chat``: retrieval runs in ``executor`` and the LLM call is awaited."""
+        if not message.strip():
+            return "Please enter a valid message."
+        
+        # Add user message to chat history
+        await self._aadd_message(executor, session_id, "user", message)
+        
+        try:
+            loop = asyncio.get_running_loop()
+            # Run in a copy of this context so retrieval spans reach the request's trace
+            prepared = await loop.run_in_executor(executor, contextvars.copy_context().run, self._prepare, message, filters)
+            
+            if prepared["cached"] is not None:
+                response_text = prepared["cached"]
+            else:
+                with span("llm"):
+                    response = await self.llm.ainvoke(prepared["prompt"])
+                response_text = response.content
+                self._remember_answer(prepared, response_text)
+            
+            # Add assistant response to chat history
+            await self._aadd_message(executor, session_id, "assistant", response_text)
+            
+            return response_text
+            
+        except Exception as e:
+            error_msg = f"Sorry, I encountered an error: {str(e)}"
+            await self._aadd_message(executor, session_id, "assistant", error_msg)
+            return error_msg
+    
+    async def astream_chat(self, message: str, session_id: Optional[str] = None,
+                           executor: Optional[Executor] = None,
+                           filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Async ``stream_chat``, yielding the same events."""
+        if not message.strip():
+            yield {"type": "error", "error": "Please enter a valid message."}
+            return
+        
+        # Add user message to chat history
+        await self._aadd_message(executor, session_id, "user", message)
+        
+        try:
+            loop = asyncio.get_running_loop()
+            # Run in a copy of this context so retrieval spans reach the request's trace
+            prepared = await loop.run_in_executor(executor, contextvars.copy_context().run, self._prepare, message, filters)
+            yield {"type": "sources", "sources": self._sources(prepared["context_docs"])}
+            
+            if prepared["cached"] is not None:
+                response_text = prepared["cached"]
+                yield {"type": "token", "content": response_text}
+            else:
+                parts = []
+                with span("llm"):
+                    async for chunk in self.llm.astream(prepared["prompt"]):
+                        if chunk.content:
+                            parts.append(chunk.content)
+                            yield {"type": "token", "content": chunk.content}
+                response_text = "".join(parts)
+                self._remember_answer(prepared, response_text)
+            
+        except Exception as e:
+            error_msg = f"Sorry, I encountered an error: {str(e)}"
+            await self._aadd_message(executor, session_id, "assistant", error_msg)
+            yield {"type": "error", "error": error_msg}
+            return
+        
+        # Add assistant response to chat history
+        await self._aadd_message(executor, session_id, "assistant", response_text)
+        yield {"type": "done", "response": response_text}
+    
+    def get_chat_history(self, session_id: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """Get the recent chat history of a session (SESSION_HISTORY_WINDOW messages by default)."""
+        return self.sessions.history(session_id or DEFAULT_SESSION, limit)
     
-    def clear_chat_history(self) -> None:
-        """Clear the chat history."""
-        self.chat_history = []
+    def clear_chat_history(self, session_id: Optional[str] = None) -> None:
+        """Clear the chat history of a session."""
+        self.sessions.clear(session_id or DEFAULT_SESSION)
 
 # Example usage
 if __name__ == "__main__":
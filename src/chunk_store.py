@@ -0,0 +1,166 @@
+"""Compact, memory-mapped storage for chunk text and metadata."""
+
+import json
+import mmap
+import os
+import sys
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+import numpy as np
+
+class ChunkStore:
+    """Offset-indexed chunk records backed by a memory-mapped file.
+
+    On disk a store is two files next to the FAISS index:
+    ``{prefix}_chunks.bin`` holds one compact UTF-8 JSON record per chunk and
+    ``{prefix}_chunks.offsets.npy`` holds ``len + 1`` uint64 byte offsets into
+    it. Records are decoded on access, so only the chunks a search returns are
+    ever parsed, and the mapped pages are shared between worker processes.
+    Embeddings are not stored; the FAISS index already holds the vectors.
+    Chunks added after loading are kept in memory until the next ``write``.
+    """
+
+    def __init__(self, documents: Optional[Iterable[Dict[str, Any]]] = None):
+        """Create an in-memory store, optionally seeded with documents."""
+        self._file = None
+        self._data: Optional[mmap.mmap] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._base_count = 0
+        self._pending: List[Dict[str, Any]] = []
+        if documents is not None:
+            self.extend(documents)
+
+    @staticmethod
+    def data_path(prefix: str) -> str:
+        return f"{prefix}_chunks.bin"
+
+    @staticmethod
+    def offsets_path(prefix: str) -> str:
+        return f"{prefix}_chunks.offsets.npy"
+
+    @classmethod
+    def exists(cls, prefix: str) -> bool:
+        """Check whether a chunk store has been written at this prefix."""
+        return Path(cls.offsets_path(prefix)).exists()
+
+    @classmethod
+    def open(cls, prefix: str) -> 'ChunkStore':
+        """Memory-map a chunk store written with ``write``."""
+        store = cls()
+        store._map(prefix)
+        return store
+
+    def _map(self, prefix: str) -> None:
+        """Attach the files at ``prefix`` as the persisted part of the store."""
+        self.close()
+        self._offsets = np.load(self.offsets_path(prefix), mmap_mode='r')
+        self._base_count = len(self._offsets) - 1
+        if self._offsets[-1] > 0:
+            self._file = open(self.data_path(prefix), 'rb')
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self) -> None:
+        """Release the memory map (persisted records become unavailable)."""
+        if self._data is not None:
+            self._data.close()
+            self._file.close()
+        self._file = None
+        self._data = None
+        self._offsets = None
+        self._base_count = 0
+
+    @staticmethod
+    def _encode(document: Dict[str, Any]) -> bytes:
+        record = {key: value for key, value in document.items() if key != "embedding"}
+        return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def _record_bytes(self, idx: int) -> bytes:
+        return self._data[int(self._offsets[idx]):int(self._offsets[idx + 1])]
+
+    def __len__(self) -> int:
+        return self._base_count + len(self._pending)
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        """Decode one chunk. Every call returns a fresh dict the caller may modify."""
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("chunk index out of range")
+
+        if idx >= self._base_count:
+            return dict(self._pending[idx - self._base_count])
+        return json.loads(self._record_bytes(idx))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def append(self, document: Dict[str, Any]) -> None:
+        """Add a chunk, dropping its embedding."""
+        self._pending.append({key: value for key, value in document.items() if key != "embedding"})
+
+    def extend(self, documents: Iterable[Dict[str, Any]]) -> None:
+        """Add several chunks, dropping their embeddings."""
+        for document in documents:
+            self.append(document)
+
+    def nbytes(self) -> int:
+        """Size of the persisted record data in bytes."""
+        return int(self._offsets[-1]) if self._offsets is not None else 0
+
+    def write(self, prefix: str, remap: bool = True) -> None:
+        """Write every chunk to ``prefix`` atomically and re-map the result.
+
+        With ``remap=False`` the store is left as it was, e.g. when writing a copy.
+        """
+        data_tmp = self.data_path(prefix) + ".tmp"
+        offsets = np.zeros(len(self) + 1, dtype=np.uint64)
+
+        with open(data_tmp, 'wb') as f:
+            # Persisted records are copied as raw bytes without decoding
+            if self._data is not None:
+                f.write(self._data[:int(self._offsets[-1])])
+                offsets[1:self._base_count + 1] = self._offsets[1:]
+            position = self.nbytes()
+            for i, document in enumerate(self._pending, start=self._base_count + 1):
+                position += f.write(self._encode(document))
+                offsets[i] = position
+
+        offsets_tmp = self.offsets_path(prefix) + ".tmp"
+        with open(offsets_tmp, 'wb') as f:
+            np.save(f, offsets)
+
+        os.replace(data_tmp, self.data_path(prefix))
+        os.replace(offsets_tmp, self.offsets_path(prefix))
+
+        if remap:
+            self._pending = []
+            self._map(prefix)
+
+def convert_json_metadata(filepath: str) -> int:
+    """Convert a legacy ``{filepath}_meta.json`` (documents inline) to the chunk store format.
+
+    Returns the number of chunks converted. The FAISS index file is untouched.
+    """
+    meta_path = f"{filepath}_meta.json"
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    documents = data.pop('documents', None)
+    if documents is None:
+        return 0  # Already converted
+
+    ChunkStore(documents).write(filepath)
+    data['count'] = len(documents)
+
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, meta_path)
+    return len(documents)
+
+if __name__ == "__main__":
+    # One-shot conversion: python -m src.chunk_store data/processed/vector_store
+    target = sys.argv[1] if len(sys.argv) > 1 else "data/processed/vector_store"
+    converted = convert_json_metadata(target)
+    print(f"Converted {converted} chunks at {target}")
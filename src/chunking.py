@@ -0,0 +1,235 @@
+"""Token-budgeted, structure-aware chunking for the YSJ Student Chatbot."""
+
+import os
+import re
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+# Paragraphs are separated by blank lines
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t\r\f\v]*\n\s*")
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[A-Z0-9\"'(\[])")
+_MARKDOWN_HEADING = re.compile(r"^#{1,6}\s+")
+_FALLBACK_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+_tokenizers: Dict[str, Any] = {}
+
+def _load_tokenizer(model_name: str):
+    """The embedding model's fast tokenizer, loaded once per process (None if unavailable)."""
+    if model_name not in _tokenizers:
+        repo = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        try:
+            # Same hub cache sentence-transformers downloads the model into
+            from huggingface_hub import hf_hub_download
+            from tokenizers import Tokenizer
+            tokenizer = Tokenizer.from_file(hf_hub_download(repo, "tokenizer.json"))
+            tokenizer.no_truncation()
+            tokenizer.no_padding()
+        except Exception as e:
+            print(f"Tokenizer for {repo} unavailable ({e}); estimating token counts instead")
+            tokenizer = None
+        _tokenizers[model_name] = tokenizer
+    return _tokenizers[model_name]
+
+class TokenCounter:
+    """Counts and locates tokens the way the embedding model's tokenizer does.
+
+    Falls back to a word/punctuation regex (a slight undercount for
+    WordPiece models) when the tokenizer cannot be loaded.
+    """
+
+    def __init__(self, model_name: Optional[str] = None):
+        """Use the tokenizer of ``model_name`` (default: EMBEDDING_MODEL)."""
+        self.model_name = model_name or os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        self.tokenizer = _load_tokenizer(self.model_name)
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        """Character ``(start, end)`` of every token in ``text``, excluding special tokens."""
+        if self.tokenizer is None:
+            return [match.span() for match in _FALLBACK_TOKEN.finditer(text)]
+        encoding = self.tokenizer.encode(text, add_special_tokens=False)
+        return list(encoding.offsets)
+
+    def count(self, text: str) -> int:
+        """Number of tokens in ``text``, excluding special tokens."""
+        return len(self.spans(text))
+
+def is_heading(line: str) -> bool:
+    """Heuristic for a heading line in plain text or extracted PDF text."""
+    line = line.strip()
+    if _MARKDOWN_HEADING.match(line):
+        return True
+    if not line or "\n" in line or len(line) > 80 or line[-1] in ".,;:!?":
+        return False
+    words = line.split()
+    if len(words) > 12:
+        return False
+    # "3.2 Appeals", "FITNESS TO STUDY" or "Fitness To Study Policy"
+    return bool(re.match(r"^\d+(\.\d+)*\.?\s+\S", line)) or line.isupper() or all(w[0].isupper() for w in words if w[0].isalpha())
+
+def _paragraph_spans(text: str) -> Iterable[Tuple[int, int]]:
+    """``(start, end)`` of each non-blank paragraph, trimmed of surrounding whitespace."""
+    position = 0
+    for separator in list(_PARAGRAPH_BREAK.finditer(text)) + [None]:
+        end = separator.start() if separator is not None else len(text)
+        start = position
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            yield start, end
+        if separator is not None:
+            position = separator.end()
+
+def text_blocks(text: str, page: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+    """Split text into paragraph blocks with character offsets, marking headings.
+
+    ``offset`` is added to every position so blocks from several pages
+    share one coordinate system.
+    """
+    blocks = []
+    for start, end in _paragraph_spans(text):
+        first_line_end = text.find("\n", start, end)
+        if first_line_end == -1:
+            blocks.append({"text": text[start:end], "start": offset + start, "end": offset + end,
+                           "page": page, "heading": is_heading(text[start:end])})
+            continue
+
+        # A heading line directly followed by body text is its own block
+        if is_heading(text[start:first_line_end]):
+            blocks.append({"text": text[start:first_line_end].strip(), "start": offset + start,
+                           "end": offset + first_line_end, "page": page, "heading": True})
+            start = first_line_end + 1
+            while text[start].isspace():
+                start += 1
+        blocks.append({"text": text[start:end], "start": offset + start, "end": offset + end,
+                       "page": page, "heading": False})
+    return blocks
+
+class TokenChunker:
+    """Packs document blocks into chunks of at most ``max_tokens`` model tokens.
+
+    Chunks never split inside a sentence unless the sentence alone exceeds
+    the budget, a heading always starts a new chunk (and is kept as its
+    first line), and paragraphs are split into sentences only when they do
+    not fit. With ``overlap_tokens`` the trailing sentences of a chunk, up to
+    that many tokens, are repeated at the start of the next one. Each chunk
+    records its character ``start``/``end`` in the document, its ``page``
+    range, the ``section`` heading it falls under and its token count.
+    """
+
+    def __init__(self, max_tokens: int = 250, overlap_tokens: int = 0, model_name: Optional[str] = None):
+        """Create a chunker for the embedding model's tokenizer (256-token window for MiniLM)."""
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.counter = TokenCounter(model_name)
+
+    @property
+    def signature(self) -> str:
+        """Identifies the chunking settings, so stores know when documents need re-chunking."""
+        counting = "tokenizer" if self.counter.tokenizer is not None else "estimate"
+        return f"{self.counter.model_name}:{counting}:{self.max_tokens}:{self.overlap_tokens}"
+
+    def _pieces(self, block: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+        """Yield a block whole, or as sentences, or as token windows, each within budget."""
+        text, start = block["text"], block["start"]
+        spans = self.counter.spans(text)
+        if len(spans) <= self.max_tokens:
+            yield {"text": text, "start": start, "end": block["end"], "tokens": len(spans), "sep": "\n\n"}
+            return
+
+        sep = "\n\n"
+        token = 0  # Index of the first token not yet assigned to a sentence
+        boundaries = [m.start() for m in _SENTENCE_END.finditer(text)] + [len(text)]
+        for boundary in boundaries:
+            first = token
+            while token < len(spans) and spans[token][1] <= boundary:
+                token += 1
+            inside = spans[first:token]
+            if not inside:
+                continue
+            if len(inside) <= self.max_tokens:
+                yield {"text": text[inside[0][0]:inside[-1][1]], "start": start + inside[0][0],
+                       "end": start + inside[-1][1], "tokens": len(inside), "sep": sep}
+            else:
+                # A single overlong sentence is cut into token windows
+                for i in range(0, len(inside), self.max_tokens):
+                    window = inside[i:i + self.max_tokens]
+                    yield {"text": text[window[0][0]:window[-1][1]], "start": start + window[0][0],
+                           "end": start + window[-1][1], "tokens": len(window), "sep": sep}
+                    sep = " "
+            sep = " "
+
+    def _emit(self, pieces: List[Dict[str, Any]], section: Optional[str]) -> Dict[str, Any]:
+        text = pieces[0]["text"]
+        for piece in pieces[1:]:
+            text += piece["sep"] + piece["text"]
+        pages = [piece["page"] for piece in pieces if piece.get("page") is not None]
+        return {
+            "text": text,
+            "start": pieces[0]["start"],
+            "end": pieces[-1]["end"],
+            "page": pages[0] if pages else None,
+            "page_end": pages[-1] if pages else None,
+            "section": section,
+            "tokens": sum(piece["tokens"] for piece in pieces),
+        }
+
+    def chunk_blocks(self, blocks: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Chunk a document given as ordered blocks (see ``text_blocks``)."""
+        return list(self.iter_chunks(blocks))
+
+    def iter_chunks(self, blocks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Lazily chunk a stream of blocks; only the chunk being built is held in memory."""
+        current: List[Dict[str, Any]] = []
+        tokens = 0
+        section: Optional[str] = None
+
+        for block in blocks:
+            if not block["text"].strip():
+                continue
+            if block.get("heading"):
+                # Consecutive headings stay together with the text that follows them
+                if any(not piece["heading"] for piece in current):
+                    yield self._emit(current, section)
+                    current, tokens = [], 0
+                section = _MARKDOWN_HEADING.sub("", block["text"].strip())
+
+            for piece in self._pieces(block):
+                piece["page"] = block.get("page")
+                if current and tokens + piece["tokens"] > self.max_tokens:
+                    yield self._emit(current, section)
+                    # Carry trailing pieces forward as overlap
+                    carried: List[Dict[str, Any]] = []
+                    carried_tokens = 0
+                    for previous in reversed(current):
+                        if carried_tokens + previous["tokens"] > self.overlap_tokens or previous.get("heading"):
+                            break
+                        carried.insert(0, previous)
+                        carried_tokens += previous["tokens"]
+                    if carried_tokens + piece["tokens"] > self.max_tokens:
+                        carried, carried_tokens = [], 0
+                    current, tokens = carried, carried_tokens
+                piece["heading"] = block.get("heading", False)
+                current.append(piece)
+                tokens += piece["tokens"]
+
+        if current:
+            yield self._emit(current, section)
+
+    def chunk_text(self, text: str) -> List[Dict[str, Any]]:
+        """Chunk plain text."""
+        return self.chunk_blocks(text_blocks(text))
+
+_default_chunker: Optional[TokenChunker] = None
+
+def get_chunker() -> TokenChunker:
+    """Process-wide chunker configured by CHUNK_MAX_TOKENS and CHUNK_OVERLAP_TOKENS."""
+    global _default_chunker
+    if _default_chunker is None:
+        _default_chunker = TokenChunker(
+            max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", "250")),
+            overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+        )
+    return _default_chunker
@@ -0,0 +1,145 @@
+"""Token-budgeted prompt context assembly for the YSJ Student Chatbot."""
+
+import re
+from typing import List, Dict, Any, Optional, Set, Tuple
+from .chunking import TokenCounter, get_chunker
+
+_WORD = re.compile(r"\w+")
+
+# Chunks of one source at most this many characters apart (a paragraph break) are adjacent
+_MAX_GAP = 4
+
+# Leading characters of a chunk looked up in its predecessor to find repeated text
+_PROBE_CHARS = 32
+
+def _splice(first: str, second: str, overlap: int) -> str:
+    """``first`` followed by whatever of ``second`` it does not already end with.
+
+    ``overlap`` is roughly how many characters the two share according to
+    their offsets; separators between pieces may differ slightly.
+    """
+    probe = second[:max(1, min(_PROBE_CHARS, overlap))]
+    pos = first.find(probe, max(0, len(first) - len(second)))
+    while pos != -1:
+        if second.startswith(first[pos:]):
+            return first + second[len(first) - pos:]
+        pos = first.find(probe, pos + 1)
+    return first + "\n\n" + second
+
+def _shingles(text: str) -> Set[Tuple[str, ...]]:
+    """Word 3-grams of ``text``, case-insensitive (the words themselves for very short texts)."""
+    words = _WORD.findall(text.lower())
+    if len(words) < 3:
+        return {(word,) for word in words}
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+class ContextBuilder:
+    """Turns retrieved chunks into the context passed to the LLM.
+
+    Hits whose L2 distance exceeds ``max_distance`` are dropped (lexical-only
+    hits have no distance and are kept). Overlapping or adjacent chunks of
+    the same source are merged by their ``start``/``end`` offsets, so text
+    repeated between them is sent once, and passages that mostly repeat a
+    more relevant one (at least ``duplicate_threshold`` of their word
+    3-grams) are dropped. What remains is packed, most relevant first, into
+    ``max_tokens`` tokens as counted by the embedding model's tokenizer, a
+    close enough estimate of the LLM's.
+    """
+
+    def __init__(self, max_tokens: int = 1000, max_distance: Optional[float] = 1.5,
+                 duplicate_threshold: float = 0.8, counter: Optional[TokenCounter] = None):
+        """Create a builder; ``max_distance=None`` disables the relevance cutoff."""
+        self.max_tokens = max_tokens
+        self.max_distance = max_distance
+        self.duplicate_threshold = duplicate_threshold
+        self._counter = counter
+
+    @property
+    def counter(self) -> TokenCounter:
+        """Token counter, shared with the chunker unless one was given."""
+        if self._counter is None:
+            self._counter = get_chunker().counter
+        return self._counter
+
+    def relevant(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """The hits within the distance cutoff, in their original order."""
+        if self.max_distance is None:
+            return list(docs)
+        return [doc for doc in docs if doc.get("score") is None or doc["score"] <= self.max_distance]
+
+    def merge(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merge overlapping or adjacent chunks of each source.
+
+        Returns passages ordered by their most relevant chunk, each with the
+        merged ``text``, ``source``, ``start``/``end`` and the ``docs`` it
+        was built from. Chunks without offsets stay passages of their own.
+        """
+        passages: List[Dict[str, Any]] = []
+        by_source: Dict[Any, List[Tuple[int, Dict[str, Any]]]] = {}
+        for rank, doc in enumerate(docs):
+            if doc.get("start") is None or doc.get("end") is None:
+                passages.append({"rank": rank, "text": doc["text"], "source": doc.get("source"),
+                                 "start": None, "end": None, "docs": [doc]})
+            else:
+                by_source.setdefault(doc.get("source"), []).append((rank, doc))
+
+        for source, ranked in by_source.items():
+            ranked.sort(key=lambda item: (item[1]["start"], -item[1]["end"]))
+            current: Optional[Dict[str, Any]] = None
+            for rank, doc in ranked:
+                if current is not None and doc["start"] <= current["end"] + _MAX_GAP:
+                    if doc["end"] > current["end"]:
+                        if doc["start"] < current["end"]:
+                            current["text"] = _splice(current["text"], doc["text"], current["end"] - doc["start"])
+                        else:
+                            current["text"] += "\n\n" + doc["text"]
+                        current["end"] = doc["end"]
+                    current["rank"] = min(current["rank"], rank)
+                    current["docs"].append(doc)
+                    continue
+                current = {"rank": rank, "text": doc["text"], "source": source,
+                           "start": doc["start"], "end": doc["end"], "docs": [doc]}
+                passages.append(current)
+
+        passages.sort(key=lambda passage: passage["rank"])
+        return passages
+
+    def deduplicate(self, passages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop passages that mostly repeat a more relevant one (or are mostly repeated by it), and empty ones."""
+        kept: List[Tuple[Dict[str, Any], Set[Tuple[str, ...]]]] = []
+        for passage in passages:
+            shingles = _shingles(passage["text"])
+            if not shingles:
+                continue
+            if not any(len(shingles & other) / min(len(shingles), len(other)) >= self.duplicate_threshold
+                       for _, other in kept):
+                kept.append((passage, shingles))
+        return [passage for passage, _ in kept]
+
+    def pack(self, passages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Greedily fit passages, most relevant first, into the token budget.
+
+        A passage that does not fit is skipped for a smaller one further
+        down, except the most relevant, which is cut at a token boundary.
+        """
+        packed: List[Dict[str, Any]] = []
+        remaining = self.max_tokens
+        for passage in passages:
+            spans = self.counter.spans(passage["text"])
+            if len(spans) <= remaining:
+                packed.append({**passage, "tokens": len(spans)})
+                remaining -= len(spans)
+            elif not packed and remaining > 0:
+                packed.append({**passage, "text": passage["text"][:spans[remaining - 1][1]], "tokens": remaining})
+                remaining = 0
+            if remaining <= 0:
+                break
+        return packed
+
+    def build(self, docs: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+        """Context text for ``docs`` (ranked hits) and the hits it includes, most relevant first."""
+        passages = self.pack(self.deduplicate(self.merge(self.relevant(docs))))
+        context = "\n\n".join(passage["text"] for passage in passages)
+        rank = {id(doc): i for i, doc in enumerate(docs)}
+        used = sorted((doc for passage in passages for doc in passage["docs"]), key=lambda doc: rank[id(doc)])
+        return context, used
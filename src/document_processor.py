@@ -1,23 +1,33 @@
 """Document processing utilities for the YSJ Student Chatbot."""
 
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
 import PyPDF2
 from docx import Document
+from .chunking import get_chunker, text_blocks
+from .metrics import timed
+
+# Plain-text paragraphs longer than this are split at a line break while streaming
+MAX_TXT_BLOCK_CHARS = 64 * 1024
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt', '.md')
 
 class DocumentProcessor:
     """Handles loading and processing of various document formats."""
     
+    @staticmethod
+    def iter_pdf_pages(file_path: str) -> Iterator[Tuple[int, str]]:
+        """Yield ``(page_number, text)`` for each page of a PDF, one page at a time."""
+        with open(file_path, 'rb') as file:
+            reader = PyPDF2.PdfReader(file)
+            for page_number, page in enumerate(reader.pages, start=1):
+                yield page_number, page.extract_text() or ""
+    
     @staticmethod
     def load_pdf(file_path: str) -> str:
         """Extract text from a PDF file."""
         try:
-            with open(file_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-            return text
+            return "".join(f"{text}\n" for _, text in DocumentProcessor.iter_pdf_pages(file_path))
         except Exception as e:
             print(f"Error reading PDF {file_path}: {e}")
             return ""
@@ -42,9 +52,81 @@ class DocumentProcessor:
             print(f"Error reading TXT {file_path}: {e}")
             return ""
     
+    @staticmethod
+    def _iter_txt_blocks(file_path: str) -> Iterator[Dict[str, Any]]:
+        """Stream a text file as paragraph blocks without reading it whole."""
+        buffer: List[str] = []
+        buffer_start = 0
+        buffer_chars = 0
+        offset = 0
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                buffer.append(line)
+                buffer_chars += len(line)
+                offset += len(line)
+                if not line.strip() or buffer_chars >= MAX_TXT_BLOCK_CHARS:
+                    yield from text_blocks("".join(buffer), offset=buffer_start)
+                    buffer, buffer_start, buffer_chars = [], offset, 0
+        if buffer:
+            yield from text_blocks("".join(buffer), offset=buffer_start)
+    
+    @staticmethod
+    def _iter_docx_blocks(file_path: str) -> Iterator[Dict[str, Any]]:
+        """Yield DOCX paragraphs as blocks; Heading/Title styles mark headings."""
+        offset = 0
+        for paragraph in Document(file_path).paragraphs:
+            text = paragraph.text
+            if text.strip():
+                style = paragraph.style.name if paragraph.style is not None else ""
+                yield {
+                    "text": text.strip(),
+                    "start": offset + len(text) - len(text.lstrip()),
+                    "end": offset + len(text.rstrip()),
+                    "page": None,
+                    "heading": style.startswith(("Heading", "Title"))
+                }
+            offset += len(text) + 1
+    
+    @staticmethod
+    def _iter_pdf_blocks(file_path: str) -> Iterator[Dict[str, Any]]:
+        """Yield the paragraph blocks of a PDF page by page."""
+        offset = 0
+        for page_number, page_text in DocumentProcessor.iter_pdf_pages(file_path):
+            yield from text_blocks(page_text, page=page_number, offset=offset)
+            offset += len(page_text) + 1
+    
+    @staticmethod
+    def iter_blocks(file_path: str) -> Iterator[Dict[str, Any]]:
+        """Lazily extract a document as ordered paragraph blocks with offsets, pages and headings.
+        
+        PDFs are read page by page and text files line by line, so memory
+        does not grow with document size. Unsupported or unreadable files
+        yield nothing (a read error stops the document where it occurred).
+        """
+        file_path = str(file_path)
+        extension = Path(file_path).suffix.lower()
+        readers = {
+            '.pdf': DocumentProcessor._iter_pdf_blocks,
+            '.docx': DocumentProcessor._iter_docx_blocks,
+            '.txt': DocumentProcessor._iter_txt_blocks,
+            '.md': DocumentProcessor._iter_txt_blocks,
+        }
+        if extension not in readers:
+            print(f"Unsupported file format: {extension}")
+            return
+        try:
+            yield from readers[extension](file_path)
+        except Exception as e:
+            print(f"Error reading {file_path}: {e}")
+    
+    @staticmethod
+    def extract_blocks(file_path: str) -> List[Dict[str, Any]]:
+        """Extract all paragraph blocks of a document (see ``iter_blocks``)."""
+        return list(DocumentProcessor.iter_blocks(file_path))
+    
     @staticmethod
     def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[Dict[str, Any]]:
-        """Split text into overlapping chunks."""
+        """Split text into overlapping fixed-size character chunks (legacy; see ``TokenChunker``)."""
         if not text:
             return []
             
@@ -65,24 +147,21 @@ class DocumentProcessor:
         return chunks
     
     @classmethod
-    def process_document(cls, file_path: str) -> List[Dict[str, Any]]:
-        """Process a document based on its extension and return chunks."""
-        file_path = str(file_path) # Ensure string
-        extension = Path(file_path).suffix.lower()
+    def iter_chunks(cls, file_path: str) -> Iterator[Dict[str, Any]]:
+        """Lazily extract and chunk a document, one chunk at a time.
         
-        text = ""
-        if extension == '.pdf':
-            text = cls.load_pdf(file_path)
-        elif extension == '.docx':
-            text = cls.load_docx(file_path)
-        elif extension == '.txt' or extension == '.md':
-            text = cls.load_txt(file_path)
-        else:
-            print(f"Unsupported file format: {extension}")
-            return []
-            
-        if not text.strip():
+        Chunks respect headings, paragraphs and sentences and fit the
+        embedding model's window (CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS).
+        """
+        count = 0
+        for chunk in get_chunker().iter_chunks(cls.iter_blocks(file_path)):
+            count += 1
+            yield chunk
+        if count == 0 and Path(str(file_path)).suffix.lower() in SUPPORTED_EXTENSIONS:
             print(f"Warning: No text extracted from {file_path}")
-            return []
-            
-        return cls.chunk_text(text)
+    
+    @classmethod
+    @timed("extract")
+    def process_document(cls, file_path: str) -> List[Dict[str, Any]]:
+        """Process a document based on its extension and return token-budgeted chunks."""
+        return list(cls.iter_chunks(file_path))
@@ -0,0 +1,162 @@
+"""Persistent embedding cache for the YSJ Student Chatbot."""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List, Dict, Optional, Sequence
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+
+class EmbeddingCache:
+    """Embeddings keyed by ``(model_name, normalized text hash)``.
+
+    A small in-memory LRU sits in front of a SQLite table of vector blobs.
+    The table is bounded to ``max_disk_entries`` rows; when it overflows the
+    least recently used tenth is evicted. Vectors can be stored as float16 to
+    halve the file size (differences stay around 1e-3, well below what
+    changes a nearest-neighbour ranking). The SQLite file uses WAL mode so
+    several worker processes can share it.
+    """
+
+    def __init__(self, path: Optional[str], model_name: str, memory_size: int = 4096,
+                 max_disk_entries: int = 500_000, dtype: str = "float32"):
+        """Open (or create) the cache. ``path=None`` keeps only the in-memory LRU."""
+        if dtype not in ("float32", "float16"):
+            raise ValueError("dtype must be 'float32' or 'float16'")
+
+        self.model_name = model_name
+        self.memory_size = memory_size
+        self.max_disk_entries = max_disk_entries
+        self.dtype = np.dtype(dtype)
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, dtype TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+            self._db.commit()
+            self._disk_count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize text so trivially different inputs share an entry."""
+        return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+    def key(self, text: str) -> str:
+        """Cache key for a text under this cache's model."""
+        payload = f"{self.model_name}\0{self.normalize(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Look up several texts; missing entries are returned as None."""
+        keys = [self.key(text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            missing: Dict[str, List[int]] = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+
+            if missing and self._db is not None:
+                found = []
+                batch = list(missing)
+                for start in range(0, len(batch), 500):  # Stay under SQLite's variable limit
+                    chunk = batch[start:start + 500]
+                    rows = self._db.execute(
+                        f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                    for key, dtype, blob in rows:
+                        vector = np.frombuffer(blob, dtype=dtype).astype(np.float32)
+                        self._remember(key, vector)
+                        for i in missing.pop(key):
+                            results[i] = vector
+                            self.hits += 1
+                            self.disk_hits += 1
+                        found.append(key)
+                if found:
+                    now = time.time()
+                    self._db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                         [(now, key) for key in found])
+                    self._db.commit()
+
+            self.misses += sum(len(positions) for positions in missing.values())
+        return results
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Look up a single text."""
+        return self.get_many([text])[0]
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[np.ndarray]) -> None:
+        """Store embeddings for several texts."""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, self.dtype.name, vector.astype(self.dtype).tobytes(), now))
+
+            if self._db is not None and rows:
+                self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+                self._disk_count += len(rows)  # Upper bound; replaced rows are recounted below
+                if self._disk_count > self.max_disk_entries:
+                    self._evict()
+                self._db.commit()
+
+    def _evict(self) -> None:
+        """Drop the least recently used tenth of the table once it is over budget."""
+        count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count > self.max_disk_entries:
+            excess = count - self.max_disk_entries + self.max_disk_entries // 10
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            count -= excess
+        self._disk_count = count
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters since the cache was opened."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self) -> None:
+        """Close the SQLite connection."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -1,28 +1,252 @@
 """Embedding utilities for the YSJ Student Chatbot."""
 
-from typing import List, Dict, Any
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from .embedding_cache import EmbeddingCache
+from .metrics import BATCH_SIZE_BUCKETS, LATENCY_MS_BUCKETS, REGISTRY, Histogram
+
+# Inference backends: PyTorch sentence-transformers, or its ONNX export (optionally int8)
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Query coalescing across every MicroBatchingEmbedder, for Prometheus
+EMBED_QUEUE_SECONDS = REGISTRY.histogram("ysj_embed_queue_seconds", "Time queries waited to be batched for embedding.")
+EMBED_BATCH_SIZE = REGISTRY.histogram("ysj_embed_batch_size", "Queries encoded per coalesced batch.",
+                                      buckets=BATCH_SIZE_BUCKETS)
+
+_models: Dict[Tuple[str, str], Any] = {}
+_models_lock = threading.Lock()
+
+def load_sentence_transformer(model_name: str, backend: str = "torch"):
+    """The encoder for ``model_name`` on ``backend``, loaded once per process.
+
+    Loaded before a server forks its workers, the weights are shared
+    copy-on-write by all of them. ONNX backends use EMBEDDING_THREADS
+    intra-op threads and EMBEDDING_ONNX_PATH, if set, as the graph.
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Expected one of {EMBEDDING_BACKENDS}")
+    with _models_lock:
+        if (model_name, backend) not in _models:
+            if backend == "torch":
+                # Imported here: sentence-transformers pulls in torch, which takes seconds
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(model_name)
+            else:
+                from .onnx_encoder import OnnxSentenceEncoder
+                model = OnnxSentenceEncoder(
+                    model_name,
+                    model_path=os.getenv("EMBEDDING_ONNX_PATH") or None,
+                    quantize=backend == "onnx-int8",
+                    threads=int(os.getenv("EMBEDDING_THREADS", "0")),
+                    cache_dir=os.getenv("EMBEDDING_ONNX_DIR", "data/models")
+                )
+            _models[(model_name, backend)] = model
+        return _models[(model_name, backend)]
+
+def cache_namespace(model_name: str, backend: str) -> str:
+    """Embedding cache key prefix: int8 vectors are cached apart from full-precision ones."""
+    return f"{model_name}:int8" if backend == "onnx-int8" else model_name
 
 class EmbeddingModel:
     """Handles text embedding generation using pre-trained models."""
     
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
-        """Initialize the embedding model."""
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', cache: Optional[EmbeddingCache] = None,
+                 backend: str = "torch"):
+        """Initialize the embedding model, optionally with an embedding cache.
+
+        ``backend`` is one of ``EMBEDDING_BACKENDS``. The model itself is
+        loaded on first use.
+        """
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend '{backend}'. Expected one of {EMBEDDING_BACKENDS}")
         self.model_name = model_name
+        self.backend = backend
+        self.cache = cache
+        self._model = None
+
+    @property
+    def model(self):
+        """The underlying SentenceTransformer (or its ONNX stand-in)."""
+        if self._model is None:
+            self._model = load_sentence_transformer(self.model_name, self.backend)
+        return self._model
+
+    @model.setter
+    def model(self, model) -> None:
+        self._model = model
     
     def embed_text(self, text: str) -> np.ndarray:
         """Generate embedding for a single text."""
-        return self.model.encode(text, convert_to_numpy=True)
+        if self.cache is not None:
+            cached = self.cache.get(text)
+            if cached is not None:
+                return cached
+        
+        embedding = self.model.encode(text, convert_to_numpy=True)
+        if self.cache is not None:
+            self.cache.put_many([text], [embedding])
+        return embedding
+    
+    def embed_texts(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        """Generate embeddings for many texts at once, as an ``(n, dimension)`` float32 matrix."""
+        # Only encode texts the cache has not seen
+        if self.cache is not None:
+            cached = self.cache.get_many(texts)
+            missing = [i for i, embedding in enumerate(cached) if embedding is None]
+            if missing:
+                encoded = self.model.encode([texts[i] for i in missing], batch_size=batch_size,
+                                            show_progress_bar=show_progress_bar, convert_to_numpy=True)
+                self.cache.put_many([texts[i] for i in missing], encoded)
+                for i, embedding in zip(missing, encoded):
+                    cached[i] = embedding
+            if not texts:
+                return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+            return np.vstack(cached).astype(np.float32, copy=False)
+        
+        encoded = self.model.encode(texts, batch_size=batch_size, show_progress_bar=show_progress_bar,
+                                    convert_to_numpy=True)
+        return np.asarray(encoded, dtype=np.float32)
     
-    def embed_documents(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def embed_documents(self, documents: List[Dict[str, Any]], show_progress_bar: bool = True) -> List[Dict[str, Any]]:
         """Generate embeddings for multiple document chunks."""
-        texts = [doc["text"] for doc in documents]
-        embeddings = self.model.encode(texts, show_progress_bar=True)
+        embeddings = self.embed_texts([doc["text"] for doc in documents], show_progress_bar=show_progress_bar)
         
         # Add embeddings to documents
         for doc, embedding in zip(documents, embeddings):
             doc["embedding"] = embedding.tolist()
             
         return documents
+    
+    def cache_stats(self) -> Dict[str, float]:
+        """Embedding cache hit/miss counters (empty if caching is disabled)."""
+        return self.cache.stats() if self.cache is not None else {}
+
+class MicroBatchingEmbedder:
+    """Coalesces concurrent ``embed_text`` calls into batched forward passes.
+
+    Queries that miss the cache are queued for a background thread, which
+    takes the oldest, gathers any others that arrive within ``window_ms`` of
+    it (up to ``max_batch``), encodes them together and hands each caller
+    its own vector. Queries that queued up while the previous batch was
+    encoding go straight into the next one, so ``window_ms=0`` coalesces
+    without delaying anyone. Bulk calls (``embed_texts``,
+    ``embed_documents``) are already batched and go straight to the model.
+
+    ``stats()`` reports how long queries waited and how large batches were,
+    for tuning the window to the traffic; the same figures are exported as
+    ``ysj_embed_queue_seconds`` and ``ysj_embed_batch_size``.
+    """
+
+    def __init__(self, embedder: EmbeddingModel, window_ms: float = 2.0, max_batch: int = 32):
+        """Wrap ``embedder``, waiting up to ``window_ms`` to fill batches of ``max_batch``."""
+        self.embedder = embedder
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue_ms = Histogram(LATENCY_MS_BUCKETS)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self._queue: Optional[queue.Queue] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def model_name(self) -> str:
+        return self.embedder.model_name
+
+    @property
+    def model(self):
+        """The underlying SentenceTransformer (or its ONNX stand-in)."""
+        return self.embedder.model
+
+    @model.setter
+    def model(self, model) -> None:
+        self.embedder.model = model
+
+    @property
+    def cache(self) -> Optional[EmbeddingCache]:
+        return self.embedder.cache
+
+    @cache.setter
+    def cache(self, cache: Optional[EmbeddingCache]) -> None:
+        self.embedder.cache = cache
+
+    def _pending(self) -> queue.Queue:
+        # Threads do not survive a fork, so each process starts its own on first use
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                    threading.Thread(target=self._run, args=(self._queue,), daemon=True,
+                                     name="embedding-batcher").start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def _run(self, pending: queue.Queue) -> None:
+        while True:
+            batch = [pending.get()]
+            deadline = batch[0][1] + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                try:
+                    batch.append(pending.get(timeout=timeout) if timeout > 0 else pending.get_nowait())
+                except queue.Empty:
+                    break
+            self._encode(batch)
+
+    def _encode(self, batch: List[Tuple[str, float, Future]]) -> None:
+        start = time.perf_counter()
+        queue_seconds = EMBED_QUEUE_SECONDS.labels()
+        for _, queued_at, _ in batch:
+            self.queue_ms.observe((start - queued_at) * 1000)
+            queue_seconds.observe(start - queued_at)
+        self.batch_sizes.observe(len(batch))
+        EMBED_BATCH_SIZE.labels().observe(len(batch))
+
+        texts = [text for text, _, _ in batch]
+        try:
+            vectors = self.embedder.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+            if self.embedder.cache is not None:
+                self.embedder.cache.put_many(texts, vectors)
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    def embed_text(self, text: str) -> np.ndarray:
+        """Generate embedding for a single text, batched with concurrent callers."""
+        if self.embedder.cache is not None:
+            cached = self.embedder.cache.get(text)
+            if cached is not None:
+                return cached
+
+        future: Future = Future()
+        self._pending().put((text, time.perf_counter(), future))
+        return future.result()
+
+    def embed_texts(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        """Generate embeddings for many texts at once (not coalesced)."""
+        return self.embedder.embed_texts(texts, batch_size=batch_size, show_progress_bar=show_progress_bar)
+
+    def embed_documents(self, documents: List[Dict[str, Any]], show_progress_bar: bool = True) -> List[Dict[str, Any]]:
+        """Generate embeddings for multiple document chunks (not coalesced)."""
+        return self.embedder.embed_documents(documents, show_progress_bar=show_progress_bar)
+
+    def cache_stats(self) -> Dict[str, float]:
+        """Embedding cache hit/miss counters (empty if caching is disabled)."""
+        return self.embedder.cache_stats()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue-time (ms) and batch-size histograms, and the cache counters."""
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "queue_ms": self.queue_ms.summary(),
+            "batch_size": self.batch_sizes.summary(),
+            "cache": self.cache_stats(),
+        }
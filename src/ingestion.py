@@ -0,0 +1,309 @@
+"""Parallel, pipelined bulk ingestion for the YSJ Student Chatbot."""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Optional, Tuple
+from .document_processor import DocumentProcessor
+from .metrics import SPAN_SECONDS, span
+from .rag_pipeline import CHUNKS_INGESTED, batched
+
+# Marks the end of a stage's output
+_DONE = object()
+
+def _extract(file_path: str) -> Tuple[str, List[Dict[str, Any]], float, Optional[str]]:
+    """Parse and chunk one whole file (runs in a worker process)."""
+    start = time.perf_counter()
+    try:
+        chunks = DocumentProcessor.process_document(file_path)
+        return file_path, chunks, time.perf_counter() - start, None
+    except Exception as e:
+        return file_path, [], time.perf_counter() - start, str(e)
+
+class StageStats:
+    """Throughput counters for one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.files = 0
+        self.chunks = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.busy_seconds if self.busy_seconds else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "files": self.files,
+            "chunks": self.chunks,
+            "busy_seconds": self.busy_seconds,
+            "chunks_per_second": self.chunks_per_second,
+        }
+
+class IngestionEngine:
+    """Three-stage ingestion: extract -> embed -> write.
+
+    Files are parsed and chunked in a process pool. Their chunks flow through
+    a bounded queue to a single embedder thread that forms large batches
+    across documents, then through a second bounded queue to a single writer
+    that adds them to the vector store. The whole run is one batch, so the
+    store is flushed once at the end. Full queues block the stage feeding
+    them, which bounds memory however many files are ingested. Chunks travel
+    in parts of at most ``embed_batch_size``; with ``extract_workers=0`` each
+    file is extracted lazily, so memory is also bounded however large a
+    single file is.
+
+    Files whose content hash matches the manifest are skipped, and the chunks
+    of modified (and, optionally, removed) files are replaced.
+    """
+
+    def __init__(self, rag_pipeline, extract_workers: Optional[int] = None,
+                 embed_batch_size: int = 256, queue_size: int = 8):
+        """Initialize the engine.
+
+        ``extract_workers=0`` parses files in the calling process instead of a pool.
+        """
+        self.rag = rag_pipeline
+        self.extract_workers = (os.cpu_count() or 1) if extract_workers is None else extract_workers
+        self.embed_batch_size = embed_batch_size
+        self.queue_size = queue_size
+
+        self.stats = {name: StageStats(name) for name in ("extract", "embed", "write")}
+        self.errors: List[Tuple[str, str]] = []
+        self.processed_files: List[str] = []
+        self.skipped_files = 0
+        self.removed_files = 0
+        self.wall_seconds = 0.0
+
+        self._abort = threading.Event()
+        self._failure: Optional[BaseException] = None
+
+    def _put(self, q: queue.Queue, item: Any) -> None:
+        """Blocking put that gives up if another stage has failed."""
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise RuntimeError("Ingestion aborted")
+
+    def _get(self, q: queue.Queue) -> Any:
+        """Blocking get that gives up if another stage has failed."""
+        while not self._abort.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        raise RuntimeError("Ingestion aborted")
+
+    def _fail(self, error: BaseException) -> None:
+        if self._failure is None:
+            self._failure = error
+        self._abort.set()
+
+    def _embed_stage(self, chunk_queue: queue.Queue, write_queue: queue.Queue) -> None:
+        """Collect chunks across documents and embed them in large batches."""
+        stats = self.stats["embed"]
+        failed = set()
+
+        def embed_batch(chunks: List[Dict[str, Any]], parts: List[Tuple[str, int, bool]]) -> None:
+            start = time.perf_counter()
+            try:
+                with span("ingest_embed"):
+                    embedded = self.rag.embedding_model.embed_documents(chunks, show_progress_bar=False) if chunks else []
+            except Exception as e:
+                files = {path for path, _, _ in parts}
+                self.errors.extend((path, f"Embedding failed: {e}") for path in files)
+                failed.update(files)
+                self._put(write_queue, (parts, None))  # Lets the writer drop their earlier parts
+                return
+            stats.busy_seconds += time.perf_counter() - start
+            stats.chunks += len(embedded)
+            stats.files += sum(1 for _, _, final in parts if final)
+            self._put(write_queue, (parts, embedded))
+
+        try:
+            pending: List[Dict[str, Any]] = []
+            pending_parts: List[Tuple[str, int, bool]] = []  # (file, number of chunks, last part) in batch order
+            while True:
+                item = self._get(chunk_queue)
+                if item is _DONE:
+                    break
+                file_path, chunks, final = item
+                if file_path in failed:
+                    continue
+                if chunks is None:
+                    # Extraction failed part-way: write what is pending, then drop the file
+                    if pending_parts:
+                        embed_batch(pending, pending_parts)
+                        pending, pending_parts = [], []
+                    failed.add(file_path)
+                    self._put(write_queue, ([(file_path, 0, True)], None))
+                    continue
+                pending.extend(chunks)
+                pending_parts.append((file_path, len(chunks), final))
+                if len(pending) >= self.embed_batch_size:
+                    embed_batch(pending, pending_parts)
+                    pending, pending_parts = [], []
+            if pending_parts:
+                embed_batch(pending, pending_parts)
+            self._put(write_queue, _DONE)
+        except BaseException as e:
+            self._fail(e)
+
+    def _write_stage(self, write_queue: queue.Queue) -> None:
+        """Add embedded chunks to the vector store, recording each file once its last part is added."""
+        stats = self.stats["write"]
+        chunk_ids: Dict[str, List[int]] = {}  # Files with parts added but not yet recorded
+        try:
+            while True:
+                item = self._get(write_queue)
+                if item is _DONE:
+                    break
+                parts, chunks = item
+                start = time.perf_counter()
+                if chunks is None:
+                    # Embedding failed: discard what was already added for these files
+                    for file_path, _, _ in parts:
+                        self.rag.vector_store.delete(chunk_ids.pop(file_path, []))
+                    continue
+                offset = 0
+                for file_path, count, final in parts:
+                    ids = chunk_ids.setdefault(file_path, [])
+                    ids.extend(self.rag.add_chunks(file_path, chunks[offset:offset + count]))
+                    offset += count
+                    if final:
+                        self.rag.record_file(file_path, chunk_ids.pop(file_path))
+                        self.processed_files.append(file_path)
+                        stats.files += 1
+                stats.busy_seconds += time.perf_counter() - start
+                stats.chunks += len(chunks)
+                CHUNKS_INGESTED.inc(len(chunks))
+        except BaseException as e:
+            self._fail(e)
+
+    def _extract_stage(self, file_paths: List[str], chunk_queue: queue.Queue) -> None:
+        """Parse files, keeping at most two per worker in flight."""
+        stats = self.stats["extract"]
+
+        def handle(result: Tuple[str, List[Dict[str, Any]], float, Optional[str]]) -> None:
+            file_path, chunks, seconds, error = result
+            stats.busy_seconds += seconds
+            SPAN_SECONDS.labels(span="extract").observe(seconds)  # Timed in the worker process
+            if error is not None:
+                self.errors.append((file_path, error))
+                return
+            stats.files += 1
+            stats.chunks += len(chunks)
+            for start in range(0, len(chunks), self.embed_batch_size):
+                self._put(chunk_queue, (file_path, chunks[start:start + self.embed_batch_size], False))
+            self._put(chunk_queue, (file_path, [], True))
+
+        if self.extract_workers == 0:
+            for file_path in file_paths:
+                self._extract_streaming(file_path, chunk_queue)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.extract_workers) as pool:
+            remaining = iter(file_paths)
+            in_flight = set()
+            while True:
+                while len(in_flight) < 2 * self.extract_workers:
+                    file_path = next(remaining, None)
+                    if file_path is None:
+                        break
+                    in_flight.add(pool.submit(_extract, file_path))
+                if not in_flight:
+                    break
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    handle(future.result())
+
+    def _extract_streaming(self, file_path: str, chunk_queue: queue.Queue) -> None:
+        """Extract one file in-process, sending its chunks on as they are produced."""
+        stats = self.stats["extract"]
+        file_seconds = 0.0
+        start = time.perf_counter()
+        try:
+            for part in batched(DocumentProcessor.iter_chunks(file_path), self.embed_batch_size):
+                file_seconds += time.perf_counter() - start
+                stats.chunks += len(part)
+                self._put(chunk_queue, (file_path, part, False))
+                start = time.perf_counter()
+        except Exception as e:
+            # Parts already sent are dropped by the writer with the rest of the file
+            stats.busy_seconds += file_seconds
+            self.errors.append((file_path, str(e)))
+            self._put(chunk_queue, (file_path, None, True))
+            return
+        file_seconds += time.perf_counter() - start
+        stats.busy_seconds += file_seconds
+        SPAN_SECONDS.labels(span="extract").observe(file_seconds)
+        stats.files += 1
+        self._put(chunk_queue, (file_path, [], True))
+
+    def run(self, file_paths: List[str], remove_missing: bool = False) -> Dict[str, Any]:
+        """Ingest the given files and return a summary with per-stage statistics.
+
+        With ``remove_missing``, previously ingested files that are not in
+        ``file_paths`` have their chunks deleted.
+        """
+        start = time.perf_counter()
+        file_paths = [str(path) for path in file_paths]
+        chunk_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        write_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        # Everything below is one transaction; any failure leaves the store untouched
+        with self.rag.batch():
+            if remove_missing:
+                self.removed_files = len(self.rag.manifest.missing_sources(file_paths))
+            to_process = self.rag.plan_updates(file_paths, remove_missing=remove_missing)
+            self.skipped_files = len(file_paths) - len(to_process)
+
+            embedder = threading.Thread(target=self._embed_stage, args=(chunk_queue, write_queue), daemon=True)
+            writer = threading.Thread(target=self._write_stage, args=(write_queue,), daemon=True)
+            embedder.start()
+            writer.start()
+
+            try:
+                self._extract_stage(to_process, chunk_queue)
+                self._put(chunk_queue, _DONE)
+            except BaseException as e:
+                self._fail(e)
+            embedder.join()
+            writer.join()
+
+            if self._failure is not None:
+                self.processed_files = []
+                raise self._failure
+            commit_start = time.perf_counter()
+
+        # Leaving the batch applied and flushed everything
+        self.stats["write"].busy_seconds += time.perf_counter() - commit_start
+        self.wall_seconds = time.perf_counter() - start
+        return self.summary()
+
+    def summary(self) -> Dict[str, Any]:
+        """Machine-readable summary of the last run."""
+        return {
+            "processed_files": len(self.processed_files),
+            "skipped_files": self.skipped_files,
+            "removed_files": self.removed_files,
+            "errors": list(self.errors),
+            "wall_seconds": self.wall_seconds,
+            "stages": {name: stats.as_dict() for name, stats in self.stats.items()},
+        }
+
+    def print_stats(self) -> None:
+        """Print per-stage throughput for the last run."""
+        print(f"{'stage':<8} {'files':>7} {'chunks':>8} {'busy s':>9} {'chunks/s':>10}")
+        for stats in self.stats.values():
+            print(f"{stats.name:<8} {stats.files:>7} {stats.chunks:>8} "
+                  f"{stats.busy_seconds:>9.2f} {stats.chunks_per_second:>10.1f}")
+        print(f"Wall time: {self.wall_seconds:.2f}s "
+              f"({self.extract_workers or 'in-process'} extract workers, "
+              f"embed batch {self.embed_batch_size}, queue size {self.queue_size})")
@@ -0,0 +1,286 @@
+"""Background ingestion jobs for the YSJ Student Chatbot.
+
+Uploads are saved to disk and recorded as jobs in a SQLite queue instead
+of being parsed and embedded inside the HTTP request. An
+``IngestionWorker`` claims queued jobs, ingests their files in one
+``RAGPipeline.batch`` (so several uploads share a single embed-and-flush),
+and records per-job status and progress that ``/api/jobs/<id>`` reports.
+Failed jobs are retried with exponential backoff.
+
+The worker runs as a thread inside the web server by default. Deployments
+with several server processes should run exactly one worker instead:
+
+    INGEST_WORKER=external gunicorn app:app
+    python -m src.jobs
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_COLUMNS = ("id", "file_path", "status", "stage", "chunks", "attempts", "max_attempts",
+            "error", "created_at", "updated_at", "run_after")
+
+class JobQueue:
+    """Persistent queue of file ingestion jobs in a SQLite database.
+
+    Claims are atomic across processes, so any number of workers can share
+    one queue file. Each job records its ``status`` (queued, running, done
+    or failed), the pipeline ``stage`` it is in, the number of ``chunks``
+    added so far, its ``attempts`` and the last ``error``.
+    """
+
+    def __init__(self, path: str = "data/processed/jobs.sqlite"):
+        """Open (or create) the queue at ``path``."""
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit; claims open their own IMMEDIATE transaction
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, file_path TEXT NOT NULL, status TEXT NOT NULL, stage TEXT, "
+            "chunks INTEGER NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, "
+            "max_attempts INTEGER NOT NULL, error TEXT, created_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL, run_after REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, run_after)")
+
+    def _row(self, row) -> Optional[Dict[str, Any]]:
+        return dict(zip(_COLUMNS, row)) if row is not None else None
+
+    def enqueue(self, file_path: str, max_attempts: int = 3) -> str:
+        """Queue a file for ingestion and return the new job's ID."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, file_path, status, stage, max_attempts, created_at, updated_at, run_after) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, str(file_path), QUEUED, QUEUED, max_attempts, now, now, now)
+            )
+        return job_id
+
+    def claim(self, limit: int = 16) -> List[Dict[str, Any]]:
+        """Mark up to ``limit`` due jobs as running, oldest first, and return them."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE status = ? AND run_after <= ? "
+                    "ORDER BY created_at LIMIT ?", (QUEUED, now, limit)
+                ).fetchall()
+                jobs = [self._row(row) for row in rows]
+                for job in jobs:
+                    job["attempts"] += 1
+                    self._db.execute(
+                        "UPDATE jobs SET status = ?, stage = ?, attempts = ?, updated_at = ? WHERE id = ?",
+                        (RUNNING, "waiting", job["attempts"], now, job["id"])
+                    )
+                    job["status"] = RUNNING
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return jobs
+
+    def progress(self, job_id: str, stage: str, chunks: Optional[int] = None) -> None:
+        """Record a running job's current stage and, optionally, chunks added so far."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET stage = ?, chunks = COALESCE(?, chunks), updated_at = ? WHERE id = ?",
+                (stage, chunks, time.time(), job_id)
+            )
+
+    def complete(self, job_id: str, chunks: Optional[int] = None) -> None:
+        """Mark a job as done."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, stage = ?, chunks = COALESCE(?, chunks), error = NULL, "
+                "updated_at = ? WHERE id = ?", (DONE, DONE, chunks, time.time(), job_id)
+            )
+
+    def fail(self, job_id: str, error: str, backoff: float = 5.0) -> str:
+        """Record a failed attempt; the job is retried after ``backoff * 2**(attempts - 1)``
+        seconds until it runs out of attempts. Returns the job's new status."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return FAILED
+            attempts, max_attempts = row
+            status = QUEUED if attempts < max_attempts else FAILED
+            self._db.execute(
+                "UPDATE jobs SET status = ?, stage = ?, chunks = 0, error = ?, updated_at = ?, run_after = ? "
+                "WHERE id = ?",
+                (status, status, error, now, now + backoff * 2 ** (attempts - 1), job_id)
+            )
+        return status
+
+    def requeue_stale(self, timeout: float = 3600.0) -> int:
+        """Return running jobs not updated for ``timeout`` seconds (their worker died) to the queue."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, stage = ?, chunks = 0, updated_at = ?, run_after = ? "
+                "WHERE status = ? AND updated_at < ?", (QUEUED, QUEUED, now, now, RUNNING, now - timeout)
+            )
+        return cursor.rowcount
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job's current record, or None if there is no such job."""
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs in each state."""
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        """Close the SQLite connection."""
+        with self._lock:
+            self._db.close()
+
+class IngestionWorker:
+    """Claims queued jobs and ingests their files into a ``RAGPipeline``.
+
+    All jobs claimed together (up to ``batch_size``) are coalesced into one
+    ``rag.batch()``, so their chunks are flushed with a single save. If the
+    coalesced batch fails, it is rolled back and each job is retried on its
+    own, so one bad upload cannot fail the others.
+    """
+
+    def __init__(self, rag, queue: JobQueue, batch_size: int = 16, poll_interval: float = 1.0,
+                 backoff: float = 5.0, stale_timeout: float = 3600.0):
+        """Process jobs from ``queue`` with ``rag``, polling every ``poll_interval`` seconds."""
+        self.rag = rag
+        self.queue = queue
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.backoff = backoff
+        self.stale_timeout = stale_timeout
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def notify(self) -> None:
+        """Wake the worker early, e.g. right after enqueueing a job."""
+        self._wake.set()
+
+    def _ingest(self, jobs: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Ingest the files of ``jobs`` in one batch; returns chunks added per file."""
+        by_file: Dict[str, List[Dict[str, Any]]] = {}
+        for job in jobs:
+            by_file.setdefault(job["file_path"], []).append(job)
+        missing = [file_path for file_path in by_file if not Path(file_path).exists()]
+        if missing:
+            raise FileNotFoundError(f"File not found: {', '.join(missing)}")
+
+        added: Dict[str, int] = {}
+        with self.rag.batch():
+            for file_path in self.rag.plan_updates(list(by_file)):
+                def on_progress(chunks: int, file_path: str = file_path) -> None:
+                    for job in by_file[file_path]:
+                        self.queue.progress(job["id"], "embedding", chunks)
+
+                on_progress(0)
+                added[file_path] = len(self.rag.ingest_file(file_path, on_progress=on_progress))
+            for job in jobs:
+                self.queue.progress(job["id"], "saving")
+        return added
+
+    def _run_jobs(self, jobs: List[Dict[str, Any]]) -> None:
+        try:
+            added = self._ingest(jobs)
+        except Exception as e:
+            if len(jobs) > 1:
+                print(f"Coalesced ingestion of {len(jobs)} jobs failed ({e}); retrying them one by one")
+                for job in jobs:
+                    self._run_jobs([job])
+                return
+            status = self.queue.fail(jobs[0]["id"], str(e), backoff=self.backoff)
+            print(f"Ingestion job {jobs[0]['id']} failed ({e}); {status}")
+            return
+
+        for job in jobs:
+            # Unchanged files were skipped and add no chunks
+            self.queue.complete(job["id"], added.get(job["file_path"], 0))
+
+    def run_once(self) -> int:
+        """Claim and process one batch of due jobs; returns how many were claimed."""
+        jobs = self.queue.claim(self.batch_size)
+        if jobs:
+            self._run_jobs(jobs)
+        return len(jobs)
+
+    def run(self) -> None:
+        """Process jobs until ``stop`` is called."""
+        last_check = 0.0
+        while not self._stop.is_set():
+            if time.time() - last_check > self.stale_timeout / 10:
+                requeued = self.queue.requeue_stale(self.stale_timeout)
+                if requeued:
+                    print(f"Requeued {requeued} stale ingestion jobs")
+                last_check = time.time()
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                print(f"Ingestion worker error: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self) -> 'IngestionWorker':
+        """Run the worker on a daemon thread."""
+        self._thread = threading.Thread(target=self.run, name="ingestion-worker", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Ask the worker to stop after its current batch and wait for it."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+def create_worker(rag, queue: JobQueue) -> IngestionWorker:
+    """Worker configured by INGEST_BATCH_SIZE, INGEST_POLL_INTERVAL and INGEST_RETRY_BACKOFF."""
+    return IngestionWorker(
+        rag,
+        queue,
+        batch_size=int(os.getenv("INGEST_BATCH_SIZE", "16")),
+        poll_interval=float(os.getenv("INGEST_POLL_INTERVAL", "1")),
+        backoff=float(os.getenv("INGEST_RETRY_BACKOFF", "5"))
+    )
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from .rag_pipeline import RAGPipeline
+
+    load_dotenv()
+    queue = JobQueue(os.getenv("JOB_DB", "data/processed/jobs.sqlite"))
+    # The web servers it runs alongside read the index from the snapshots it publishes
+    worker = create_worker(RAGPipeline(publish_snapshots=True), queue)
+    print(f"Ingestion worker polling {queue.path} ({json.dumps(queue.counts())})")
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue.close()
@@ -0,0 +1,78 @@
+"""LLM client construction for the YSJ Student Chatbot."""
+
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Iterator
+
+class StubResponse:
+    """Minimal stand-in for a LangChain chat message."""
+
+    def __init__(self, content: str):
+        self.content = content
+
+class StubLLM:
+    """Offline stand-in for ChatGroq with a configurable response latency.
+
+    Used by tests and benchmarks so they run without a GROQ_API_KEY or
+    network access. Answers are deterministic for a given prompt.
+    """
+
+    def __init__(self, latency: float = 0.0, response: str = "This is an offline answer from the stub LLM."):
+        """Initialize the stub with a fixed latency (seconds) and answer prefix."""
+        self.latency = latency
+        self.response = response
+        self.calls = 0
+
+    def _answer(self, prompt: str) -> str:
+        if "Question:" not in prompt:
+            return self.response
+        question = prompt.rsplit("Question:", 1)[-1].split("Helpful Answer:", 1)[0].strip()
+        return f"{self.response} You asked: {question}"
+
+    def invoke(self, prompt: str) -> StubResponse:
+        """Return a canned answer after sleeping for the configured latency."""
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return StubResponse(self._answer(str(prompt)))
+
+    def stream(self, prompt: str) -> Iterator[StubResponse]:
+        """Yield the canned answer word by word, spreading the latency across tokens."""
+        self.calls += 1
+        words = self._answer(str(prompt)).split(" ")
+        for i, word in enumerate(words):
+            if self.latency:
+                time.sleep(self.latency / len(words))
+            yield StubResponse(word if i == 0 else " " + word)
+
+    async def ainvoke(self, prompt: str) -> StubResponse:
+        """Async ``invoke`` that waits without blocking the event loop."""
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return StubResponse(self._answer(str(prompt)))
+
+    async def astream(self, prompt: str) -> AsyncIterator[StubResponse]:
+        """Async ``stream``."""
+        self.calls += 1
+        words = self._answer(str(prompt)).split(" ")
+        for i, word in enumerate(words):
+            if self.latency:
+                await asyncio.sleep(self.latency / len(words))
+            yield StubResponse(word if i == 0 else " " + word)
+
+def create_llm():
+    """Create the chat model selected by LLM_BACKEND ('groq' by default, or 'stub')."""
+    backend = os.getenv("LLM_BACKEND", "groq")
+    if backend == "stub":
+        return StubLLM(latency=float(os.getenv("STUB_LLM_LATENCY", "0")))
+    if backend != "groq":
+        raise ValueError(f"Unknown LLM_BACKEND '{backend}'. Expected 'groq' or 'stub'")
+
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        model="llama-3.3-70b-versatile",
+        temperature=0.7,
+        groq_api_key=os.getenv("GROQ_API_KEY")
+    )
@@ -0,0 +1,99 @@
+"""Document manifest used to detect new, changed and removed source files."""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+def raw_data_dir() -> Path:
+    """Directory that uploads are saved to and ``ingest.py`` reads (RAW_DATA_DIR, default ``data/raw``).
+
+    A relative setting is taken from the project root, not the working
+    directory, so every process agrees on it.
+    """
+    return (PROJECT_ROOT / os.getenv("RAW_DATA_DIR", "data/raw")).resolve()
+
+class DocumentManifest:
+    """Maps each ingested source file to its content hash and chunk IDs.
+
+    Stored as ``{prefix}_manifest.json`` next to the vector store. Sources
+    under the raw-data directory are keyed by their path relative to it
+    (``handbook.pdf``, ``arts/fees.pdf``) and others by their absolute
+    path, so uploads, ``ingest.py`` and the jobs worker agree whatever
+    directory they were started from.
+    """
+
+    def __init__(self, path: str):
+        """Load the manifest at ``path`` (an empty one if it does not exist yet)."""
+        self.path = Path(path)
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.reload()
+
+    def reload(self) -> None:
+        """Discard in-memory changes and re-read the manifest from disk."""
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.documents = data["documents"]
+            if data.get("version", 1) < 2:
+                # Version 1 keyed sources relative to the writer's working directory
+                self.documents = {self.source_key(key): entry for key, entry in self.documents.items()}
+        else:
+            self.documents = {}
+
+    def save(self) -> None:
+        """Write the manifest atomically."""
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": 2, "documents": self.documents}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def source_key(file_path: str) -> str:
+        """Normalized identity of a source file, the same from any working directory."""
+        path = Path(file_path).resolve()
+        try:
+            return path.relative_to(raw_data_dir()).as_posix()
+        except ValueError:
+            return path.as_posix()
+
+    @staticmethod
+    def file_hash(file_path: str) -> str:
+        """SHA-256 of a file's contents."""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def get(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """Manifest entry for a source file, if it has been ingested."""
+        return self.documents.get(self.source_key(file_path))
+
+    def record(self, file_path: str, content_hash: str, chunk_ids: List[int],
+               chunking: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Record the chunks produced from a source file (and the chunker settings and metadata used)."""
+        self.documents[self.source_key(file_path)] = {
+            "hash": content_hash,
+            "chunking": chunking,
+            "metadata": metadata or {},
+            "chunk_ids": [int(i) for i in chunk_ids],
+        }
+
+    def forget(self, key: str) -> List[int]:
+        """Remove a source (by key) and return the chunk IDs it owned."""
+        entry = self.documents.pop(key, None)
+        return entry["chunk_ids"] if entry else []
+
+    def missing_sources(self, file_paths: Iterable[str]) -> List[str]:
+        """Keys of recorded sources that are not among ``file_paths``."""
+        present = {self.source_key(path) for path in file_paths}
+        return [key for key in self.documents if key not in present]
+
+    def remap(self, mapping) -> None:
+        """Renumber chunk IDs after ``VectorStore.vacuum``."""
+        for entry in self.documents.values():
+            entry["chunk_ids"] = [int(mapping[i]) for i in entry["chunk_ids"] if mapping[i] >= 0]
@@ -0,0 +1,180 @@
+"""Source document metadata and the per-field indexes used to filter searches."""
+
+import io
+import json
+import os
+import re
+from array import array
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Optional
+import numpy as np
+
+# Chunk fields that can be filtered on
+FILTER_FIELDS = ("source", "doc_type", "department", "year")
+
+# Comparisons allowed in a filter expression, for ordered values such as years
+RANGE_OPERATORS = {
+    "gte": lambda value, bound: value >= bound,
+    "gt": lambda value, bound: value > bound,
+    "lte": lambda value, bound: value <= bound,
+    "lt": lambda value, bound: value < bound,
+}
+
+_YEAR = re.compile(r"(?<!\d)(?:19|20)\d{2}(?!\d)")
+
+# Metadata shared by every document in a directory
+FOLDER_METADATA = "metadata.json"
+
+def sidecar_path(file_path: str) -> Path:
+    """``handbook.pdf.meta.json``: metadata for one document."""
+    path = Path(file_path)
+    return path.with_name(path.name + ".meta.json")
+
+def _read_json(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def document_metadata(file_path: str) -> Dict[str, Any]:
+    """Filterable metadata for a source document.
+
+    ``doc_type`` defaults to the file extension and ``year`` to the first
+    year in the file name (``handbook_2024-25.pdf`` is 2024). A
+    ``metadata.json`` in the document's directory applies to every file in
+    it (e.g. ``{"department": "Computing"}``), and a ``<name>.meta.json``
+    sidecar next to the file overrides both.
+    """
+    path = Path(file_path)
+    metadata: Dict[str, Any] = {"doc_type": path.suffix.lower().lstrip(".") or None}
+    match = _YEAR.search(path.stem)
+    if match:
+        metadata["year"] = int(match.group())
+    metadata.update(_read_json(path.parent / FOLDER_METADATA))
+    metadata.update(_read_json(sidecar_path(file_path)))
+    return {field: value for field, value in metadata.items() if field in FILTER_FIELDS and value is not None}
+
+def normalize_value(value: Any) -> Any:
+    """Index key of a metadata value: strings match case-insensitively, numbers as numbers."""
+    if isinstance(value, bool):
+        return str(value).casefold()
+    if isinstance(value, (int, float)):
+        return value
+    return str(value).strip().casefold()
+
+class MetadataIndex:
+    """Per-field ID sets over chunk metadata.
+
+    For every field in ``fields``, each distinct value maps to the sorted
+    chunk IDs carrying it. Chunk IDs are positional and only grow between
+    vacuums, so new chunks are appended to the sets in order, and a filter
+    is resolved to its matching IDs with a few set unions and intersections
+    instead of a scan over the chunks. Deleted chunks are not tracked here.
+    """
+
+    def __init__(self, fields: Iterable[str] = FILTER_FIELDS):
+        """Create an empty index over ``fields``."""
+        self.fields = tuple(fields)
+        self.count = 0  # Chunk IDs indexed so far
+        self._ids: Dict[str, Dict[Any, array]] = {field: {} for field in self.fields}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, documents: Iterable[Dict[str, Any]]) -> None:
+        """Index chunks as the next chunk IDs."""
+        for doc in documents:
+            for field in self.fields:
+                value = doc.get(field)
+                if value is not None:
+                    self._ids[field].setdefault(normalize_value(value), array("q")).append(self.count)
+            self.count += 1
+
+    def sync(self, documents) -> int:
+        """Index the chunks of ``documents`` (a ``ChunkStore``) beyond ``count``; returns how many."""
+        start = self.count
+        self.add(documents[i] for i in range(start, len(documents)))
+        return self.count - start
+
+    def values(self, field: str) -> List[Any]:
+        """Distinct (normalized) values of ``field``."""
+        return list(self._ids[field])
+
+    def _field_ids(self, field: str, condition: Any) -> np.ndarray:
+        """Sorted IDs whose ``field`` satisfies one condition of a filter expression."""
+        if field not in self._ids:
+            raise ValueError(f"Cannot filter on '{field}'. Expected one of {self.fields}")
+        by_value = self._ids[field]
+
+        if isinstance(condition, dict):
+            unknown = set(condition) - set(RANGE_OPERATORS)
+            if unknown:
+                raise ValueError(f"Unknown filter operators {sorted(unknown)}. Expected {sorted(RANGE_OPERATORS)}")
+            bounds = {op: normalize_value(bound) for op, bound in condition.items()}
+            # Numbers compare with numbers and strings with strings
+            matches = [value for value in by_value
+                       if all(isinstance(value, str) == isinstance(bound, str) and RANGE_OPERATORS[op](value, bound)
+                              for op, bound in bounds.items())]
+        elif isinstance(condition, (list, tuple, set)):
+            matches = [normalize_value(value) for value in condition]
+        else:
+            matches = [normalize_value(condition)]
+
+        sets = [np.array(by_value[value], dtype=np.int64) for value in matches if value in by_value]
+        if not sets:
+            return np.zeros(0, dtype=np.int64)
+        return sets[0] if len(sets) == 1 else np.unique(np.concatenate(sets))
+
+    def select(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Sorted chunk IDs matching every field of ``filters``.
+
+        Each field maps to a value, a list of accepted values, or a range
+        such as ``{"gte": 2024}`` (``gt``, ``gte``, ``lt``, ``lte``).
+        """
+        selected: Optional[np.ndarray] = None
+        for field, condition in filters.items():
+            ids = self._field_ids(field, condition)
+            selected = ids if selected is None else np.intersect1d(selected, ids, assume_unique=True)
+            if not len(selected):
+                break
+        if selected is None:
+            return np.arange(self.count, dtype=np.int64)
+        return selected
+
+    def save(self, path: str) -> None:
+        """Write the index atomically as one ``.npz`` file."""
+        arrays: Dict[str, np.ndarray] = {"count": np.array([self.count], dtype=np.int64)}
+        for field, by_value in self._ids.items():
+            values = list(by_value)
+            sizes = np.array([len(by_value[value]) for value in values], dtype=np.int64)
+            arrays[f"{field}.values"] = np.frombuffer(json.dumps(values).encode("utf-8"), dtype=np.uint8)
+            arrays[f"{field}.offsets"] = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+            arrays[f"{field}.ids"] = (np.concatenate([np.array(by_value[value], dtype=np.int64) for value in values])
+                                      if values else np.zeros(0, dtype=np.int64))
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer.getvalue())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, fields: Iterable[str] = FILTER_FIELDS) -> 'MetadataIndex':
+        """Read an index written by ``save``.
+
+        An index saved without one of ``fields`` is returned empty, for
+        ``sync`` to rebuild.
+        """
+        index = cls(fields)
+        with np.load(path, allow_pickle=False) as data:
+            if any(f"{field}.values" not in data for field in index.fields):
+                return index
+            index.count = int(data["count"][0])
+            for field in index.fields:
+                values = json.loads(data[f"{field}.values"].tobytes().decode("utf-8"))
+                offsets, ids = data[f"{field}.offsets"], data[f"{field}.ids"]
+                for i, value in enumerate(values):
+                    index._ids[field][value] = array("q", ids[offsets[i]:offsets[i + 1]].tobytes())
+        return index
@@ -0,0 +1,293 @@
+"""In-process metrics and request tracing for the YSJ Student Chatbot.
+
+Hot paths are wrapped in ``span(name)``, which times the block into the
+``ysj_span_seconds`` histogram. A request wrapped in ``trace(endpoint)`` is
+sampled as a whole (METRICS_SAMPLE_RATE, default 1): its spans are timed
+only if it was sampled, so unsampled requests cost a context-variable
+lookup per span. A trace can also collect a per-span breakdown of one
+request. ``REGISTRY.render()`` exports every metric in the Prometheus text
+format.
+"""
+
+import bisect
+import contextvars
+import functools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Bucket upper bounds for latencies in milliseconds
+LATENCY_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# The same bounds in seconds, as Prometheus expects
+LATENCY_SECONDS_BUCKETS = tuple(bound / 1000 for bound in LATENCY_MS_BUCKETS) + (10, 30)
+
+# Bucket upper bounds for batch sizes
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+class Histogram:
+    """Thread-safe bucketed histogram with count, sum and quantile estimates.
+
+    Observations are counted in the first bucket whose upper bound they do
+    not exceed (the last bucket is unbounded), so memory stays constant no
+    matter how many values are recorded. Quantiles are interpolated within
+    a bucket and are only as precise as the bucket bounds.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_MS_BUCKETS):
+        """Count observations into ``buckets`` (ascending upper bounds)."""
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Record one value."""
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated ``q`` quantile (0-1), or None before any observation."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for i, count in enumerate(self._counts):
+                if count and seen + count >= rank:
+                    lower = self.buckets[i - 1] if i > 0 else 0.0
+                    upper = min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+                    return lower + (upper - lower) * max(rank - seen, 0) / count
+                seen += count
+            return self.max
+
+    def snapshot(self) -> Tuple[List[int], int, float]:
+        """Per-bucket counts (the last one unbounded), total count and sum, read together."""
+        with self._lock:
+            return list(self._counts), self.count, self.sum
+
+    def summary(self) -> Dict[str, Any]:
+        """Count, mean, p50/p95/p99, max and per-bucket counts (keyed by upper bound)."""
+        with self._lock:
+            counts = list(self._counts)
+            count, total, largest = self.count, self.sum, self.max
+        return {
+            "count": count,
+            "mean": total / count if count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": largest,
+            "buckets": {**{str(bound): n for bound, n in zip(self.buckets, counts)}, "+Inf": counts[-1]},
+        }
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+class Counter:
+    """Thread-safe monotonic counter, one value per combination of labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Add ``amount`` to the counter for ``labels``."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Current value for ``labels``."""
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {value:g}")
+        return lines
+
+class HistogramFamily:
+    """Histograms sharing a name and buckets, one per combination of labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_SECONDS_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._children: Dict[Tuple[str, ...], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels: str) -> Histogram:
+        """The histogram for ``labels``, created on first use."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, Histogram(self.buckets))
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, histogram in children:
+            labels = dict(zip(self.labelnames, key))
+            counts, count, total = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total:.6g}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+class Registry:
+    """The metrics a process exports."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Create (or return the existing) counter ``name``."""
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_SECONDS_BUCKETS) -> HistogramFamily:
+        """Create (or return the existing) histogram family ``name``."""
+        return self._register(HistogramFamily(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+REGISTRY = Registry()
+
+SPAN_SECONDS = REGISTRY.histogram("ysj_span_seconds", "Time spent in instrumented operations.", ["span"])
+REQUESTS = REGISTRY.counter("ysj_requests_total", "Requests handled, by endpoint.", ["endpoint"])
+REQUEST_SECONDS = REGISTRY.histogram("ysj_request_seconds", "Sampled request latency, by endpoint.", ["endpoint"])
+
+class Trace:
+    """Timings collected for one request."""
+
+    def __init__(self, sampled: bool, collect: bool):
+        self.sampled = sampled
+        self.collect = collect
+        self.timings: Dict[str, float] = {}  # Milliseconds per span name, summed
+
+    def add(self, name: str, seconds: float) -> None:
+        if self.collect:
+            self.timings[name] = self.timings.get(name, 0.0) + seconds * 1000
+
+    def breakdown(self) -> Dict[str, float]:
+        """Milliseconds per span, rounded for a JSON response."""
+        return {name: round(ms, 2) for name, ms in self.timings.items()}
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+def sample_rate() -> float:
+    """Fraction of requests (and untraced spans) that are timed."""
+    return float(os.getenv("METRICS_SAMPLE_RATE", "1"))
+
+@contextmanager
+def trace(endpoint: str, breakdown: bool = False) -> Iterator[Trace]:
+    """Trace one request to ``endpoint``.
+
+    With ``breakdown`` the request is always timed and ``Trace.breakdown()``
+    returns milliseconds per span plus ``total`` once the block exits.
+    """
+    REQUESTS.inc(endpoint=endpoint)
+    current = Trace(sampled=breakdown or random.random() < sample_rate(), collect=breakdown)
+    token = _current_trace.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+        if current.sampled:
+            seconds = time.perf_counter() - start
+            REQUEST_SECONDS.labels(endpoint=endpoint).observe(seconds)
+            current.add("total", seconds)
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a block as ``name`` if the current request (or, outside one, this call) is sampled."""
+    current = _current_trace.get()
+    if not (current.sampled if current is not None else random.random() < sample_rate()):
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        SPAN_SECONDS.labels(span=name).observe(seconds)
+        if current is not None:
+            current.add(name, seconds)
+
+def timed_iter(name: str, iterable: Iterable[Any]) -> Iterator[Any]:
+    """Yield from ``iterable``, timing only the work of producing its items as one ``name`` span.
+
+    For lazy pipelines whose consumer does other timed work between items,
+    such as extraction feeding embedding during ingestion.
+    """
+    current = _current_trace.get()
+    if not (current.sampled if current is not None else random.random() < sample_rate()):
+        yield from iterable
+        return
+
+    seconds = 0.0
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                seconds += time.perf_counter() - start
+            yield item
+    finally:
+        SPAN_SECONDS.labels(span=name).observe(seconds)
+        if current is not None:
+            current.add(name, seconds)
+
+def timed(name: str):
+    """Decorator wrapping a function in ``span(name)``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,58 +1,652 @@
 """RAG (Retrieval-Augmented Generation) pipeline implementation."""
 
-from typing import List, Dict, Any, Optional
+from contextlib import ExitStack, contextmanager
+from typing import TYPE_CHECKING, List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+import itertools
+import json
 import os
+import shutil
+import threading
+import time
 from pathlib import Path
+import numpy as np
 from .document_processor import DocumentProcessor
-from .embeddings import EmbeddingModel
-from .vector_store import VectorStore
+from .embeddings import EMBEDDING_BACKENDS, EmbeddingModel, MicroBatchingEmbedder, cache_namespace, load_sentence_transformer
+from .embedding_cache import EmbeddingCache
+from .chunk_store import ChunkStore, convert_json_metadata
+from .manifest import DocumentManifest
+from .metadata import document_metadata
+from .metrics import REGISTRY, span, timed_iter
+from .bm25 import BM25Index, reciprocal_rank_fusion
+from .chunking import get_chunker
+from .snapshots import SnapshotDirectory
+
+if TYPE_CHECKING:
+    from .vector_store import VectorStore
+
+# Retrieval modes accepted by RAGPipeline.query
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+
+CHUNKS_INGESTED = REGISTRY.counter("ysj_chunks_ingested_total", "Chunks embedded and added to the index.")
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group an iterable into lists of at most ``size`` items, lazily."""
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+class ReadWriteLock:
+    """Lets many threads search at once, or one thread change the index.
+
+    A waiting writer holds off new readers, so ingestion is not starved by
+    a steady stream of queries. Readers may re-enter the lock, including
+    from the thread holding it as the writer.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer: Optional[int] = None  # Ident of the thread writing
+        self._writers_waiting = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def reading(self) -> Iterator[None]:
+        """Hold the lock as one of possibly many readers."""
+        depth = getattr(self._local, "depth", 0)
+        if depth or self._writer == threading.get_ident():
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+
+        with self._condition:
+            while self._writer is not None or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        """Hold the lock exclusively, once current readers are done."""
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writer is not None or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writer = threading.get_ident()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = None
+                self._condition.notify_all()
 
 class RAGPipeline:
     """End-to-end RAG pipeline for document retrieval and generation."""
     
-    def __init__(self, data_dir: str = "data/processed"):
-        """Initialize the RAG pipeline."""
+    def __init__(self, data_dir: str = "data/processed", read_only: bool = False,
+                 publish_snapshots: Optional[bool] = None):
+        """Initialize the RAG pipeline.
+        
+        The embedding model and the index are loaded on first use (or by
+        ``warm_up``), so constructing a pipeline is cheap.
+        
+        A ``read_only`` pipeline serves the latest published snapshot
+        memory-mapped and picks up newer ones on ``refresh``; it cannot
+        ingest documents. Otherwise the pipeline owns the working store and,
+        when ``publish_snapshots`` is set (by default only with
+        INGEST_WORKER=external, where read-only servers consume them),
+        publishes a snapshot after every change.
+        """
         self.data_dir = Path(data_dir)
+        self.read_only = read_only
+        if publish_snapshots is None:
+            publish_snapshots = os.getenv("INGEST_WORKER", "thread") == "external"
+        self.publish_snapshots = publish_snapshots and not read_only
         self.data_dir.mkdir(parents=True, exist_ok=True)
         
         # Initialize components
         self.doc_processor = DocumentProcessor()
-        self.embedding_model = EmbeddingModel()
-        self.vector_store = VectorStore(dimension=384)  # Default for all-MiniLM-L6-v2
+        self.model_name = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        self.embedding_backend = os.getenv("EMBEDDING_BACKEND", "torch")
+        if self.embedding_backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown EMBEDDING_BACKEND '{self.embedding_backend}'. Expected one of {EMBEDDING_BACKENDS}")
+        self.embed_batch_size = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+        # Concurrent query embeddings are coalesced into batches of up to this many
+        self.coalesce_window_ms = float(os.getenv("EMBED_COALESCE_WINDOW_MS", "2"))
+        self.coalesce_max_batch = int(os.getenv("EMBED_COALESCE_MAX_BATCH", "32"))
+        self._embedding_model: Optional[MicroBatchingEmbedder] = None
         
-        # Check for existing vector store
+        # Index mode is configurable, e.g. VECTOR_INDEX_TYPE=hnsw
+        self.index_type = os.getenv("VECTOR_INDEX_TYPE", "flat")
+        # Large corpora can be split into shards searched in parallel, e.g. VECTOR_SHARDS=4
+        self.num_shards = int(os.getenv("VECTOR_SHARDS", "1"))
+        self.shard_by = os.getenv("VECTOR_SHARD_BY", "source")
         self.vector_store_path = self.data_dir / "vector_store"
-        if self.vector_store_path.with_suffix('.index').exists():
-            self.vector_store = VectorStore.load(str(self.vector_store_path))
+        self._vector_store = None
+        self._manifest: Optional[DocumentManifest] = None
+        self._bm25: Optional[BM25Index] = None
+        self._index_lock = threading.RLock()
+        # Searches share the store with the ingestion thread, which takes this exclusively to commit
+        self._search_lock = ReadWriteLock()
+        self._pending_hashes: Dict[str, str] = {}
+        self._pending_metadata: Dict[str, Dict[str, Any]] = {}
+        
+        # Versioned snapshots shared with read-only server processes
+        self.snapshots = SnapshotDirectory(str(self.data_dir / "snapshots"),
+                                           keep=int(os.getenv("INDEX_SNAPSHOT_KEEP", "3")))
+        self.snapshot_generation: Optional[int] = None
+        self.refresh_interval = float(os.getenv("INDEX_REFRESH_INTERVAL", "2"))
+        self._last_refresh = time.monotonic()
+        self._refresh_lock = threading.Lock()
+        self._published: Optional[Tuple[int, int]] = None
+        
+        # BM25 over the same chunks, for exact matches such as module codes and room numbers
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "dense")
+        if self.retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown RETRIEVAL_MODE '{self.retrieval_mode}'. Expected one of {RETRIEVAL_MODES}")
+        self.hybrid_candidates = int(os.getenv("HYBRID_CANDIDATES", "20"))
+        self.bm25_path = Path(f"{self.vector_store_path}_bm25.npz")
     
-    def process_documents(self, file_paths: List[str]) -> None:
-        """Process and index multiple documents."""
-        all_chunks = []
+    @property
+    def embedding_model(self) -> MicroBatchingEmbedder:
+        """The embedding model, created with its cache on first use.
+
+        Concurrent ``embed_text`` calls are coalesced into batches of up to
+        EMBED_COALESCE_MAX_BATCH, gathered over EMBED_COALESCE_WINDOW_MS.
+        """
+        if self._embedding_model is None:
+            with self._index_lock:
+                if self._embedding_model is None:
+                    # Embeddings are cached on disk unless EMBEDDING_CACHE=0
+                    cache = None
+                    if os.getenv("EMBEDDING_CACHE", "1") != "0":
+                        cache = EmbeddingCache(
+                            str(self.data_dir / "embedding_cache.sqlite"),
+                            model_name=cache_namespace(self.model_name, self.embedding_backend),
+                            dtype=os.getenv("EMBEDDING_CACHE_DTYPE", "float32")
+                        )
+                    self._embedding_model = MicroBatchingEmbedder(
+                        EmbeddingModel(self.model_name, cache=cache, backend=self.embedding_backend),
+                        window_ms=self.coalesce_window_ms,
+                        max_batch=self.coalesce_max_batch
+                    )
+        return self._embedding_model
+    
+    @embedding_model.setter
+    def embedding_model(self, model) -> None:
+        self._embedding_model = model
+    
+    def embedding_stats(self) -> Dict[str, Any]:
+        """Query coalescing histograms and cache counters (empty until the model is used)."""
+        model = self._embedding_model
+        return model.stats() if isinstance(model, MicroBatchingEmbedder) else {}
+    
+    @property
+    def vector_store(self) -> 'VectorStore':
+        self._ensure_index()
+        return self._vector_store
+    
+    @vector_store.setter
+    def vector_store(self, store: 'VectorStore') -> None:
+        self._vector_store = store
+    
+    @property
+    def index_version(self) -> Tuple[Optional[int], int]:
+        """Changes whenever searches may see different chunks.
         
-        for file_path in file_paths:
-            # Process document
-            chunks = self.doc_processor.process_document(file_path)
+        Stores loaded from disk start at generation 0, so a newly loaded
+        snapshot is told apart by its snapshot generation; changes to the
+        working store bump its own generation before they are published.
+        """
+        return self.snapshot_generation, self.vector_store.generation
+    
+    @property
+    def manifest(self) -> DocumentManifest:
+        """Source files already ingested, keyed by content hash."""
+        self._ensure_index()
+        return self._manifest
+    
+    @manifest.setter
+    def manifest(self, manifest: DocumentManifest) -> None:
+        self._manifest = manifest
+    
+    @property
+    def bm25(self) -> BM25Index:
+        self._ensure_index()
+        return self._bm25
+    
+    @bm25.setter
+    def bm25(self, bm25: BM25Index) -> None:
+        self._bm25 = bm25
+    
+    def _ensure_index(self) -> None:
+        """Load the vector store, manifest and BM25 index if not loaded yet."""
+        if self._bm25 is not None:
+            return
+        with self._index_lock:
+            if self._bm25 is None:
+                self._load_index()
+    
+    def _load_index(self) -> None:
+        # Imported here so that constructing a pipeline does not load FAISS
+        from .vector_store import VectorStore
+        from .sharded_store import ShardedVectorStore, is_sharded
+                
+        if self.read_only:
+            self._vector_store = VectorStore(dimension=384, index_type=self.index_type)
+            self._manifest = DocumentManifest(f"{self.vector_store_path}_manifest.json")
+            generation = self.snapshots.current()
+            if generation is not None:
+                self._load_snapshot(generation)
+            else:
+                self._bm25 = BM25Index()
+            return
+        
+        # Check for existing vector store
+        path = str(self.vector_store_path)
+        store = VectorStore(dimension=384, index_type=self.index_type)  # Default for all-MiniLM-L6-v2
+        if self.num_shards > 1:
+            store = ShardedVectorStore(num_shards=self.num_shards, shard_by=self.shard_by,
+                                       dimension=384, index_type=self.index_type)
+        if is_sharded(path):
+            store = ShardedVectorStore.load(path)
+            if self.num_shards <= 1:
+                print("Vector store is sharded; keeping its shards (VECTOR_SHARDS is not set)")
+            elif (store.num_shards, store.shard_by) != (self.num_shards, self.shard_by):
+                print(f"Resharding vector store into {self.num_shards} shards by '{self.shard_by}'...")
+                store = ShardedVectorStore.from_store(store, self.num_shards, self.shard_by)
+                store.save(path)
+            
+            if store.index_type != self.index_type:
+                print(f"Migrating vector store from '{store.index_type}' to '{self.index_type}' index...")
+                store.rebuild(index_type=self.index_type)
+                store.save(path)
+        elif self.vector_store_path.with_suffix('.index').exists():
+            # One-time conversion of the legacy JSON metadata to the chunk store
+            if not ChunkStore.exists(str(self.vector_store_path)):
+                print("Converting vector store metadata to the chunk store format...")
+                convert_json_metadata(str(self.vector_store_path))
+            
+            store = VectorStore.load(str(self.vector_store_path))
             
-            # Generate embeddings
-            chunks_with_embeddings = self.embedding_model.embed_documents(chunks)
-            all_chunks.extend(chunks_with_embeddings)
+            # Migrate stores built with a different index mode (e.g. legacy flat indexes)
+            if store.index_type != self.index_type:
+                print(f"Migrating vector store from '{store.index_type}' to '{self.index_type}' index...")
+                store.rebuild(index_type=self.index_type)
+                store.save(str(self.vector_store_path))
+            
+            # Split an unsharded store once VECTOR_SHARDS is set; chunk IDs are kept
+            if self.num_shards > 1:
+                print(f"Splitting vector store into {self.num_shards} shards by '{self.shard_by}'...")
+                store = ShardedVectorStore.from_store(store, self.num_shards, self.shard_by)
+                store.save(path)
+                VectorStore.remove(path)
+        self._vector_store = store
+        self._manifest = DocumentManifest(f"{self.vector_store_path}_manifest.json")
         
-        # Add to vector store
-        self.vector_store.add_documents(all_chunks)
+        bm25 = BM25Index.load(str(self.bm25_path)) if self.bm25_path.exists() else BM25Index()
+        if len(bm25) > len(store.documents):
+            bm25 = BM25Index()
+        if bm25.sync(store.documents):
+            bm25.save(str(self.bm25_path))
+        self._bm25 = bm25  # Marks the index as loaded
         
-        # Save the updated vector store
-        self.vector_store.save(str(self.vector_store_path))
+        if self.publish_snapshots and self._snapshot_is_stale():
+            self.publish_snapshot()
+        else:
+            self.snapshot_generation = self.snapshots.current()
+            self._published = (id(store), store.generation)
     
-    def query(self, question: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Query the RAG system with a question."""
+    def warm_up(self) -> None:
+        """Load the embedding model and the index now rather than on the first query.
+        
+        Opens no database connections, so it is safe to call in a server
+        process that forks workers afterwards.
+        """
+        load_sentence_transformer(self.model_name, self.embedding_backend)
+        self._ensure_index()
+    
+    @contextmanager
+    def batch(self):
+        """Context manager that persists all documents processed inside it in one flush.
+        
+        The manifest is saved after the vector store commits; if the batch
+        fails, both are left as they were on disk. With
+        ``publish_snapshots``, changes are then published as a new snapshot.
+        
+        Searches in other threads wait while the outermost batch applies
+        its changes to the store (and vacuums it), but not while they are
+        written to disk.
+        """
+        if self.read_only:
+            raise RuntimeError("Read-only pipelines cannot ingest documents")
+        store = self.vector_store
+        if store.in_batch:
+            with store.batch():
+                yield
+            return
+        
+        with ExitStack() as commit:
+            try:
+                with store.batch():
+                    yield
+                    # The staged changes are applied as the store's batch exits
+                    commit.enter_context(self._search_lock.writing())
+            except BaseException:
+                self.manifest.reload()
+                self._pending_hashes = {}
+                self._pending_metadata = {}
+                raise
+            
+            # Reclaim space once a quarter of the chunks are tombstones
+            vacuumed = len(store.deleted) > len(store.documents) // 4
+            if vacuumed:
+                self.manifest.remap(store.vacuum())
+                self.bm25 = BM25Index()  # Chunk IDs were renumbered
+            # Searches never sync BM25 themselves, so it catches up while they wait
+            bm25_changed = self._sync_bm25() or vacuumed
+        
+        if vacuumed:
+            store.save(str(self.vector_store_path))
+        else:
+            store.flush(str(self.vector_store_path))
+        self.manifest.save()
+        if bm25_changed:
+            self.bm25.save(str(self.bm25_path))
+        if self.publish_snapshots and self._published != (id(self.vector_store), self.vector_store.generation):
+            self.publish_snapshot()
+    
+    def publish_snapshot(self) -> int:
+        """Write the current store, manifest and BM25 index as a new snapshot generation."""
+        generation = self.snapshots.create()
+        prefix = self.snapshots.prefix(generation)
+        try:
+            self.vector_store.export(prefix)
+            self._sync_bm25()
+            self.bm25.save(f"{prefix}_bm25.npz")
+            if self.manifest.path.exists():
+                shutil.copyfile(self.manifest.path, f"{prefix}_manifest.json")
+        except BaseException:
+            self.snapshots.abandon(generation)
+            raise
+        self.snapshots.publish(generation)
+        self.snapshot_generation = generation
+        self._published = (id(self.vector_store), self.vector_store.generation)
+        return generation
+    
+    def _snapshot_is_stale(self) -> bool:
+        """Whether the published snapshot differs from the working store (e.g. none exists yet)."""
+        from .sharded_store import is_sharded, shards_path
+        
+        generation = self.snapshots.current()
+        if generation is None:
+            return len(self.vector_store.documents) > 0
+        prefix = self.snapshots.prefix(generation)
+        try:
+            with open(shards_path(prefix) if is_sharded(prefix) else f"{prefix}_meta.json", 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return True
+        store = self.vector_store
+        return meta["count"] != len(store.documents) or len(meta["deleted"]) != len(store.deleted)
+    
+    def _load_snapshot(self, generation: int) -> None:
+        """Memory-map a published snapshot and make it the one searches use."""
+        from .sharded_store import load_store
+        
+        prefix = self.snapshots.prefix(generation)
+        vector_store = load_store(prefix, mmap=True)
+        bm25 = BM25Index.load(f"{prefix}_bm25.npz", mmap=True)
+        manifest = DocumentManifest(f"{prefix}_manifest.json")
+        
+        # Searches read the store and BM25 separately, so swap them while none is running
+        with self._search_lock.writing():
+            self.vector_store = vector_store
+            self.manifest = manifest
+            self.bm25 = bm25
+            self.snapshot_generation = generation
+    
+    def refresh(self, force: bool = False) -> bool:
+        """Swap in a newer published snapshot; True if one was loaded.
+        
+        Only read-only pipelines refresh. ``CURRENT`` is checked at most
+        once per INDEX_REFRESH_INTERVAL seconds unless ``force`` is set.
+        """
+        if not self.read_only:
+            return False
+        self._ensure_index()
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return False
+        self._last_refresh = now
+        
+        generation = self.snapshots.current()
+        if generation is None or generation == self.snapshot_generation:
+            return False
+        with self._refresh_lock:
+            if generation == self.snapshot_generation:
+                return False  # Another thread got there first
+            try:
+                self._load_snapshot(generation)
+            except Exception as e:
+                print(f"Could not load index snapshot {generation}: {e}")
+                return False
+        print(f"Loaded index snapshot {generation}")
+        return True
+    
+    def _sync_bm25(self) -> bool:
+        """Bring the BM25 index up to date with the vector store; True if it changed.
+        
+        New chunks are indexed incrementally; an index longer than the
+        store (left over from before a vacuum) is rebuilt. It mutates the
+        shared index, so callers hold the search write lock (or have not
+        shared the pipeline yet).
+        """
+        documents = self.vector_store.documents
+        if len(self.bm25) > len(documents):
+            self.bm25 = BM25Index()
+        return self.bm25.sync(documents) > 0
+    
+    def plan_updates(self, file_paths: List[str], remove_missing: bool = False) -> List[str]:
+        """Return the files that need (re)ingesting and delete stale chunks.
+        
+        Unchanged files are skipped. Chunks of modified files, of files
+        chunked with different settings, or whose metadata changed, are
+        deleted so they can be re-added, and with ``remove_missing`` the
+        chunks of recorded files absent from ``file_paths`` are deleted too.
+        """
+        chunking = get_chunker().signature
+        to_process = []
+        for file_path in file_paths:
+            key = DocumentManifest.source_key(file_path)
+            content_hash = DocumentManifest.file_hash(file_path)
+            metadata = document_metadata(file_path)
+            entry = self.manifest.get(file_path)
+            if entry is not None:
+                if (entry["hash"] == content_hash and entry.get("chunking") == chunking
+                        and entry.get("metadata") == metadata):
+                    continue
+                self.vector_store.delete(self.manifest.forget(key))
+            self._pending_hashes[key] = content_hash
+            self._pending_metadata[key] = metadata
+            to_process.append(str(file_path))
+        
+        if remove_missing:
+            for key in self.manifest.missing_sources(file_paths):
+                self.vector_store.delete(self.manifest.forget(key))
+        
+        return to_process
+    
+    def add_chunks(self, file_path: str, chunks: List[Dict[str, Any]]) -> List[int]:
+        """Add embedded chunks of a source file, tagged with its metadata; call ``record_file`` once all are added."""
+        key = DocumentManifest.source_key(file_path)
+        metadata = self._pending_metadata.get(key)
+        if metadata is None:
+            metadata = self._pending_metadata[key] = document_metadata(file_path)
+        for chunk in chunks:
+            chunk.update(metadata)
+            chunk["source"] = key
+        return self.vector_store.add_documents(chunks)
+    
+    def record_file(self, file_path: str, chunk_ids: List[int]) -> None:
+        """Record a fully added source file and its chunk IDs in the manifest."""
+        key = DocumentManifest.source_key(file_path)
+        content_hash = self._pending_hashes.pop(key, None) or DocumentManifest.file_hash(file_path)
+        metadata = self._pending_metadata.pop(key, None)
+        if metadata is None:
+            metadata = document_metadata(file_path)
+        self.manifest.record(file_path, content_hash, chunk_ids, chunking=get_chunker().signature, metadata=metadata)
+    
+    def add_file_chunks(self, file_path: str, chunks: List[Dict[str, Any]]) -> List[int]:
+        """Add one file's embedded chunks and record them in the manifest."""
+        chunk_ids = self.add_chunks(file_path, chunks)
+        self.record_file(file_path, chunk_ids)
+        return chunk_ids
+    
+    def ingest_file(self, file_path: str, on_progress: Optional[Callable[[int], None]] = None) -> List[int]:
+        """Extract, chunk, embed and add one file as a stream of ``embed_batch_size`` chunks.
+        
+        ``on_progress`` is called with the number of chunks added so far.
+        Call inside ``batch()`` after ``plan_updates``.
+        """
+        chunk_ids: List[int] = []
+        with span("ingest_file"):
+            chunk_stream = timed_iter("extract", self.doc_processor.iter_chunks(file_path))
+            for chunks in batched(chunk_stream, self.embed_batch_size):
+                # Generate embeddings
+                with span("ingest_embed"):
+                    chunks_with_embeddings = self.embedding_model.embed_documents(chunks, show_progress_bar=False)
+                with span("index_add"):
+                    chunk_ids.extend(self.add_chunks(file_path, chunks_with_embeddings))
+                CHUNKS_INGESTED.inc(len(chunks))
+                if on_progress is not None:
+                    on_progress(len(chunk_ids))
+            self.record_file(file_path, chunk_ids)
+        return chunk_ids
+    
+    def process_documents(self, file_paths: List[str]) -> None:
+        """Process and index multiple documents, skipping unchanged ones.
+        
+        Each document is extracted, chunked and embedded as a stream of
+        ``embed_batch_size`` chunks, so large files never sit in memory whole.
+        """
+        # Add to vector store and append the new chunks to disk (deferred inside a batch)
+        with self.batch():
+            for file_path in self.plan_updates(file_paths):
+                self.ingest_file(file_path)
+    
+    def retrieve(self, question: str, top_k: int = 3, mode: Optional[str] = None,
+                 filters: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """Embed a question and retrieve relevant documents, returning both.
+        
+        ``mode`` is ``dense`` (FAISS), ``lexical`` (BM25) or ``hybrid``
+        (both, fused by reciprocal rank); it defaults to RETRIEVAL_MODE.
+        ``filters`` restricts results to chunks whose metadata matches, e.g.
+        ``{"doc_type": "handbook", "year": {"gte": 2024}}``.
+        """
+        mode = mode or self.retrieval_mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}'. Expected one of {RETRIEVAL_MODES}")
+        
         # Generate query embedding
-        query_embedding = self.embedding_model.embed_text(question)
+        with span("embed"):
+            query_embedding = self.embedding_model.embed_text(question)
         
         # Retrieve relevant documents
-        results = self.vector_store.search(query_embedding, k=top_k)
+        with span("search"), self._search_lock.reading():
+            if mode == "dense":
+                results = self.vector_store.search(query_embedding, k=top_k, filters=filters)
+            elif mode == "lexical":
+                results = self.lexical_search(question, k=top_k, filters=filters)
+            else:
+                results = self.hybrid_search(question, query_embedding, k=top_k, filters=filters)
         
+        return query_embedding, results
+    
+    def lexical_search(self, question: str, k: int = 3,
+                       filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """BM25 search; results carry ``bm25_score`` (higher is better) and no dense ``score``."""
+        with self._search_lock.reading():
+            include = self.vector_store.metadata.select(filters) if filters else None
+            results = []
+            hits = self.bm25.search(question, k=k, exclude=self.vector_store.deleted, include=include)
+            for doc_id, bm25_score in hits:
+                doc = self.vector_store.documents[doc_id]
+                doc["id"] = doc_id
+                doc["score"] = None
+                doc["bm25_score"] = bm25_score
+                results.append(doc)
         return results
     
+    def hybrid_search(self, question: str, query_embedding: np.ndarray, k: int = 3,
+                      filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Fuse the dense and BM25 rankings of ``hybrid_candidates`` chunks each.
+        
+        Results keep the dense ``score`` (None for lexical-only matches) and
+        add ``bm25_score`` and ``fusion_score`` (higher is better).
+        """
+        candidates = max(k, self.hybrid_candidates)
+        with self._search_lock.reading():
+            dense = self.vector_store.search(query_embedding, k=candidates, filters=filters)
+            lexical = self.lexical_search(question, k=candidates, filters=filters)
+        
+        by_id = {doc["id"]: doc for doc in lexical}
+        for doc in dense:
+            doc["bm25_score"] = by_id[doc["id"]]["bm25_score"] if doc["id"] in by_id else None
+            by_id[doc["id"]] = doc
+        
+        fused = reciprocal_rank_fusion([[doc["id"] for doc in dense], [doc["id"] for doc in lexical]])
+        results = []
+        for doc_id, fusion_score in fused[:k]:
+            doc = by_id[doc_id]
+            doc["fusion_score"] = fusion_score
+            results.append(doc)
+        return results
+    
+    def query(self, question: str, top_k: int = 3, mode: Optional[str] = None,
+              filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Query the RAG system with a question, optionally within a metadata filter."""
+        return self.retrieve(question, top_k=top_k, mode=mode, filters=filters)[1]
+    
+    def query_batch(self, questions: List[str], top_k: int = 3, batch_size: int = 256,
+                    filters: Optional[Dict[str, Any]] = None
+                    ) -> Tuple[np.ndarray, np.ndarray, Dict[int, Dict[str, Any]]]:
+        """Dense retrieval for many questions at once.
+        
+        Questions are encoded ``batch_size`` at a time and searched as one
+        matrix per batch. Returns ``(scores, ids, documents)``: ``scores``
+        and ``ids`` are ``(len(questions), top_k)`` arrays as returned by
+        ``VectorStore.search_batch`` (``ids`` of -1 mark missing hits), and
+        ``documents`` maps each distinct chunk ID hit to its record, decoded
+        once however many questions retrieved it.
+        """
+        scores = np.full((len(questions), top_k), np.inf, dtype=np.float32)
+        ids = np.full((len(questions), top_k), -1, dtype=np.int64)
+        documents: Dict[int, Dict[str, Any]] = {}
+        for start in range(0, len(questions), batch_size):
+            embeddings = self.embedding_model.embed_texts(questions[start:start + batch_size], batch_size=batch_size)
+            with self._search_lock.reading():
+                batch_scores, batch_ids = self.vector_store.search_batch(embeddings, k=top_k, filters=filters)
+                documents.update(self.vector_store.get_documents(np.setdiff1d(batch_ids, list(documents))))
+            scores[start:start + len(batch_ids)] = batch_scores
+            ids[start:start + len(batch_ids)] = batch_ids
+        return scores, ids, documents
+    
     def generate_response(self, question: str, context: List[Dict[str, Any]]) -> str:
         """Generate a response using the retrieved context."""
         # Format the context
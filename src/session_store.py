@@ -0,0 +1,131 @@
+"""Per-session conversation history for the YSJ Student Chatbot."""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+# Cookie carrying the session ID when clients do not send one explicitly
+SESSION_COOKIE = "ysj_session"
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def resolve_session_id(*candidates: Optional[str]) -> Optional[str]:
+    """First well-formed session ID among ``candidates`` (body field, cookie, ...)."""
+    for candidate in candidates:
+        if isinstance(candidate, str) and _SESSION_ID.match(candidate):
+            return candidate
+    return None
+
+class SessionStore:
+    """Chat histories keyed by session ID.
+
+    Sessions live in an in-memory LRU of at most ``max_sessions`` entries.
+    Each history is capped at ``max_messages`` (oldest messages are
+    dropped), and sessions untouched for ``idle_seconds`` are evicted.
+    ``history`` returns only the last ``window`` messages, so response
+    payloads stay small however long a conversation runs. With a ``path``,
+    histories are also written through to SQLite. Evicted sessions can then
+    be reloaded, and several worker processes share the same sessions.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_sessions: int = 10_000, max_messages: int = 100,
+                 idle_seconds: float = 24 * 3600, window: int = 20):
+        """Create an empty store, optionally backed by a SQLite file."""
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.idle_seconds = idle_seconds
+        self.window = window
+
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()  # Least recently used first
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, history TEXT NOT NULL, last_seen REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions(last_seen)")
+            self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @staticmethod
+    def new_session_id() -> str:
+        """Generate an unguessable session ID."""
+        return uuid.uuid4().hex
+
+    def _load(self, session_id: str, now: float) -> Dict:
+        """Return a session's record, loading it from SQLite or creating it."""
+        session = self._sessions.get(session_id)
+        if session is not None and now - session["last_seen"] > self.idle_seconds:
+            del self._sessions[session_id]
+            session = None
+        if session is None:
+            history: List[Dict[str, str]] = []
+            if self._db is not None:
+                row = self._db.execute("SELECT history, last_seen FROM sessions WHERE session_id = ?",
+                                       (session_id,)).fetchone()
+                if row is not None and now - row[1] <= self.idle_seconds:
+                    history = json.loads(row[0])
+            session = {"history": history, "last_seen": now}
+            self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _evict(self, now: float) -> None:
+        """Drop idle sessions and, beyond ``max_sessions``, the least recently used."""
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - session["last_seen"] <= self.idle_seconds:
+                break
+            del self._sessions[session_id]
+
+        # Sweep SQLite for idle sessions at most once per idle period fraction
+        if self._db is not None and now - self._last_sweep > min(self.idle_seconds, 3600) / 10:
+            self._db.execute("DELETE FROM sessions WHERE last_seen < ?", (now - self.idle_seconds,))
+            self._db.commit()
+            self._last_sweep = now
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        """Add a message to a session's history."""
+        now = time.time()
+        with self._lock:
+            session = self._load(session_id, now)
+            session["history"].append({"role": role, "content": content})
+            del session["history"][:-self.max_messages]
+            session["last_seen"] = now
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                                 (session_id, json.dumps(session["history"]), now))
+                self._db.commit()
+            self._evict(now)
+
+    def history(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """Most recent messages of a session (``window`` unless ``limit`` is given)."""
+        limit = self.window if limit is None else limit
+        with self._lock:
+            messages = self._load(session_id, time.time())["history"]
+            return list(messages[-limit:]) if limit else []
+
+    def clear(self, session_id: str) -> None:
+        """Forget one session's history."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                self._db.commit()
+
+    def close(self) -> None:
+        """Close the SQLite connection."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,491 @@
+"""Vector store partitioned into independently persisted shards."""
+
+import heapq
+import json
+import os
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Sequence, Set, Tuple, Union
+import numpy as np
+from .metrics import timed
+from .vector_store import VectorStore
+
+# Chunk fields that can decide a chunk's shard; "hash" spreads the chunks of one file evenly
+SHARD_KEYS = ("source", "department", "hash")
+
+def shards_path(filepath: str) -> str:
+    """Top-level metadata of a sharded store saved at ``filepath``."""
+    return f"{filepath}_shards.json"
+
+def is_sharded(filepath: str) -> bool:
+    """Whether the store saved at ``filepath`` is sharded."""
+    return Path(shards_path(filepath)).exists()
+
+def load_store(filepath: str, mmap: bool = False) -> Union[VectorStore, 'ShardedVectorStore']:
+    """Load the store saved at ``filepath``, sharded or not."""
+    if is_sharded(filepath):
+        return ShardedVectorStore.load(filepath, mmap=mmap)
+    return VectorStore.load(filepath, mmap=mmap)
+
+class _ShardedDocuments:
+    """Chunk records of a sharded store, addressed by global chunk ID."""
+
+    def __init__(self, store: 'ShardedVectorStore'):
+        self._store = store
+
+    def __len__(self) -> int:
+        return len(self._store._local)
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        """Decode one chunk from its shard."""
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("chunk index out of range")
+        store = self._store
+        return store.shards[store._shard_of[idx]].documents[store._local[idx]]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+class _ShardedMetadata:
+    """Metadata filters of a sharded store, resolved to global chunk IDs."""
+
+    def __init__(self, store: 'ShardedVectorStore'):
+        self._store = store
+
+    def __len__(self) -> int:
+        return len(self._store._local)
+
+    def select(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Sorted global chunk IDs matching ``filters`` (see ``MetadataIndex.select``)."""
+        store = self._store
+        selected = [np.array(store.shard_ids[i], dtype=np.int64)[shard.metadata.select(filters)]
+                    for i, shard in enumerate(store.shards)]
+        return np.sort(np.concatenate(selected))
+
+class ShardedVectorStore:
+    """Chunks partitioned across several ``VectorStore`` shards.
+
+    Each chunk goes to the shard chosen by hashing its ``shard_by`` field:
+    its ``source`` (the default, so a file's chunks stay together), its
+    ``department``, or its text (``hash``, for evenly sized shards). Chunk
+    IDs stay global and positional, exactly as in ``VectorStore``, so the
+    manifest and BM25 index work unchanged; every shard records the global
+    ID of each of its chunks.
+
+    Searches fan out to all shards on a thread pool (FAISS releases the GIL
+    while it searches) and the per-shard top ``k`` are merged with a heap.
+    Every shard is an ordinary store persisted under its own prefix
+    (``{filepath}.shard03``); ``flush`` only writes the shards that changed,
+    and shards can be rebuilt or reloaded on their own.
+    """
+
+    def __init__(self, num_shards: int = 4, shard_by: str = "source", dimension: int = 384,
+                 index_type: str = "flat", index_params: Optional[Dict[str, int]] = None,
+                 max_segments: int = 8):
+        """Create an empty store of ``num_shards`` shards of the given index mode."""
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        if shard_by not in SHARD_KEYS:
+            raise ValueError(f"Unknown shard key '{shard_by}'. Expected one of {SHARD_KEYS}")
+        self.shard_by = shard_by
+        self.shards = [VectorStore(dimension=dimension, index_type=index_type, index_params=index_params,
+                                   max_segments=max_segments) for _ in range(num_shards)]
+        self.shard_ids: List[array] = [array("q") for _ in range(num_shards)]  # Global ID of each shard chunk
+        self._shard_of = array("h")  # Shard of each global ID
+        self._local = array("q")     # Position within that shard
+        self.deleted: Set[int] = set()
+        self.documents = _ShardedDocuments(self)
+        self.metadata = _ShardedMetadata(self)
+        self._dirty: Set[int] = set()  # Shards changed since they were last persisted
+
+        # Batch state: changes staged until the outermost batch commits
+        self._batch_depth = 0
+        self._batch_path: Optional[str] = None
+        self._staged: List[Dict[str, Any]] = []
+        self._staged_vectors: List[np.ndarray] = []
+        self._staged_deletes: List[int] = []
+
+        # Fan-out threads, created per process on first use
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+
+    @property
+    def num_shards(self) -> int:
+        return len(self.shards)
+
+    @property
+    def dimension(self) -> int:
+        return self.shards[0].dimension
+
+    @property
+    def index_type(self) -> str:
+        return self.shards[0].index_type
+
+    @property
+    def index_params(self) -> Dict[str, int]:
+        return self.shards[0].index_params
+
+    @property
+    def generation(self) -> int:
+        """Changes visible to searches, summed over the shards."""
+        return sum(shard.generation for shard in self.shards)
+
+    @property
+    def read_only(self) -> bool:
+        return any(shard.read_only for shard in self.shards)
+
+    @property
+    def in_batch(self) -> bool:
+        """Whether changes are currently being staged by ``batch()``."""
+        return self._batch_depth > 0
+
+    @property
+    def live_count(self) -> int:
+        """Number of indexed documents that are not deleted."""
+        return len(self._local) - len(self.deleted)
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise RuntimeError("This vector store is a read-only snapshot")
+
+    def _map(self, func: Callable[[int], Any], shards: Optional[Iterable[int]] = None) -> List[Any]:
+        """Run ``func(shard_index)`` for each shard on the thread pool and return the results in order."""
+        shards = list(range(self.num_shards) if shards is None else shards)
+        if len(shards) <= 1:
+            return [func(i) for i in shards]
+        if self._executor_pid != os.getpid():
+            # Threads do not survive a fork, so each process starts its own
+            self._executor = ThreadPoolExecutor(max_workers=self.num_shards, thread_name_prefix="shard")
+            self._executor_pid = os.getpid()
+        return list(self._executor.map(func, shards))
+
+    def shard_for(self, document: Dict[str, Any]) -> int:
+        """Shard a chunk belongs to."""
+        if self.shard_by == "hash":
+            key = document.get("text", "")
+        else:
+            key = document.get(self.shard_by) or document.get("source") or document.get("text", "")
+        return zlib.crc32(str(key).encode("utf-8")) % self.num_shards
+
+    def add_documents(self, documents: List[Dict[str, Any]]) -> List[int]:
+        """Add documents with embeddings to their shards and return their global chunk IDs."""
+        if not documents:
+            return []
+        self._check_writable()
+
+        first_id = len(self._local) + len(self._staged)
+        ids = list(range(first_id, first_id + len(documents)))
+        embeddings = np.array([doc["embedding"] for doc in documents], dtype=np.float32)
+
+        if self._batch_depth:
+            self._staged.extend({key: value for key, value in doc.items() if key != "embedding"}
+                                for doc in documents)
+            self._staged_vectors.append(embeddings)
+            return ids
+
+        self._append(documents, embeddings)
+        return ids
+
+    def _append(self, documents: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        """Add chunks to their shards in parallel and record where each one went."""
+        first_id = len(self._local)
+        positions: Dict[int, List[int]] = {}
+        for i, doc in enumerate(documents):
+            positions.setdefault(self.shard_for(doc), []).append(i)
+
+        def add(shard_index: int) -> List[int]:
+            rows = positions[shard_index]
+            return self.shards[shard_index].add_documents(
+                [{**documents[i], "embedding": embeddings[i]} for i in rows])
+
+        shard_of = array("h", bytes(2 * len(documents)))
+        local = array("q", bytes(8 * len(documents)))
+        for shard_index, local_ids in zip(positions, self._map(add, positions)):
+            for i, local_id in zip(positions[shard_index], local_ids):
+                shard_of[i] = shard_index
+                local[i] = local_id
+            self.shard_ids[shard_index].extend(first_id + i for i in positions[shard_index])
+        self._shard_of.extend(shard_of)
+        self._local.extend(local)
+        self._dirty.update(positions)
+
+    def delete(self, ids: Iterable[int]) -> None:
+        """Mark chunks (by global ID) as deleted so they are no longer returned by searches."""
+        ids = [int(i) for i in ids if int(i) not in self.deleted]
+        if not ids:
+            return
+        self._check_writable()
+        if self._batch_depth:
+            self._staged_deletes.extend(ids)
+            return
+        self.deleted.update(ids)
+        by_shard: Dict[int, List[int]] = {}
+        for idx in ids:
+            by_shard.setdefault(self._shard_of[idx], []).append(self._local[idx])
+        for shard_index, local_ids in by_shard.items():
+            self.shards[shard_index].delete(local_ids)
+        self._dirty.update(by_shard)
+
+    @contextmanager
+    def batch(self, filepath: Optional[str] = None) -> Iterator['ShardedVectorStore']:
+        """Group changes into one transaction, as ``VectorStore.batch`` does.
+
+        On commit the staged chunks are added to their shards and only the
+        shards that changed are flushed to ``filepath``.
+        """
+        self._batch_depth += 1
+        if filepath is not None and self._batch_path is None:
+            self._batch_path = filepath
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._staged = []
+                self._staged_vectors = []
+                self._staged_deletes = []
+                self._batch_path = None
+            raise
+
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            staged, self._staged = self._staged, []
+            staged_vectors, self._staged_vectors = self._staged_vectors, []
+            staged_deletes, self._staged_deletes = self._staged_deletes, []
+            path, self._batch_path = self._batch_path, None
+            if staged:
+                self._append(staged, np.vstack(staged_vectors))
+            self.delete(staged_deletes)
+            if path is not None:
+                self.flush(path)
+
+    def rebuild(self, index_type: Optional[str] = None, index_params: Optional[Dict[str, int]] = None,
+                shards: Optional[Sequence[int]] = None) -> None:
+        """Rebuild the indexes of all shards, or only of ``shards``, in parallel.
+
+        The index mode can only change when every shard is rebuilt.
+        """
+        self._check_writable()
+        if shards is not None and index_type is not None and len(set(shards)) < self.num_shards:
+            raise ValueError("Changing the index type requires rebuilding every shard")
+        targets = list(range(self.num_shards)) if shards is None else list(shards)
+        self._map(lambda i: self.shards[i].rebuild(index_type=index_type, index_params=index_params), targets)
+        self._dirty.update(targets)
+
+    def vacuum(self) -> np.ndarray:
+        """Physically remove deleted chunks from every shard and renumber the rest globally.
+
+        Returns an array mapping each old global chunk ID to its new ID (-1 if deleted).
+        """
+        self._check_writable()
+        count = len(self._local)
+        keep = np.ones(count, dtype=bool)
+        keep[list(self.deleted)] = False
+        mapping = np.full(count, -1, dtype=np.int64)
+        mapping[keep] = np.arange(int(keep.sum()))
+        if not self.deleted:
+            return mapping
+
+        old_ids = [np.array(ids, dtype=np.int64) for ids in self.shard_ids]
+        local_maps = self._map(lambda i: self.shards[i].vacuum())
+        # Shards keep their surviving chunks in order, so new local positions follow the old ones
+        self.shard_ids = [array("q", mapping[ids[local_map >= 0]].tobytes())
+                          for ids, local_map in zip(old_ids, local_maps)]
+        self._index_locations(int(keep.sum()))
+        self.deleted = set()
+        self._dirty = set(range(self.num_shards))
+        return mapping
+
+    def _index_locations(self, count: int) -> None:
+        """Rebuild the global ID -> (shard, position) table from ``shard_ids``."""
+        shard_of = np.full(count, -1, dtype=np.int16)
+        local = np.zeros(count, dtype=np.int64)
+        for shard_index, ids in enumerate(self.shard_ids):
+            ids = np.array(ids, dtype=np.int64)
+            shard_of[ids] = shard_index
+            local[ids] = np.arange(len(ids))
+        if (shard_of < 0).any():
+            raise ValueError("Shards do not cover every chunk ID")
+        self._shard_of = array("h", shard_of.tobytes())
+        self._local = array("q", local.tobytes())
+
+    def get_vectors(self) -> np.ndarray:
+        """Return every stored vector in global chunk ID order."""
+        vectors = np.zeros((len(self._local), self.dimension), dtype=np.float32)
+        for ids, shard_vectors in zip(self.shard_ids, self._map(lambda i: self.shards[i].get_vectors())):
+            vectors[np.array(ids, dtype=np.int64)] = shard_vectors
+        return vectors
+
+    def search_batch(self, query_embeddings: np.ndarray, k: int = 5,
+                     filters: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Search every shard in parallel and merge their top ``k`` per query.
+
+        Returns ``(scores, ids)`` with global chunk IDs, as ``VectorStore.search_batch`` does.
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        scores = np.full((len(query_embeddings), k), np.inf, dtype=np.float32)
+        ids = np.full((len(query_embeddings), k), -1, dtype=np.int64)
+        if self.live_count == 0 or len(query_embeddings) == 0:
+            return scores, ids
+
+        def search_shard(shard_index: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+            shard = self.shards[shard_index]
+            if shard.live_count == 0:
+                return None
+            shard_scores, local_ids = shard.search_batch(query_embeddings, k, filters=filters)
+            global_ids = self.shard_ids[shard_index]
+            mapped = [global_ids[i] if i >= 0 else -1 for i in local_ids.ravel().tolist()]
+            return shard_scores, np.array(mapped, dtype=np.int64).reshape(local_ids.shape)
+
+        results = [result for result in self._map(search_shard) if result is not None]
+        for row in range(len(query_embeddings)):
+            hits = heapq.nsmallest(k, (
+                (score, idx)
+                for shard_scores, shard_ids in results
+                for score, idx in zip(shard_scores[row].tolist(), shard_ids[row].tolist()) if idx >= 0
+            ))
+            for column, (score, idx) in enumerate(hits):
+                scores[row, column] = score
+                ids[row, column] = idx
+        return scores, ids
+
+    def search(self, query_embedding: np.ndarray, k: int = 5,
+               filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Search for similar documents across all shards."""
+        scores, ids = self.search_batch(query_embedding.reshape(1, -1), k, filters=filters)
+        results = []
+        for score, idx in zip(scores[0].tolist(), ids[0].tolist()):
+            if idx < 0:
+                continue
+            doc = self.documents[idx]
+            doc["id"] = idx
+            doc["score"] = score
+            results.append(doc)
+        return results
+
+    def get_documents(self, ids: np.ndarray) -> Dict[int, Dict[str, Any]]:
+        """Decode each distinct chunk ID in ``ids`` once (negative IDs are ignored)."""
+        unique = np.unique(np.asarray(ids).ravel())
+        return {int(idx): self.documents[int(idx)] for idx in unique[unique >= 0]}
+
+    @staticmethod
+    def shard_prefix(filepath: str, shard_index: int) -> str:
+        """Prefix of one shard's files, loadable on its own with ``VectorStore.load``."""
+        return f"{filepath}.shard{shard_index:02d}"
+
+    def _write_ids(self, filepath: str, shard_index: int) -> None:
+        """Write a shard's global IDs; written before the shard, loads ignore any surplus."""
+        path = f"{self.shard_prefix(filepath, shard_index)}_ids.npy"
+        with open(f"{path}.tmp", 'wb') as f:
+            np.save(f, np.array(self.shard_ids[shard_index], dtype=np.int64))
+        VectorStore._replace_file(f"{path}.tmp", path)
+
+    def _write_meta(self, filepath: str) -> None:
+        """Write the top-level metadata last; its presence marks the store as sharded."""
+        with open(f"{shards_path(filepath)}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({
+                'shards': self.num_shards,
+                'shard_by': self.shard_by,
+                'dimension': self.dimension,
+                'index_type': self.index_type,
+                'index_params': self.index_params,
+                'count': len(self._local),
+                'deleted': sorted(self.deleted)
+            }, f, indent=2)
+        VectorStore._replace_file(f"{shards_path(filepath)}.tmp", shards_path(filepath))
+
+    @timed("index_save")
+    def save(self, filepath: str) -> None:
+        """Save a full snapshot of every shard, in parallel."""
+        def save_shard(shard_index: int) -> None:
+            self._write_ids(filepath, shard_index)
+            self.shards[shard_index].save(self.shard_prefix(filepath, shard_index))
+
+        self._map(save_shard)
+        self._write_meta(filepath)
+        self._dirty = set()
+
+    @timed("index_flush")
+    def flush(self, filepath: str) -> None:
+        """Persist the shards changed since the last save/flush, each as a ``VectorStore.flush``."""
+        if self._batch_depth:
+            return  # The enclosing batch flushes on commit
+        if not is_sharded(filepath):
+            self.save(filepath)
+            return
+        if not self._dirty:
+            return
+
+        def flush_shard(shard_index: int) -> None:
+            self._write_ids(filepath, shard_index)
+            self.shards[shard_index].flush(self.shard_prefix(filepath, shard_index))
+
+        self._map(flush_shard, sorted(self._dirty))
+        self._write_meta(filepath)
+        self._dirty = set()
+
+    def export(self, filepath: str) -> None:
+        """Write a full copy of every shard to ``filepath`` without changing what ``flush`` tracks."""
+        def export_shard(shard_index: int) -> None:
+            self._write_ids(filepath, shard_index)
+            self.shards[shard_index].export(self.shard_prefix(filepath, shard_index))
+
+        self._map(export_shard)
+        self._write_meta(filepath)
+
+    def _load_shard_files(self, filepath: str, shard_index: int, mmap: bool) -> Tuple[VectorStore, array]:
+        prefix = self.shard_prefix(filepath, shard_index)
+        shard = VectorStore.load(prefix, mmap=mmap)
+        ids = np.load(f"{prefix}_ids.npy")
+        if len(ids) < len(shard.documents):
+            raise ValueError(f"{prefix} has chunks without global IDs")
+        return shard, array("q", ids[:len(shard.documents)].astype(np.int64).tobytes())
+
+    def load_shard(self, filepath: str, shard_index: int) -> None:
+        """Replace one shard with its files on disk, e.g. after rebuilding it in another process.
+
+        The shard must hold the same chunks (the same global IDs) as before.
+        """
+        shard, ids = self._load_shard_files(filepath, shard_index, mmap=self.read_only)
+        if ids != self.shard_ids[shard_index]:
+            raise ValueError(f"Shard {shard_index} on disk holds different chunks")
+        self.shards[shard_index] = shard
+        self._dirty.discard(shard_index)
+
+    @classmethod
+    @timed("index_load")
+    def load(cls, filepath: str, mmap: bool = False) -> 'ShardedVectorStore':
+        """Load every shard in parallel (memory-mapped and read-only with ``mmap``)."""
+        with open(shards_path(filepath), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        store = cls(num_shards=meta['shards'], shard_by=meta['shard_by'], dimension=meta['dimension'],
+                    index_type=meta['index_type'], index_params=meta.get('index_params'))
+
+        loaded = store._map(lambda i: store._load_shard_files(filepath, i, mmap))
+        store.shards = [shard for shard, _ in loaded]
+        store.shard_ids = [ids for _, ids in loaded]
+        store._index_locations(sum(len(ids) for ids in store.shard_ids))
+        for shard, ids in zip(store.shards, store.shard_ids):
+            store.deleted.update(ids[local] for local in shard.deleted)
+        return store
+
+    @classmethod
+    def from_store(cls, store, num_shards: int, shard_by: str = "source") -> 'ShardedVectorStore':
+        """Partition the chunks of another store, keeping their IDs (deleted chunks stay deleted)."""
+        sharded = cls(num_shards=num_shards, shard_by=shard_by, dimension=store.dimension,
+                      index_type=store.index_type, index_params=store.index_params)
+        vectors = store.get_vectors()
+        documents = [store.documents[i] for i in range(len(store.documents))]
+        if len(documents):
+            sharded._append(documents, vectors)
+        for shard in sharded.shards:
+            if shard.index_type != "flat":
+                shard.rebuild()  # Train each shard on all of its vectors
+        sharded.delete(sorted(store.deleted))
+        return sharded
@@ -0,0 +1,79 @@
+"""Versioned, read-only snapshots of the index shared by server processes.
+
+The process that ingests documents publishes each committed change as a
+new generation directory under ``{data_dir}/snapshots``:
+
+    snapshots/
+        CURRENT            # name of the latest generation, replaced atomically
+        00000007/          # vector_store.index, _chunks.*, _meta.json, _manifest.json, _bm25.npz
+        00000008/
+
+Server processes memory-map the generation named by ``CURRENT``, so the
+index pages are held once per host by the OS page cache rather than once
+per worker, and swap in a newer generation between requests as soon as
+``CURRENT`` changes. Old generations are pruned after ``keep`` newer ones
+exist; processes still mapping them keep their pages until they swap.
+"""
+
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
+
+# Name of the store files inside a generation directory
+SNAPSHOT_PREFIX = "vector_store"
+
+class SnapshotDirectory:
+    """Publishes and locates snapshot generations under one root directory."""
+
+    def __init__(self, root: str, keep: int = 3):
+        """Manage generations under ``root``, keeping the newest ``keep``."""
+        self.root = Path(root)
+        self.keep = keep
+
+    @property
+    def current_path(self) -> Path:
+        return self.root / "CURRENT"
+
+    def current(self) -> Optional[int]:
+        """The latest published generation, or None if nothing has been published."""
+        try:
+            return int(self.current_path.read_text(encoding="utf-8").strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def path(self, generation: int) -> Path:
+        """Directory of a generation."""
+        return self.root / f"{generation:08d}"
+
+    def prefix(self, generation: int) -> str:
+        """Store file prefix inside a generation, as passed to ``VectorStore.load``."""
+        return str(self.path(generation) / SNAPSHOT_PREFIX)
+
+    def _generations(self):
+        return sorted(int(p.name) for p in self.root.glob("[0-9]" * 8) if p.is_dir())
+
+    def create(self) -> int:
+        """Reserve the next generation and return it; write its files under ``path``."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        generation = max(self._generations() + [self.current() or 0]) + 1
+        self.path(generation).mkdir()
+        return generation
+
+    def publish(self, generation: int) -> None:
+        """Point ``CURRENT`` at a fully written generation and prune old ones."""
+        tmp_path = self.current_path.with_name("CURRENT.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(f"{generation:08d}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.current_path)
+
+        for old in self._generations()[:-self.keep]:
+            if old != generation:
+                # Fails harmlessly on platforms that lock mapped files
+                shutil.rmtree(self.path(old), ignore_errors=True)
+
+    def abandon(self, generation: int) -> None:
+        """Remove a generation that failed before it was published."""
+        shutil.rmtree(self.path(generation), ignore_errors=True)
@@ -0,0 +1,91 @@
+"""Memory-mapped full-precision copies of indexed vectors."""
+
+import os
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+
+class VectorFile:
+    """Float32 vectors addressed by chunk ID, backed by a memory-mapped ``.npy`` file.
+
+    Compressed index modes keep only float16 or int8 codes in the FAISS
+    index; this file holds the original vectors so search candidates can be
+    re-scored exactly. Only the rows a search touches are paged in, and the
+    pages are shared between worker processes. Vectors added after loading
+    are kept in memory until the next ``write``.
+    """
+
+    def __init__(self, dimension: int, vectors: Optional[np.ndarray] = None):
+        """Create an in-memory file, optionally seeded with a ``(n, dimension)`` matrix."""
+        self.dimension = dimension
+        self._base: np.ndarray = np.zeros((0, dimension), dtype=np.float32)
+        self._pending: List[np.ndarray] = []
+        if vectors is not None and len(vectors):
+            self.append(vectors)
+
+    @staticmethod
+    def path(prefix: str) -> str:
+        return f"{prefix}_vectors.npy"
+
+    @classmethod
+    def exists(cls, prefix: str) -> bool:
+        """Check whether vectors have been written at this prefix."""
+        return Path(cls.path(prefix)).exists()
+
+    @classmethod
+    def open(cls, prefix: str) -> 'VectorFile':
+        """Memory-map vectors written with ``write``."""
+        base = np.load(cls.path(prefix), mmap_mode='r')
+        vectors = cls(base.shape[1])
+        vectors._base = base
+        return vectors
+
+    def __len__(self) -> int:
+        return len(self._base) + sum(len(part) for part in self._pending)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of all vectors in bytes (mapped or in memory)."""
+        return len(self) * self.dimension * 4
+
+    def append(self, vectors: np.ndarray) -> None:
+        """Add rows for the next chunk IDs."""
+        self._pending.append(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension))
+
+    def _tail(self) -> np.ndarray:
+        # Consolidate appended parts so lookups index a single array
+        if len(self._pending) != 1:
+            self._pending = [np.vstack(self._pending) if self._pending
+                             else np.zeros((0, self.dimension), dtype=np.float32)]
+        return self._pending[0]
+
+    def take(self, ids: np.ndarray) -> np.ndarray:
+        """Rows for ``ids``, reading only those rows from the mapped file."""
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = np.empty((len(ids), self.dimension), dtype=np.float32)
+        mapped = ids < len(self._base)
+        rows[mapped] = self._base[ids[mapped]]
+        if not mapped.all():
+            rows[~mapped] = self._tail()[ids[~mapped] - len(self._base)]
+        return rows
+
+    def all(self) -> np.ndarray:
+        """Every vector as one in-memory matrix."""
+        return np.vstack([np.asarray(self._base), self._tail()])
+
+    def write(self, prefix: str, remap: bool = True) -> None:
+        """Write every vector to ``prefix`` atomically and re-map the result.
+
+        With ``remap=False`` the file is left as it was, e.g. when writing a copy.
+        """
+        tmp_path = self.path(prefix) + ".tmp"
+        out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(len(self), self.dimension))
+        out[:len(self._base)] = self._base
+        out[len(self._base):] = self._tail()
+        out.flush()
+        del out
+        os.replace(tmp_path, self.path(prefix))
+
+        if remap:
+            self._pending = []
+            self._base = np.load(self.path(prefix), mmap_mode='r')
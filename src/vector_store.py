@@ -1,87 +1,697 @@
 """Vector store implementation for document retrieval."""
 
 import json
+import os
 import numpy as np
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
 import faiss
+from .chunk_store import ChunkStore
+from .metadata import MetadataIndex
+from .metrics import timed
+from .vector_file import VectorFile
+
+# Supported index modes and their tuning defaults
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq", "fp16", "sq8")
+
+# Modes that search compressed vectors and re-rank candidates at full precision
+COMPRESSED_TYPES = ("fp16", "sq8")
+
+DEFAULT_INDEX_PARAMS: Dict[str, int] = {
+    "nlist": 100,           # IVF coarse quantizer cells
+    "nprobe": 8,            # IVF cells visited per query
+    "hnsw_m": 32,           # HNSW graph degree
+    "ef_construction": 80,  # HNSW build-time beam width
+    "ef_search": 64,        # HNSW query-time beam width
+    "pq_m": 16,             # PQ sub-quantizers (must divide the dimension)
+    "pq_nbits": 8,          # bits per PQ code
+    "rerank": 50,           # fp16/sq8 candidates re-scored at full precision
+    "filter_exact": 2048,   # Filters matching at most this many chunks are searched exactly
+}
+
+# Chunk vectors read at a time by exact searches over a filtered subset
+_EXACT_BLOCK = 4096
 
 class VectorStore:
-    """A simple FAISS-based vector store for document retrieval."""
-    
-    def __init__(self, dimension: int = 384):  # Default dimension for all-MiniLM-L6-v2
+    """A simple FAISS-based vector store for document retrieval.
+
+    The index mode is chosen at construction time and kept through save/load:
+    ``flat`` (exact brute force), ``ivf`` (inverted file with a trained coarse
+    quantizer), ``hnsw`` (graph based) and ``ivfpq`` (IVF with product
+    quantized vectors), plus ``fp16`` and ``sq8`` (float16 or scalar-quantized
+    int8 vectors, a half or a quarter of the memory of ``flat``). Trainable
+    modes keep vectors in a flat index until enough of them exist to train
+    the quantizer, then switch over in place.
+
+    The compressed ``fp16`` and ``sq8`` modes find ``rerank`` candidates
+    among the compressed vectors and re-score them exactly against float32
+    copies held in a ``VectorFile``, memory-mapped once saved, so results
+    and scores match ``flat`` closely while the index stays small.
+
+    ``save`` writes a full snapshot. ``flush`` appends only the documents
+    added since the last save/flush as a small delta segment, and compacts
+    the segments into a new snapshot once there are ``max_segments`` of them.
+    Additions made inside ``batch()`` are applied and persisted together.
+
+    Documents are addressed by their position (chunk ID). ``delete`` marks
+    IDs as tombstones that searches exclude inside FAISS; ``vacuum`` removes
+    them physically and renumbers the remaining chunks.
+
+    Searches can be restricted with a metadata filter such as
+    ``{"department": "Computing", "year": {"gte": 2024}}``. The matching IDs
+    come from a ``MetadataIndex`` kept next to the index and are applied
+    inside FAISS as an ID selector, so a filtered search still returns
+    ``k`` hits if ``k`` chunks match. Filters matching few chunks, and rows
+    an approximate index comes back short on, are searched exactly over
+    the matching vectors.
+    """
+
+    def __init__(self, dimension: int = 384,  # Default dimension for all-MiniLM-L6-v2
+                 index_type: str = "flat", index_params: Optional[Dict[str, int]] = None,
+                 max_segments: int = 8):
         """Initialize the vector store with a given embedding dimension."""
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}'. Expected one of {INDEX_TYPES}")
+
         self.dimension = dimension
-        self.index = faiss.IndexFlatL2(dimension)
-        self.documents: List[Dict[str, Any]] = []
-    
-    def add_documents(self, documents: List[Dict[str, Any]]) -> None:
-        """Add documents with embeddings to the vector store."""
+        self.index_type = index_type
+        self.index_params = {**DEFAULT_INDEX_PARAMS, **(index_params or {})}
+        self.max_segments = max_segments
+        self.index = self._create_index(dimension)
+        self.exact = VectorFile(dimension) if index_type in COMPRESSED_TYPES else None
+        self.documents = ChunkStore()
+        self.metadata = MetadataIndex()
+        self.deleted: Set[int] = set()
+        self.generation = 0  # Bumped on every change visible to searches
+        self.read_only = False  # Set for memory-mapped snapshots, which must not change
+
+        # Persistence state: documents on disk and changes not yet flushed
+        self._persisted_count = 0
+        self._unflushed_vectors: List[np.ndarray] = []
+        self._unflushed_deletes: List[int] = []
+
+        # Batch state: changes staged until the outermost batch commits
+        self._batch_depth = 0
+        self._batch_path: Optional[str] = None
+        self._staged: List[Dict[str, Any]] = []  # Chunks without their embeddings
+        self._staged_vectors: List[np.ndarray] = []
+        self._staged_deletes: List[int] = []
+
+    def _create_index(self, dimension: int) -> faiss.Index:
+        """Create an empty index for the configured mode."""
+        params = self.index_params
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dimension, params["hnsw_m"])
+            index.hnsw.efConstruction = params["ef_construction"]
+            index.hnsw.efSearch = params["ef_search"]
+            return index
+        if self.index_type == "fp16":
+            return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16)
+
+        # Flat is also the staging index for trainable modes
+        return faiss.IndexFlatL2(dimension)
+
+    def _train_threshold(self) -> int:
+        """Number of vectors needed before a trainable index is built."""
+        params = self.index_params
+        threshold = 39 * params["nlist"]  # FAISS' recommended minimum per centroid
+        if self.index_type == "ivfpq":
+            threshold = max(threshold, 2 ** params["pq_nbits"])
+        if self.index_type == "sq8":
+            threshold = 256  # Enough to estimate each dimension's range
+        return threshold
+
+    def _needs_training(self) -> bool:
+        """Check if the store is still staging vectors for a trainable mode."""
+        if self.index_type == "sq8":
+            return not isinstance(self.index, faiss.IndexScalarQuantizer)
+        return (
+            self.index_type in ("ivf", "ivfpq")
+            and faiss.try_extract_index_ivf(self.index) is None
+        )
+
+    def _build_trained_index(self, vectors: np.ndarray) -> faiss.Index:
+        """Train an IVF, IVF-PQ or int8 scalar quantizer index on the given vectors."""
+        params = self.index_params
+        if self.index_type == "sq8":
+            index = faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_8bit)
+            index.train(vectors)
+            index.add(vectors)
+            return index
+
+        nlist = max(1, min(params["nlist"], len(vectors) // 39))
+        if self.index_type == "ivfpq":
+            description = f"IVF{nlist},PQ{params['pq_m']}x{params['pq_nbits']}"
+        else:
+            description = f"IVF{nlist},Flat"
+
+        index = faiss.index_factory(self.dimension, description)
+        index.train(vectors)
+        index.add(vectors)
+        return index
+
+    def _configure_search(self) -> None:
+        """Apply query-time parameters to the current index."""
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            ivf.nprobe = self.index_params["nprobe"]
+        if isinstance(self.index, faiss.IndexHNSW):
+            self.index.hnsw.efSearch = self.index_params["ef_search"]
+
+    def get_vectors(self) -> np.ndarray:
+        """Return every stored vector (approximate for PQ indexes)."""
+        if self.exact is not None:
+            return self.exact.all()
+        if self.index.ntotal == 0:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            ivf.make_direct_map()
+        return self.index.reconstruct_n(0, self.index.ntotal)
+
+    @property
+    def in_batch(self) -> bool:
+        """Whether changes are currently being staged by ``batch()``."""
+        return self._batch_depth > 0
+
+    @property
+    def live_count(self) -> int:
+        """Number of indexed documents that are not deleted."""
+        return len(self.documents) - len(self.deleted)
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise RuntimeError("This vector store is a read-only snapshot")
+
+    def add_documents(self, documents: List[Dict[str, Any]]) -> List[int]:
+        """Add documents with embeddings to the vector store and return their chunk IDs."""
         if not documents:
-            return
-            
+            return []
+        self._check_writable()
+
+        first_id = len(self.documents) + len(self._staged)
+        ids = list(range(first_id, first_id + len(documents)))
+
         # Extract embeddings
         embeddings = np.array([doc["embedding"] for doc in documents], dtype=np.float32)
-        
-        # Add to FAISS index
-        if len(self.documents) == 0:
-            self.index = faiss.IndexFlatL2(embeddings.shape[1])
-        
-        # Add vectors to index
-        self.index.add(embeddings)
-        
-        # Store document metadata
+
+        # Inside a batch, additions are applied when the batch commits; staged
+        # chunks keep their vectors as float32 rather than lists of floats
+        if self._batch_depth:
+            self._staged.extend({key: value for key, value in doc.items() if key != "embedding"}
+                                for doc in documents)
+            self._staged_vectors.append(embeddings)
+            return ids
+
+        self._append(documents, embeddings)
+        return ids
+
+    def _append(self, documents: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        """Index ``embeddings`` and store the matching chunks."""
+        self._add_vectors(embeddings)
+        self._unflushed_vectors.append(embeddings)
+
+        # Store document metadata (embeddings live only in the index)
         self.documents.extend(documents)
-    
-    def search(self, query_embedding: np.ndarray, k: int = 5) -> List[Dict[str, Any]]:
-        """Search for similar documents."""
+        self.metadata.sync(self.documents)
+        self.generation += 1
+
+    def delete(self, ids: Iterable[int]) -> None:
+        """Mark chunks as deleted so they are no longer returned by searches."""
+        ids = [int(i) for i in ids if int(i) not in self.deleted]
+        if not ids:
+            return
+        self._check_writable()
+        if self._batch_depth:
+            self._staged_deletes.extend(ids)
+            return
+        self.deleted.update(ids)
+        self._unflushed_deletes.extend(ids)
+        self.generation += 1
+
+    def _add_vectors(self, embeddings: np.ndarray) -> None:
+        """Add vectors to the FAISS index, training it when due."""
         if len(self.documents) == 0:
+            self.dimension = embeddings.shape[1]
+            self.index = self._create_index(self.dimension)
+            if self.exact is not None:
+                self.exact = VectorFile(self.dimension)
+
+        # Add vectors to index (and their full-precision copies first, for training)
+        if self.exact is not None:
+            self.exact.append(embeddings)
+        self.index.add(embeddings)
+
+        # Switch from the staging index once there is enough data to train
+        if self._needs_training() and self.index.ntotal >= self._train_threshold():
+            self.index = self._build_trained_index(self.get_vectors())
+            self._configure_search()
+
+    @contextmanager
+    def batch(self, filepath: Optional[str] = None) -> Iterator['VectorStore']:
+        """Group additions into one transaction.
+
+        Documents added or deleted inside the block are staged and only
+        applied to the index (and flushed to ``filepath``, if given) when the
+        outermost batch exits cleanly. If the block raises, the staged changes
+        are discarded and neither the in-memory store nor the files on disk
+        change.
+        """
+        self._batch_depth += 1
+        if filepath is not None and self._batch_path is None:
+            self._batch_path = filepath
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._staged = []
+                self._staged_vectors = []
+                self._staged_deletes = []
+                self._batch_path = None
+            raise
+
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            staged, self._staged = self._staged, []
+            staged_vectors, self._staged_vectors = self._staged_vectors, []
+            staged_deletes, self._staged_deletes = self._staged_deletes, []
+            path, self._batch_path = self._batch_path, None
+            if staged:
+                self._append(staged, np.vstack(staged_vectors))
+            self.delete(staged_deletes)
+            if path is not None:
+                self.flush(path)
+
+    def rebuild(self, index_type: Optional[str] = None,
+                index_params: Optional[Dict[str, int]] = None) -> None:
+        """Rebuild the index from its stored vectors, optionally changing mode."""
+        self._check_writable()
+        vectors = self.get_vectors()
+
+        if index_type is not None:
+            if index_type not in INDEX_TYPES:
+                raise ValueError(f"Unknown index type '{index_type}'. Expected one of {INDEX_TYPES}")
+            self.index_type = index_type
+        if index_params:
+            self.index_params.update(index_params)
+        self._index_vectors(vectors)
+
+    def _index_vectors(self, vectors: np.ndarray) -> None:
+        """Replace the index with a fresh one holding ``vectors``."""
+        # Rebuilding retrains on the full corpus, even below the staging threshold
+        min_train = {"ivfpq": 2 ** self.index_params["pq_nbits"], "sq8": 1}.get(self.index_type, 39)
+        if self.index_type in ("ivf", "ivfpq", "sq8") and len(vectors) >= min_train:
+            self.index = self._build_trained_index(vectors)
+        else:
+            self.index = self._create_index(self.dimension)
+            if len(vectors):
+                self.index.add(vectors)
+        self.exact = VectorFile(self.dimension, vectors) if self.index_type in COMPRESSED_TYPES else None
+        self._configure_search()
+        self.generation += 1
+
+    def vacuum(self) -> np.ndarray:
+        """Physically remove deleted chunks and renumber the rest.
+
+        Returns an array mapping each old chunk ID to its new ID (-1 if deleted).
+        The vectors are re-read from the index, so this is lossy for ``ivfpq``.
+        """
+        self._check_writable()
+        count = len(self.documents)
+        keep = np.ones(count, dtype=bool)
+        keep[list(self.deleted)] = False
+        mapping = np.full(count, -1, dtype=np.int64)
+        mapping[keep] = np.arange(int(keep.sum()))
+        if not self.deleted:
+            return mapping
+
+        vectors = self.get_vectors()[keep]
+        self.documents = ChunkStore(self.documents[i] for i in np.flatnonzero(keep))
+        self.metadata = MetadataIndex()
+        self.metadata.sync(self.documents)
+        self.deleted = set()
+        self._unflushed_deletes = []
+        self._persisted_count = 0  # Renumbering invalidates segments; the next flush saves in full
+        self._index_vectors(vectors)
+        return mapping
+
+    def _search_params(self, selector: faiss.IDSelector) -> faiss.SearchParameters:
+        """Search parameters restricting results to ``selector``, typed for the current index."""
+        if faiss.try_extract_index_ivf(self.index) is not None:
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.index_params["nprobe"])
+        if isinstance(self.index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=self.index_params["ef_search"])
+        return faiss.SearchParameters(sel=selector)
+
+    def _search_arrays(self, queries: np.ndarray, k: int,
+                       allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Raw FAISS search of a query matrix, skipping deleted chunks inside FAISS so k results still come back.
+
+        With ``allowed`` (sorted chunk IDs) only those chunks are searched.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        if allowed is not None:
+            return self._search_allowed(queries, k, allowed)
+
+        params = None
+        if self.deleted:
+            deleted = np.fromiter(self.deleted, dtype=np.int64, count=len(self.deleted))
+            params = self._search_params(faiss.IDSelectorNot(faiss.IDSelectorBatch(deleted)))
+        return self._search_index(queries, k, params)
+
+    def _search_index(self, queries: np.ndarray, k: int,
+                      params: Optional[faiss.SearchParameters]) -> Tuple[np.ndarray, np.ndarray]:
+        """Search the index, re-ranking candidates at full precision in the compressed modes."""
+        if self.exact is None:
+            return self.index.search(queries, k, params=params)
+
+        _, candidates = self.index.search(queries, max(k, self.index_params["rerank"]), params=params)
+        return self._rerank(queries, candidates, k)
+
+    def _search_allowed(self, queries: np.ndarray, k: int, allowed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Search only the live chunks among ``allowed``."""
+        if self.deleted:
+            deleted = np.fromiter(self.deleted, dtype=np.int64, count=len(self.deleted))
+            allowed = allowed[~np.isin(allowed, deleted)]
+        if len(allowed) <= self.index_params["filter_exact"]:
+            return self._exact_search(queries, k, allowed)
+
+        # One bit per chunk ID; FAISS reads the bitmap in place, so it must outlive the search
+        mask = np.zeros(self.index.ntotal, dtype=bool)
+        mask[allowed] = True
+        bitmap = np.packbits(mask, bitorder="little")
+        selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+        distances, ids = self._search_index(queries, k, self._search_params(selector))
+
+        # IVF cells or HNSW neighbourhoods holding few matches can leave rows short
+        short = np.flatnonzero((ids >= 0).sum(axis=1) < min(k, len(allowed)))
+        if len(short):
+            distances[short], ids[short] = self._exact_search(queries[short], k, allowed)
+        return distances, ids
+
+    def _vectors(self, ids: np.ndarray) -> np.ndarray:
+        """Vectors of the given chunk IDs (approximate for PQ indexes)."""
+        if self.exact is not None:
+            return self.exact.take(ids)
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None and ivf.direct_map.no():
+            ivf.make_direct_map()
+        return self.index.reconstruct_batch(ids)
+
+    def _exact_search(self, queries: np.ndarray, k: int, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Brute-force squared L2 search over the chunk IDs ``ids``, a block of vectors at a time."""
+        best_distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        best_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for start in range(0, len(ids), _EXACT_BLOCK):
+            block = ids[start:start + _EXACT_BLOCK]
+            vectors = self._vectors(block)
+            distances = (np.sum(queries ** 2, axis=1, keepdims=True) - 2 * queries @ vectors.T
+                         + np.sum(vectors ** 2, axis=1)).astype(np.float32)
+            distances = np.hstack([best_distances, np.maximum(distances, 0)])
+            candidates = np.hstack([best_ids, np.broadcast_to(block, (len(queries), len(block)))])
+            order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+            best_distances = np.take_along_axis(distances, order, axis=1)
+            best_ids = np.take_along_axis(candidates, order, axis=1)
+        return best_distances, best_ids
+
+    def _rerank(self, queries: np.ndarray, candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-score candidate IDs by exact squared L2 distance and keep the best ``k`` per query."""
+        valid = candidates >= 0
+        unique, inverse = np.unique(candidates[valid], return_inverse=True)
+        vectors = self.exact.take(unique)  # Each candidate row is read once
+
+        distances = np.full(candidates.shape, np.inf, dtype=np.float32)
+        query_rows = np.nonzero(valid)[0]
+        distances[valid] = np.sum((vectors[inverse] - queries[query_rows]) ** 2, axis=1)
+
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        ids = np.take_along_axis(np.where(valid, candidates, -1), order, axis=1)
+        return np.take_along_axis(distances, order, axis=1), ids
+
+    def search(self, query_embedding: np.ndarray, k: int = 5,
+               filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Search for similar documents, optionally only those matching ``filters`` (see ``MetadataIndex.select``)."""
+        if self.live_count == 0:
             return []
-            
+        allowed = self.metadata.select(filters) if filters else None
+        if allowed is not None and len(allowed) == 0:
+            return []
+
         # Reshape query embedding if needed
         if len(query_embedding.shape) == 1:
             query_embedding = query_embedding.reshape(1, -1)
-            
-        # Search the index
-        distances, indices = self.index.search(query_embedding.astype(np.float32), k)
-        
+
+        distances, indices = self._search_arrays(query_embedding, k, allowed)
+
         # Return matching documents with scores
         results = []
         for i, idx in enumerate(indices[0]):
             if idx < 0:  # Skip invalid indices
                 continue
-                
-            doc = self.documents[idx].copy()
+
+            doc = self.documents[idx]  # Decodes just this chunk
+            doc["id"] = int(idx)
             doc["score"] = float(distances[0][i])
             results.append(doc)
-            
+
         return results
-    
+
+    def search_batch(self, query_embeddings: np.ndarray, k: int = 5,
+                     filters: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Search many queries with one FAISS call.
+
+        Returns ``(scores, ids)``, both ``(n_queries, k)``, with ``ids`` of -1
+        where fewer than ``k`` live (and, with ``filters``, matching) chunks
+        exist. Use ``get_documents`` to decode the hits.
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        allowed = self.metadata.select(filters) if filters else None
+        if self.live_count == 0 or len(query_embeddings) == 0 or (allowed is not None and len(allowed) == 0):
+            return (np.full((len(query_embeddings), k), np.inf, dtype=np.float32),
+                    np.full((len(query_embeddings), k), -1, dtype=np.int64))
+        return self._search_arrays(query_embeddings, k, allowed)
+
+    def get_documents(self, ids: np.ndarray) -> Dict[int, Dict[str, Any]]:
+        """Decode each distinct chunk ID in ``ids`` once (negative IDs are ignored)."""
+        unique = np.unique(np.asarray(ids).ravel())
+        return {int(idx): self.documents[int(idx)] for idx in unique[unique >= 0]}
+
+    @staticmethod
+    def _replace_file(tmp_path: str, path: str) -> None:
+        """Durably move a fully written temporary file into place."""
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _metadata_path(filepath: str) -> str:
+        return f"{filepath}_metadata.npz"
+
+    @staticmethod
+    def _segments_path(filepath: str) -> str:
+        return f"{filepath}_segments.json"
+
+    @classmethod
+    def _read_segments(cls, filepath: str) -> Dict[str, Any]:
+        """Read the segment manifest, if any."""
+        path = cls._segments_path(filepath)
+        if not Path(path).exists():
+            return {"base_count": None, "next_id": 1, "segments": []}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _read_snapshot_count(filepath: str) -> Optional[int]:
+        """Number of documents in the saved snapshot, or None if there is none."""
+        try:
+            with open(f"{filepath}_meta.json", 'r', encoding='utf-8') as f:
+                return json.load(f).get('count')
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def _remove_segments(cls, filepath: str, manifest: Dict[str, Any]) -> None:
+        """Delete the segment manifest and the segment files it lists."""
+        Path(cls._segments_path(filepath)).unlink(missing_ok=True)
+        for segment in manifest["segments"]:
+            if not segment["count"]:
+                continue  # Deletion-only segment
+            prefix = f"{filepath}.{segment['name']}"
+            for path in (f"{prefix}.npy", ChunkStore.data_path(prefix), ChunkStore.offsets_path(prefix)):
+                Path(path).unlink(missing_ok=True)
+
+    @classmethod
+    def remove(cls, filepath: str) -> None:
+        """Delete every file of a store saved at ``filepath``."""
+        cls._remove_segments(filepath, cls._read_segments(filepath))
+        for path in (f"{filepath}.index", f"{filepath}_meta.json", cls._metadata_path(filepath),
+                     VectorFile.path(filepath), ChunkStore.data_path(filepath), ChunkStore.offsets_path(filepath)):
+            Path(path).unlink(missing_ok=True)
+
+    @timed("index_save")
     def save(self, filepath: str) -> None:
-        """Save the vector store to disk."""
+        """Save a full snapshot of the vector store to disk, folding in any segments."""
+        manifest = self._read_segments(filepath)
+        self._write_snapshot(filepath)
+        self._remove_segments(filepath, manifest)
+        self._persisted_count = len(self.documents)
+        self._unflushed_vectors = []
+        self._unflushed_deletes = []
+
+    def export(self, filepath: str) -> None:
+        """Write a full copy of the store to ``filepath`` without changing what ``flush`` tracks."""
+        self._write_snapshot(filepath, remap=False)
+
+    def _write_snapshot(self, filepath: str, remap: bool = True) -> None:
+        """Write the index, chunk records and metadata to ``filepath``."""
         # Save FAISS index
-        faiss.write_index(self.index, f"{filepath}.index")
-        
-        # Save document metadata
-        with open(f"{filepath}_meta.json", 'w', encoding='utf-8') as f:
+        faiss.write_index(self.index, f"{filepath}.index.tmp")
+        self._replace_file(f"{filepath}.index.tmp", f"{filepath}.index")
+
+        # Save chunk records and, for compressed modes, the full-precision vectors
+        self.documents.write(filepath, remap=remap)
+        if self.exact is not None:
+            self.exact.write(filepath, remap=remap)
+        self.metadata.sync(self.documents)
+        self.metadata.save(self._metadata_path(filepath))
+
+        # Save store metadata last; its count marks older segments as folded in
+        with open(f"{filepath}_meta.json.tmp", 'w', encoding='utf-8') as f:
             json.dump({
                 'dimension': self.dimension,
-                'documents': self.documents
-            }, f, ensure_ascii=False, indent=2)
-    
+                'index_type': self.index_type,
+                'index_params': self.index_params,
+                'count': len(self.documents),
+                'deleted': sorted(self.deleted)
+            }, f, indent=2)
+        self._replace_file(f"{filepath}_meta.json.tmp", f"{filepath}_meta.json")
+
+    @timed("index_flush")
+    def flush(self, filepath: str) -> None:
+        """Persist changes since the last save/flush as an append-only segment.
+
+        Falls back to a full ``save`` when there is no snapshot to append to,
+        when the files on disk were written by another store, or when the
+        segment limit is reached (compaction).
+        """
+        if self._batch_depth:
+            return  # The enclosing batch flushes on commit
+
+        new_count = len(self.documents) - self._persisted_count
+        if new_count == 0 and not self._unflushed_deletes and Path(f"{filepath}.index").exists():
+            return
+
+        # Count what is on disk; a manifest written for an older snapshot is stale
+        meta_count = self._read_snapshot_count(filepath)
+        manifest = self._read_segments(filepath)
+        if manifest["base_count"] != meta_count:
+            manifest.update(base_count=meta_count, segments=[])
+        on_disk = (meta_count or 0) + sum(segment["count"] for segment in manifest["segments"])
+
+        if (
+            meta_count is None
+            or self._persisted_count == 0
+            or on_disk != self._persisted_count
+            or len(manifest["segments"]) >= self.max_segments
+        ):
+            self.save(filepath)
+            return
+
+        # Write the segment files first; they only count once the manifest lists them
+        name = f"seg{manifest['next_id']:06d}"
+        prefix = f"{filepath}.{name}"
+        if new_count:
+            with open(f"{prefix}.npy.tmp", 'wb') as f:
+                np.save(f, np.concatenate(self._unflushed_vectors))
+            self._replace_file(f"{prefix}.npy.tmp", f"{prefix}.npy")
+
+            segment_docs = ChunkStore(self.documents[i] for i in range(self._persisted_count, len(self.documents)))
+            segment_docs.write(prefix)
+            segment_docs.close()
+
+        manifest["segments"].append({"name": name, "count": new_count, "deleted": self._unflushed_deletes})
+        manifest["next_id"] += 1
+
+        # Atomically publish the segment
+        tmp_path = self._segments_path(filepath) + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        self._replace_file(tmp_path, self._segments_path(filepath))
+
+        self._persisted_count = len(self.documents)
+        self._unflushed_vectors = []
+        self._unflushed_deletes = []
+
     @classmethod
-    def load(cls, filepath: str) -> 'VectorStore':
-        """Load a vector store from disk."""
+    @timed("index_load")
+    def load(cls, filepath: str, mmap: bool = False) -> 'VectorStore':
+        """Load a vector store from disk, replaying any delta segments.
+
+        With ``mmap`` the index is memory-mapped instead of read into memory,
+        so every process serving the same files shares one copy of them. The
+        store is then read-only; it must be a full ``save`` without segments.
+        """
         # Load FAISS index
-        index = faiss.read_index(f"{filepath}.index")
-        
+        if mmap:
+            if cls._read_segments(filepath)["segments"]:
+                raise ValueError(f"{filepath} has unsaved segments and cannot be memory-mapped")
+            index = faiss.read_index(f"{filepath}.index", faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        else:
+            index = faiss.read_index(f"{filepath}.index")
+
         # Load document metadata
         with open(f"{filepath}_meta.json", 'r', encoding='utf-8') as f:
             data = json.load(f)
-               
-        # Create vector store instance
-        store = cls(dimension=data['dimension'])
+
+        # Create vector store instance (stores saved before index modes are flat)
+        store = cls(
+            dimension=data['dimension'],
+            index_type=data.get('index_type', 'flat'),
+            index_params=data.get('index_params')
+        )
         store.index = index
-        store.documents = data['documents']
-        
+        if store.exact is not None:
+            store.exact = VectorFile.open(filepath)
+
+        # Stores saved before the chunk store format keep documents inline
+        if 'documents' in data:
+            store.documents = ChunkStore(data['documents'])
+        else:
+            store.documents = ChunkStore.open(filepath)
+        store.deleted = set(data.get('deleted', []))
+        store._configure_search()
+
+        # Replay segments appended after this snapshot (stale manifests are ignored)
+        manifest = cls._read_segments(filepath)
+        if manifest["base_count"] == len(store.documents):
+            for segment in manifest["segments"]:
+                if segment["count"]:
+                    prefix = f"{filepath}.{segment['name']}"
+                    store._add_vectors(np.load(f"{prefix}.npy"))
+                    segment_docs = ChunkStore.open(prefix)
+                    store.documents.extend(segment_docs)
+                    segment_docs.close()
+                store.deleted.update(segment.get("deleted", []))
+
+        # Metadata of chunks added by segments (or, for older stores, of every chunk) is indexed now
+        if Path(cls._metadata_path(filepath)).exists():
+            metadata = MetadataIndex.load(cls._metadata_path(filepath))
+            if len(metadata) <= len(store.documents):
+                store.metadata = metadata
+        store.metadata.sync(store.documents)
+
+        store._persisted_count = len(store.documents)
+        store.read_only = mmap
+        return store
+
+    @classmethod
+    def migrate(cls, filepath: str, index_type: str,
+                index_params: Optional[Dict[str, int]] = None) -> 'VectorStore':
+        """Convert a saved store (e.g. a legacy flat index) to another index mode in place."""
+        store = cls.load(filepath)
+        store.rebuild(index_type=index_type, index_params=index_params)
+        store.save(filepath)
         return store
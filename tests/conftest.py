@@ -0,0 +1,6 @@
+"""Shared pytest configuration."""
+
+import os
+
+# Run against the offline stub LLM unless a test run explicitly selects Groq
+os.environ.setdefault("LLM_BACKEND", "stub")
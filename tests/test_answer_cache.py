@@ -0,0 +1,70 @@
+"""Tests for the semantic answer cache."""
+
+import numpy as np
+from src.answer_cache import SemanticAnswerCache, context_fingerprint
+from src.chatbot import YSJChatbot
+from src.llm import StubLLM
+from tests.test_bm25 import HashEmbedder
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+def test_similar_question_with_same_context_hits():
+    """Paraphrases above the threshold reuse the answer only for identical context."""
+    cache = SemanticAnswerCache(threshold=0.9)
+    fingerprint = context_fingerprint([{"id": 1}, {"id": 7}])
+    cache.store(unit([1, 0, 0]), fingerprint, "Fees are due in October.")
+
+    assert cache.lookup(unit([1, 0.1, 0]), context_fingerprint([{"id": 7}, {"id": 1}])) == "Fees are due in October."
+    assert cache.lookup(unit([1, 0.1, 0]), context_fingerprint([{"id": 2}])) is None
+    assert cache.lookup(unit([0, 1, 0]), fingerprint) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+def test_expiry_eviction_and_generation_invalidation():
+    """Entries expire, the cache stays bounded and store changes clear it."""
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=2)
+    for i in range(3):
+        cache.store(unit(np.eye(3)[i]), "ctx", f"answer {i}", generation=1)
+    assert len(cache) == 2
+    assert cache.lookup(unit([0, 0, 1]), "ctx", generation=1) == "answer 2"
+
+    assert cache.lookup(unit([0, 0, 1]), "ctx", generation=2) is None
+    assert len(cache) == 0
+
+    cache.ttl_seconds = 0
+    cache.store(unit([1, 0, 0]), "ctx", "stale")
+    assert cache.lookup(unit([1, 0, 0]), "ctx") is None
+
+def test_chatbot_skips_llm_for_repeated_question(tmp_path):
+    """A repeated question is answered from the cache without calling the LLM."""
+    llm = StubLLM()
+    chatbot = YSJChatbot(data_dir=str(tmp_path), llm=llm)
+    first = chatbot.chat("When is the tuition fee deadline?")
+    second = chatbot.chat("When is the tuition fee deadline?")
+    assert first == second
+    assert llm.calls == 1
+    assert len(chatbot.get_chat_history()) == 4
+
+def test_reader_cache_misses_after_a_new_snapshot(tmp_path, monkeypatch):
+    """A read-only chatbot stops reusing answers once it swaps in a newer index snapshot."""
+    monkeypatch.setenv("INGEST_WORKER", "external")
+    writer = YSJChatbot(data_dir=str(tmp_path / "processed"))
+    writer.rag_pipeline.embedding_model = HashEmbedder()
+    fees = tmp_path / "fees.txt"
+    fees.write_text("Tuition fees are due in October.", encoding="utf-8")
+    writer.rag_pipeline.process_documents([str(fees)])
+
+    llm = StubLLM()
+    reader = YSJChatbot(data_dir=str(tmp_path / "processed"), llm=llm, read_only=True)
+    reader.rag_pipeline.embedding_model = HashEmbedder()
+    reader.chat("When are tuition fees due?")
+    reader.chat("When are tuition fees due?")
+    assert llm.calls == 1
+
+    parking = tmp_path / "parking.txt"
+    parking.write_text("Parking permits are issued by estates.", encoding="utf-8")
+    writer.rag_pipeline.process_documents([str(parking)])
+    assert reader.rag_pipeline.refresh(force=True)
+    reader.chat("When are tuition fees due?")
+    assert llm.calls == 2
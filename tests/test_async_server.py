@@ -0,0 +1,101 @@
+"""Tests for the asyncio serving path."""
+
+import asyncio
+import json
+import threading
+from src.async_server import AsyncChatServer
+from src.chatbot import YSJChatbot
+from src.llm import StubLLM
+
+async def request(app, method, path, payload=None):
+    """Send one HTTP request through the ASGI app and collect the response."""
+    body = json.dumps(payload).encode() if payload is not None else b""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": [(b"content-type", b"application/json")]}
+    await app(scope, receive, send)
+    headers = dict(sent[0]["headers"])
+    content = b"".join(m.get("body", b"") for m in sent[1:])
+    return sent[0]["status"], headers, content
+
+def make_server(tmp_path, latency=0.0, **kwargs):
+    chatbot = YSJChatbot(data_dir=str(tmp_path / "processed"), llm=StubLLM(latency=latency))
+    return AsyncChatServer(chatbot, **kwargs)
+
+def test_async_chat_and_stream(tmp_path):
+    """Both chat routes answer through the awaited LLM."""
+    server = make_server(tmp_path)
+
+    async def scenario():
+        status, headers, content = await request(server, "POST", "/api/chat", {"message": "When is enrolment?"})
+        assert status == 200
+        body = json.loads(content)
+        assert body["response"].startswith("This is an offline answer")
+        assert headers[b"set-cookie"].startswith(f"ysj_session={body['session_id']}".encode())
+
+        status, headers, content = await request(server, "POST", "/api/chat/stream",
+                                                 {"message": "Hi", "session_id": body["session_id"]})
+        assert status == 200 and headers[b"content-type"].startswith(b"text/event-stream")
+        assert b"event: done" in content
+
+        status, _, _ = await request(server, "POST", "/api/chat", {"message": "  "})
+        assert status == 400
+
+        status, _, content = await request(server, "POST", "/api/chat", {"message": "Where is the library?",
+                                                                          "timings": True})
+        timings = json.loads(content)["timings"]
+        assert {"embed", "search", "prompt", "llm", "total"} <= set(timings)
+
+        return body["session_id"]
+
+    session_id = asyncio.run(scenario())
+    assert len(server.chatbot.get_chat_history(session_id)) == 4
+    assert server.chatbot.get_chat_history() == []
+
+def test_requests_beyond_queue_are_shed(tmp_path):
+    """With one slot and one queued request, further concurrent requests get 503 with Retry-After."""
+    server = make_server(tmp_path, latency=0.2, max_concurrency=1, max_queue=1, retry_after=5)
+
+    async def scenario():
+        return await asyncio.gather(*[
+            request(server, "POST", "/api/chat", {"message": f"Question {i}"}) for i in range(4)
+        ])
+
+    responses = asyncio.run(scenario())
+    statuses = sorted(status for status, _, _ in responses)
+    assert statuses == [200, 200, 503, 503]
+    assert all(headers[b"retry-after"] == b"5" for status, headers, _ in responses if status == 503)
+    assert server.admission.rejected == 2
+
+def test_history_is_read_and_written_off_the_event_loop(tmp_path, monkeypatch):
+    """Session database calls (blocking with SESSION_DB) run on the executor, not the loop thread."""
+    monkeypatch.setenv("SESSION_DB", str(tmp_path / "sessions.sqlite"))
+    server = make_server(tmp_path)
+    threads = []
+
+    def recording_thread(method):
+        def wrapper(*args, **kwargs):
+            threads.append(threading.get_ident())
+            return method(*args, **kwargs)
+        return wrapper
+
+    sessions = server.chatbot.sessions
+    monkeypatch.setattr(sessions, "append", recording_thread(sessions.append))
+    monkeypatch.setattr(sessions, "history", recording_thread(sessions.history))
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        status, _, content = await request(server, "POST", "/api/chat", {"message": "When is enrolment?"})
+        assert status == 200 and len(json.loads(content)["history"]) == 2
+        await request(server, "POST", "/api/chat/stream", {"message": "Hi"})
+        return loop_thread
+
+    loop_thread = asyncio.run(scenario())
+    assert len(threads) == 5 and loop_thread not in threads
@@ -0,0 +1,72 @@
+"""Tests for the BM25 index and hybrid retrieval."""
+
+import zlib
+import numpy as np
+from src.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+from src.rag_pipeline import RAGPipeline
+
+TEXTS = [
+    "Module COM4001 Introduction to Programming is taught in room DE/102.",
+    "The library is open from 8am until midnight during term time.",
+    "Extenuating circumstances forms must be submitted within five days.",
+    "COM5012 Databases builds on the programming skills from COM4001.",
+    "Accommodation contracts run from September until June.",
+]
+
+class HashEmbedder:
+    """Deterministic stand-in for EmbeddingModel."""
+
+    def embed_text(self, text):
+        return np.random.default_rng(zlib.crc32(text.encode())).normal(size=384).astype(np.float32)
+
+    def embed_documents(self, documents, show_progress_bar=True):
+        for doc in documents:
+            doc["embedding"] = self.embed_text(doc["text"]).tolist()
+        return documents
+
+def test_bm25_ranks_exact_matches_and_round_trips(tmp_path):
+    """Rare exact tokens rank first; saving merges tails without changing results."""
+    assert tokenize("Where is COM4001?") == ["com4001"]
+
+    index = BM25Index.build({"text": text} for text in TEXTS[:3])
+    path = str(tmp_path / "bm25.npz")
+    index.save(path)
+    index = BM25Index.load(path)
+    for text in TEXTS[3:]:
+        index.add(text)  # Goes to the per-term tails
+
+    results = index.search("COM4001 introduction", k=3)
+    assert [doc_id for doc_id, _ in results] == [0, 3]
+    assert [doc_id for doc_id, _ in index.search("COM4001", k=3, exclude={0})] == [3]
+
+    index.save(path)
+    assert BM25Index.load(path).search("COM4001 introduction", k=3) == results
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    """An ID ranked well by both lists beats one ranked first by only one."""
+    fused = reciprocal_rank_fusion([[1, 2, 3], [2, 4, 1]])
+    assert [doc_id for doc_id, _ in fused][:2] == [2, 1]
+
+def test_pipeline_hybrid_query_finds_module_codes(tmp_path):
+    """Hybrid mode surfaces exact matches and the index persists with the store."""
+    rag = RAGPipeline(data_dir=str(tmp_path / "processed"))
+    rag.embedding_model = HashEmbedder()
+    files = []
+    for i, text in enumerate(TEXTS):
+        files.append(tmp_path / f"doc{i}.txt")
+        files[-1].write_text(text, encoding="utf-8")
+    rag.process_documents([str(path) for path in files])
+
+    results = rag.query("COM5012", top_k=3, mode="hybrid")
+    assert results[0]["id"] == 3
+    assert results[0]["fusion_score"] > 0 and results[0]["bm25_score"] > 0
+    assert all("score" in doc for doc in results)
+
+    assert rag.bm25_path.exists()
+    reloaded = RAGPipeline(data_dir=str(tmp_path / "processed"))
+    reloaded.embedding_model = HashEmbedder()
+    assert len(reloaded.bm25) == len(TEXTS)
+    assert [doc["id"] for doc in reloaded.query("COM5012", mode="lexical")] == [3]
+
+    reloaded.vector_store.delete([3])
+    assert reloaded.query("COM5012", mode="lexical") == []
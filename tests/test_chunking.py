@@ -0,0 +1,100 @@
+"""Tests for the token-budgeted chunker."""
+
+from docx import Document
+from src.chunking import TokenChunker, text_blocks
+from src.document_processor import DocumentProcessor
+
+POLICY = """# Fitness to Study Policy
+
+1. Introduction
+This policy explains how the University supports students whose health affects their studies.
+
+2. Procedure
+""" + "Stage one is an informal meeting with a tutor. Notes are kept on file. " * 40 + """
+
+3. Appeals
+Students may appeal within ten working days."""
+
+def test_chunks_fit_budget_and_follow_structure():
+    """Chunks stay within the token budget, start at headings and map back to the text."""
+    chunker = TokenChunker(max_tokens=80)
+    chunks = chunker.chunk_text(POLICY)
+
+    assert all(chunker.counter.count(chunk["text"]) <= 80 for chunk in chunks)
+    assert chunks[0]["text"].startswith("# Fitness to Study Policy\n\n1. Introduction")
+    assert chunks[0]["section"] == "1. Introduction"
+    assert chunks[-1]["section"] == "3. Appeals" and chunks[-1]["text"].startswith("3. Appeals")
+    for chunk in chunks:
+        # Sentences are never cut, and offsets point at the chunk's text
+        assert chunk["text"].rstrip().endswith((".", "Policy", "Introduction", "Procedure"))
+        assert POLICY[chunk["start"]:chunk["end"]].split()[:3] == chunk["text"].split()[:3]
+
+    # Denser than the legacy 1000/200 character chunks at the same size budget
+    legacy = DocumentProcessor.chunk_text(POLICY)
+    assert sum(len(c["text"]) for c in chunks) < sum(len(c["text"]) for c in legacy)
+
+def test_overlap_repeats_trailing_sentences():
+    """With overlap, the next chunk starts with the previous chunk's last sentence."""
+    text = " ".join(f"Sentence number {i} is here." for i in range(60))
+    chunks = TokenChunker(max_tokens=40, overlap_tokens=8).chunk_text(text)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        last_sentence = previous["text"].rsplit(". ", 1)[-1]
+        assert chunk["text"].startswith(last_sentence)
+        assert chunk["start"] < previous["end"]
+
+def test_docx_headings_and_pdf_style_blocks(tmp_path):
+    """DOCX heading styles become sections; page numbers carry through blocks."""
+    path = tmp_path / "guide.docx"
+    document = Document()
+    document.add_heading("Library Services", level=1)
+    document.add_paragraph("The library is open from 8am until midnight.")
+    document.add_heading("Printing", level=1)
+    document.add_paragraph("Printing costs 5p per page.")
+    document.save(path)
+
+    chunks = DocumentProcessor.process_document(str(path))
+    assert [chunk["section"] for chunk in chunks] == ["Library Services", "Printing"]
+    assert chunks[1]["text"] == "Printing\n\nPrinting costs 5p per page."
+
+    blocks = text_blocks("Page two text.", page=2, offset=100)
+    assert blocks[0]["page"] == 2 and blocks[0]["start"] == 100
+    assert TokenChunker().chunk_blocks(blocks)[0]["page"] == 2
+
+def test_changing_chunk_settings_reingests(tmp_path, monkeypatch):
+    """Files chunked with other settings are re-chunked on the next ingestion."""
+    import src.chunking
+    from src.rag_pipeline import RAGPipeline
+    from tests.test_ingestion import HashEmbedder
+    path = tmp_path / "policy.txt"
+    path.write_text(POLICY, encoding="utf-8")
+
+    rag = RAGPipeline(data_dir=str(tmp_path / "processed"))
+    rag.embedding_model = HashEmbedder()
+    assert rag.plan_updates([str(path)]) == [str(path)]
+    rag.process_documents([str(path)])
+    assert rag.plan_updates([str(path)]) == []
+
+    monkeypatch.setattr(src.chunking, "_default_chunker", TokenChunker(max_tokens=64))
+    assert rag.plan_updates([str(path)]) == [str(path)]
+
+def test_streaming_extraction_memory_is_bounded(tmp_path):
+    """Chunks of a large text file are produced lazily with flat memory use."""
+    import tracemalloc
+    from src.chunking import get_chunker
+    path = tmp_path / "prospectus.txt"
+    paragraph = "Students must register for modules before the deadline. Late registration needs approval. " * 5
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(1500):
+            f.write(f"Section {i}\n\n{paragraph}\n\n")
+    get_chunker()  # Load the tokenizer outside the measurement
+
+    chunks = DocumentProcessor.iter_chunks(str(path))
+    first = next(chunks)
+    assert first["section"] == "Section 0" and first["start"] == 0
+
+    tracemalloc.start()
+    count = 1 + sum(1 for _ in chunks)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert count == 1500
+    assert peak < path.stat().st_size / 4
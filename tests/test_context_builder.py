@@ -0,0 +1,66 @@
+"""Tests for token-budgeted context assembly."""
+
+from src.chunking import TokenChunker
+from src.context_builder import ContextBuilder
+from src.document_processor import DocumentProcessor
+
+TEXT = " ".join(f"Rule {i} says students must book room {100 + i} in advance." for i in range(40))
+
+def hits(chunks, source="handbook.txt", score=0.5):
+    return [{**chunk, "id": i, "source": source, "score": score} for i, chunk in enumerate(chunks)]
+
+def test_overlapping_chunks_are_merged_without_repeats():
+    """Overlapping chunks of one source become one passage that repeats nothing."""
+    chunker = TokenChunker(max_tokens=40, overlap_tokens=12)
+    docs = hits(chunker.chunk_text(TEXT)[:3])
+    builder = ContextBuilder(max_tokens=10000, counter=chunker.counter)
+
+    context, used = builder.build(list(reversed(docs)))
+    assert context == TEXT[docs[0]["start"]:docs[2]["end"]]
+    assert [doc["id"] for doc in used] == [2, 1, 0]
+
+    # The legacy 1000/200 character chunks splice back together too
+    legacy = hits(DocumentProcessor.chunk_text(TEXT)[:2])
+    assert builder.build(legacy)[0] == TEXT[:legacy[1]["end"]]
+
+def test_adjacent_chunks_merge_and_other_sources_stay_apart():
+    chunker = TokenChunker(max_tokens=40)
+    first, second, third = chunker.chunk_text(TEXT)[:3]
+    docs = hits([first, third]) + hits([second], source="other.txt")
+    passages = ContextBuilder(counter=chunker.counter).merge(docs)
+    assert [len(passage["docs"]) for passage in passages] == [1, 1, 1]
+
+    passages = ContextBuilder(counter=chunker.counter).merge(hits([third, first, second]))
+    assert len(passages) == 1 and passages[0]["rank"] == 0
+    assert passages[0]["text"] == "\n\n".join([first["text"], second["text"], third["text"]])
+
+def test_near_duplicates_and_distant_hits_are_dropped():
+    """A near-copy of a better passage and hits beyond the distance cutoff are not sent."""
+    passage = ("Extensions are requested through the student portal before the deadline. Your module leader "
+               "replies within five working days, and evidence is needed for requests longer than a week.")
+    docs = [
+        {"text": passage, "source": "a.txt", "score": 0.4},
+        {"text": passage.replace("portal", "portal page"), "source": "b.txt", "score": 0.6},
+        {"text": "Parking permits are issued by estates.", "source": "c.txt", "score": 1.9},
+        {"text": "Contact the library for loans.", "source": "d.txt", "score": None, "bm25_score": 3.0},
+    ]
+    context, used = ContextBuilder(counter=TokenChunker().counter).build(docs)
+    assert [doc["source"] for doc in used] == ["a.txt", "d.txt"]
+    assert context == passage + "\n\nContact the library for loans."
+
+    # With nothing relevant enough, no context is sent
+    assert ContextBuilder(max_distance=0.1, counter=TokenChunker().counter).build(docs[:3]) == ("", [])
+
+def test_passages_are_packed_into_the_token_budget():
+    counter = TokenChunker().counter
+    long_text, short_text = TEXT, "Library loans last three weeks."
+    docs = [{"text": long_text, "score": 0.2}, {"text": "Another long passage about fees. " * 50, "score": 0.3},
+            {"text": short_text, "score": 0.4}]
+
+    builder = ContextBuilder(max_tokens=counter.count(long_text) + counter.count(short_text), counter=counter)
+    context, used = builder.build(docs)
+    assert context == long_text + "\n\n" + short_text and len(used) == 2
+
+    # The most relevant passage alone is cut at a token boundary
+    context, used = ContextBuilder(max_tokens=20, counter=counter).build(docs)
+    assert counter.count(context) == 20 and long_text.startswith(context) and len(used) == 1
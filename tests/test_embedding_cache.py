@@ -0,0 +1,35 @@
+"""Tests for the persistent embedding cache."""
+
+import numpy as np
+from src.embedding_cache import EmbeddingCache
+
+def test_cache_round_trip_and_counters(tmp_path):
+    """Vectors survive a reopen and hits/misses are counted."""
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache(path, "model-a")
+    vector = np.arange(4, dtype=np.float32)
+    assert cache.get("When is the fee deadline?") is None
+    cache.put_many(["When is the fee deadline?"], [vector])
+    cache.close()
+
+    reopened = EmbeddingCache(path, "model-a")
+    # Whitespace differences share an entry
+    assert np.array_equal(reopened.get("  When is the   fee deadline? "), vector)
+    assert reopened.stats()["disk_hits"] == 1
+    assert reopened.get("When is the fee deadline?") is not None
+    assert reopened.stats()["hits"] == 2
+
+    # Entries are scoped to the model that produced them
+    assert EmbeddingCache(path, "model-b").get("When is the fee deadline?") is None
+
+def test_float16_storage_and_eviction(tmp_path):
+    """float16 blobs decode close to the original and the table stays bounded."""
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), "model", memory_size=2,
+                           max_disk_entries=10, dtype="float16")
+    vectors = np.random.default_rng(0).normal(size=(30, 8)).astype(np.float32)
+    cache.put_many([f"text {i}" for i in range(30)], vectors)
+
+    count = cache._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    assert count <= 10
+    assert np.allclose(cache.get("text 29"), vectors[29], atol=1e-2)
+    assert cache.get("text 0") is None
@@ -0,0 +1,75 @@
+"""Tests for embedding backends and query coalescing."""
+
+import threading
+import numpy as np
+import pytest
+from src.embeddings import EmbeddingModel, MicroBatchingEmbedder, cache_namespace
+from src.metrics import REGISTRY
+from src.onnx_encoder import pool_embeddings
+
+class CountingEncoder:
+    """Deterministic encoder that records the size of each encode call."""
+
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, **kwargs):
+        if self.fail:
+            raise RuntimeError("encoder crashed")
+        self.batches.append(len(texts))
+        return np.array([[len(text), text.count("a"), 1.0] for text in texts], dtype=np.float32)
+
+def coalescing_embedder(encoder, window_ms=50.0, max_batch=32):
+    embedder = MicroBatchingEmbedder(EmbeddingModel(), window_ms=window_ms, max_batch=max_batch)
+    embedder.model = encoder
+    return embedder
+
+def test_concurrent_queries_are_encoded_together():
+    """Queries arriving within the window share one forward pass and get their own vectors."""
+    encoder = CountingEncoder()
+    embedder = coalescing_embedder(encoder, max_batch=6)
+    texts = [f"question {'a' * i}" for i in range(12)]
+    results = {}
+    start = threading.Barrier(len(texts))
+
+    def ask(text):
+        start.wait()
+        results[text] = embedder.embed_text(text)
+
+    threads = [threading.Thread(target=ask, args=(text,)) for text in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for text in texts:
+        assert np.array_equal(results[text], [len(text), text.count("a"), 1.0])
+    assert sum(encoder.batches) == 12 and len(encoder.batches) < 12 and max(encoder.batches) <= 6
+    stats = embedder.stats()
+    assert stats["queue_ms"]["count"] == 12
+    assert stats["batch_size"]["count"] == len(encoder.batches)
+    assert stats["batch_size"]["max"] == max(encoder.batches)
+    exported = REGISTRY.render()
+    assert "ysj_embed_queue_seconds_count" in exported and 'ysj_embed_batch_size_bucket{le="256"}' in exported
+
+def test_encode_errors_reach_every_waiting_caller():
+    """A failed batch raises in the callers rather than leaving them waiting."""
+    embedder = coalescing_embedder(CountingEncoder(fail=True), window_ms=0)
+    with pytest.raises(RuntimeError):
+        embedder.embed_text("When does term start?")
+
+def test_pooling_ignores_padding_and_normalizes():
+    """Mean pooling averages real tokens only; CLS pooling takes the first token."""
+    hidden = np.array([[[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0]])
+    assert np.allclose(pool_embeddings(hidden, mask, normalize=False), [[2.0, 0.0]])
+    assert np.allclose(pool_embeddings(hidden, mask), [[1.0, 0.0]])
+    assert np.allclose(pool_embeddings(hidden, mask, mode="cls", normalize=False), [[1.0, 0.0]])
+
+def test_backend_validation_and_cache_namespace():
+    """Unknown backends are rejected and int8 vectors get their own cache namespace."""
+    with pytest.raises(ValueError):
+        EmbeddingModel("all-MiniLM-L6-v2", backend="tensorrt")
+    assert cache_namespace("all-MiniLM-L6-v2", "onnx") == "all-MiniLM-L6-v2"
+    assert cache_namespace("all-MiniLM-L6-v2", "onnx-int8") != cache_namespace("all-MiniLM-L6-v2", "torch")
@@ -0,0 +1,100 @@
+"""Tests for the pipelined ingestion engine and change detection."""
+
+import zlib
+import numpy as np
+import pytest
+from src.ingestion import IngestionEngine
+from src.rag_pipeline import RAGPipeline
+from src.vector_store import VectorStore
+
+class HashEmbedder:
+    """Deterministic stand-in for EmbeddingModel that counts encode calls."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, documents, show_progress_bar=True):
+        self.calls += 1
+        for doc in documents:
+            rng = np.random.default_rng(zlib.crc32(doc["text"].encode()))
+            doc["embedding"] = rng.normal(size=8).tolist()
+        return documents
+
+@pytest.fixture
+def rag(tmp_path):
+    """A RAG pipeline persisting under tmp_path with a cheap embedder."""
+    pipeline = RAGPipeline(data_dir=str(tmp_path / "processed"))
+    pipeline.embedding_model = HashEmbedder()
+    return pipeline
+
+def write_documents(directory, count, prefix="Document"):
+    """Create text files long enough to produce several chunks each."""
+    directory.mkdir(exist_ok=True)
+    files = []
+    for i in range(count):
+        path = directory / f"doc{i}.txt"
+        path.write_text(f"{prefix} {i}. " * 150, encoding="utf-8")
+        files.append(path)
+    return files
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_engine_ingests_all_files_in_cross_document_batches(tmp_path, rag, workers):
+    """Every file is chunked, embedded in shared batches and flushed once."""
+    files = write_documents(tmp_path / "raw", 6)
+    (tmp_path / "raw" / "bad.xyz").write_text("unsupported", encoding="utf-8")
+
+    engine = IngestionEngine(rag, extract_workers=workers, embed_batch_size=8, queue_size=2)
+    summary = engine.run(files + [tmp_path / "raw" / "bad.xyz"])
+
+    assert summary["processed_files"] == 7  # The unsupported file yields no chunks
+    assert summary["stages"]["extract"]["files"] == 7
+    chunks = summary["stages"]["write"]["chunks"]
+    assert chunks == len(rag.vector_store.documents) > 6
+    assert rag.embedding_model.calls < 6
+    assert len(VectorStore.load(str(rag.vector_store_path)).documents) == chunks
+
+def test_reingestion_skips_unchanged_and_replaces_modified(tmp_path, rag):
+    """Only new or modified files are embedded again; stale chunks are removed."""
+    files = write_documents(tmp_path / "raw", 3)
+    IngestionEngine(rag, extract_workers=0).run(files)
+    live = rag.vector_store.live_count
+
+    summary = IngestionEngine(rag, extract_workers=0).run(files)
+    assert summary["skipped_files"] == 3
+    assert rag.vector_store.live_count == live
+
+    files[0].write_text("Changed content. " * 10, encoding="utf-8")
+    files[2].unlink()
+    summary = IngestionEngine(rag, extract_workers=0).run(files[:2], remove_missing=True)
+    assert summary["processed_files"] == 1
+    assert summary["removed_files"] == 1
+
+    reloaded = RAGPipeline(data_dir=str(tmp_path / "processed"))
+    sources = {doc["source"] for doc in reloaded.vector_store.documents}
+    assert sources == set(reloaded.manifest.documents) and len(sources) == 2
+    texts = [doc["text"] for doc in reloaded.vector_store.documents]
+    assert not any(text.startswith("Document 0") for text in texts)
+    assert any(text.startswith("Changed content") for text in texts)
+
+def test_source_keys_do_not_depend_on_the_working_directory(tmp_path, rag, monkeypatch):
+    """Raw files are keyed inside RAW_DATA_DIR, so ingesting from another directory skips them."""
+    monkeypatch.setenv("RAW_DATA_DIR", str(tmp_path / "raw"))
+    files = write_documents(tmp_path / "raw", 2)
+    IngestionEngine(rag, extract_workers=0).run(files)
+    assert set(rag.manifest.documents) == {"doc0.txt", "doc1.txt"}
+
+    monkeypatch.chdir(tmp_path / "raw")
+    assert IngestionEngine(rag, extract_workers=0).run(["doc0.txt", "doc1.txt"])["skipped_files"] == 2
+    assert rag.manifest.source_key("../notes.txt") == (tmp_path / "notes.txt").resolve().as_posix()
+
+def test_legacy_manifest_keys_are_migrated(tmp_path, monkeypatch):
+    """Version 1 manifests, keyed relative to the working directory, load with the new keys."""
+    from src.manifest import DocumentManifest
+    monkeypatch.setenv("RAW_DATA_DIR", str(tmp_path / "raw"))
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "manifest.json"
+    path.write_text('{"version": 1, "documents": {"raw/fees.pdf": {"hash": "x", "chunk_ids": [0]}}}',
+                    encoding="utf-8")
+    manifest = DocumentManifest(str(path))
+    assert manifest.get(str(tmp_path / "raw" / "fees.pdf"))["chunk_ids"] == [0]
+    assert list(manifest.documents) == ["fees.pdf"]
@@ -0,0 +1,87 @@
+"""Tests for the background ingestion job queue."""
+
+import threading
+import time
+from src.jobs import JobQueue, IngestionWorker, DONE, FAILED, QUEUED
+from src.metrics import SPAN_SECONDS
+from src.rag_pipeline import RAGPipeline
+from tests.test_ingestion import HashEmbedder, write_documents
+
+def make_worker(tmp_path, **kwargs):
+    rag = RAGPipeline(data_dir=str(tmp_path / "processed"))
+    rag.embedding_model = HashEmbedder()
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    return rag, queue, IngestionWorker(rag, queue, **kwargs)
+
+def test_uploads_are_coalesced_into_one_flush(tmp_path):
+    """Jobs claimed together are ingested in one batch and each reports its chunks."""
+    rag, queue, worker = make_worker(tmp_path)
+    files = write_documents(tmp_path / "raw", 3)
+    job_ids = [queue.enqueue(str(path)) for path in files]
+
+    flushes = []
+    flush = rag.vector_store.flush
+    rag.vector_store.flush = lambda path: flushes.append(path) or flush(path)
+    extracted = SPAN_SECONDS.labels(span="extract").summary()["count"]
+
+    assert worker.run_once() == 3
+    assert len(flushes) == 1
+    assert SPAN_SECONDS.labels(span="extract").summary()["count"] == extracted + 3
+    for job_id in job_ids:
+        job = queue.get(job_id)
+        assert job["status"] == DONE and job["attempts"] == 1 and job["chunks"] > 0
+    assert len(rag.manifest.documents) == 3
+    assert worker.run_once() == 0
+
+def test_failed_job_is_isolated_and_retried(tmp_path):
+    """A bad upload fails alone, is retried after a backoff, then gives up."""
+    rag, queue, worker = make_worker(tmp_path, backoff=0.05)
+    good = write_documents(tmp_path / "raw", 1)[0]
+    bad = tmp_path / "raw" / "missing.txt"
+    good_id = queue.enqueue(str(good))
+    bad_id = queue.enqueue(str(bad), max_attempts=2)
+
+    assert worker.run_once() == 2
+    assert queue.get(good_id)["status"] == DONE
+    job = queue.get(bad_id)
+    assert job["status"] == QUEUED and job["attempts"] == 1 and "missing.txt" in job["error"]
+
+    assert worker.run_once() == 0  # Still backing off
+    time.sleep(0.06)
+    assert worker.run_once() == 1
+    assert queue.get(bad_id)["status"] == FAILED
+    assert queue.counts() == {DONE: 1, FAILED: 1}
+
+def test_stale_running_jobs_are_requeued(tmp_path):
+    """Jobs left running by a dead worker go back to the queue."""
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    job_id = queue.enqueue("data/raw/handbook.pdf")
+    assert [job["id"] for job in queue.claim()] == [job_id]
+    assert queue.claim() == []
+
+    assert queue.requeue_stale(timeout=3600) == 0
+    assert queue.requeue_stale(timeout=-1) == 1
+    assert queue.get(job_id)["status"] == QUEUED
+    assert JobQueue(str(tmp_path / "jobs.sqlite")).claim()[0]["attempts"] == 2
+
+def test_searches_wait_while_a_batch_commits(tmp_path):
+    """A query from another thread never sees the store half way through a commit."""
+    rag, queue, worker = make_worker(tmp_path)
+    rag.process_documents([str(path) for path in write_documents(tmp_path / "raw", 1)])
+    queue.enqueue(str(write_documents(tmp_path / "new", 1, prefix="Parking")[0]))
+
+    results, searcher = [], None
+    append = rag.vector_store._append
+
+    def slow_append(documents, embeddings):
+        nonlocal searcher
+        searcher = threading.Thread(target=lambda: results.append(rag.lexical_search("Parking", k=1)))
+        searcher.start()
+        time.sleep(0.1)
+        assert not results  # Still waiting for the commit
+        append(documents, embeddings)
+
+    rag.vector_store._append = slow_append
+    assert worker.run_once() == 1
+    searcher.join(timeout=5)
+    assert results and "Parking" in results[0][0]["text"]
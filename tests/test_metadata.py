@@ -0,0 +1,57 @@
+"""Tests for document metadata and metadata-filtered retrieval."""
+
+import json
+from src.metadata import MetadataIndex, document_metadata
+from src.rag_pipeline import RAGPipeline
+from tests.test_bm25 import HashEmbedder
+
+def test_document_metadata_from_name_folder_and_sidecar(tmp_path):
+    """Type and year come from the file name; folder and sidecar files add and override fields."""
+    folder = tmp_path / "computing"
+    folder.mkdir()
+    (folder / "metadata.json").write_text(json.dumps({"department": "Computing", "doc_type": "guide"}))
+    handbook = folder / "handbook_2024-25.pdf"
+    (folder / "handbook_2024-25.pdf.meta.json").write_text(json.dumps({"doc_type": "handbook", "colour": "red"}))
+
+    assert document_metadata(str(tmp_path / "notes.md")) == {"doc_type": "md"}
+    assert document_metadata(str(folder / "timetable.txt")) == {"doc_type": "guide", "department": "Computing"}
+    assert document_metadata(str(handbook)) == {"doc_type": "handbook", "year": 2024, "department": "Computing"}
+
+def test_metadata_index_selects_and_round_trips(tmp_path):
+    index = MetadataIndex()
+    index.add([{"department": "Law", "year": 2023}, {"department": "law", "year": 2024},
+               {"department": "Computing", "year": 2025}, {"year": 2025}])
+
+    assert index.select({"department": "LAW"}).tolist() == [0, 1]
+    assert index.select({"year": {"gt": 2023, "lte": 2025}, "department": ["law", "computing"]}).tolist() == [1, 2]
+    assert index.select({"department": "music"}).tolist() == []
+    assert index.select({}).tolist() == [0, 1, 2, 3]
+
+    index.save(str(tmp_path / "metadata.npz"))
+    loaded = MetadataIndex.load(str(tmp_path / "metadata.npz"))
+    assert len(loaded) == 4 and loaded.select({"year": 2025}).tolist() == [2, 3]
+    loaded.add([{"year": 2025}])
+    assert loaded.select({"year": 2025}).tolist() == [2, 3, 4]
+
+def test_pipeline_filters_dense_and_lexical_queries(tmp_path):
+    """Ingested chunks carry their document's metadata, and queries can be scoped by it."""
+    rag = RAGPipeline(data_dir=str(tmp_path / "processed"))
+    rag.embedding_model = HashEmbedder()
+    paths = []
+    for year in (2023, 2024, 2025):
+        path = tmp_path / f"handbook_{year}.txt"
+        path.write_text(f"The {year} handbook: module COM4001 coursework is due in week {year % 10}.", encoding="utf-8")
+        paths.append(str(path))
+    rag.process_documents(paths)
+
+    results = rag.query("COM4001 coursework deadline", top_k=3, filters={"year": {"gte": 2024}})
+    assert sorted(doc["year"] for doc in results) == [2024, 2025]
+    assert all(doc["doc_type"] == "txt" and doc["source"].endswith(f"{doc['year']}.txt") for doc in results)
+    lexical = rag.query("COM4001", top_k=3, mode="lexical", filters={"year": 2023})
+    assert [doc["year"] for doc in lexical] == [2023]
+
+    # Changing a document's metadata re-ingests it
+    (tmp_path / "handbook_2025.txt.meta.json").write_text(json.dumps({"department": "Computing"}))
+    rag.process_documents(paths)
+    assert [doc["year"] for doc in rag.query("handbook", filters={"department": "computing"})] == [2025]
+    assert rag.manifest.get(paths[2])["metadata"] == {"doc_type": "txt", "year": 2025, "department": "Computing"}
@@ -0,0 +1,53 @@
+"""Tests for metrics and request tracing."""
+
+import time
+from src.metrics import Histogram, Registry, span, timed_iter, trace
+
+def test_histogram_quantiles_and_prometheus_rendering():
+    """Quantiles are estimated from buckets and rendered as cumulative Prometheus buckets."""
+    histogram = Histogram(buckets=(1, 10, 100))
+    for value in [0.5] * 50 + [5] * 45 + [50] * 5:
+        histogram.observe(value)
+    assert histogram.quantile(0.5) <= 1
+    assert 1 < histogram.quantile(0.95) <= 10
+    assert histogram.summary()["count"] == 100
+
+    registry = Registry()
+    family = registry.histogram("test_seconds", "Test latency.", ["span"], buckets=(1, 10, 100))
+    family.labels(span="embed").observe(5)
+    registry.counter("test_total", "Test count.", ["endpoint"]).inc(endpoint="chat")
+    assert registry.counter("test_total", "Test count.", ["endpoint"]).value(endpoint="chat") == 1
+    text = registry.render()
+    assert 'test_seconds_bucket{span="embed",le="1"} 0' in text
+    assert 'test_seconds_bucket{span="embed",le="+Inf"} 1' in text
+    assert 'test_seconds_count{span="embed"} 1' in text
+    assert 'test_total{endpoint="chat"} 1' in text
+
+def test_trace_breakdown_and_sampling(monkeypatch):
+    """A breakdown trace times every span; unsampled traces time none."""
+    with trace("test", breakdown=True) as request_trace:
+        with span("embed"):
+            pass
+        with span("embed"):
+            pass
+        with span("llm"):
+            pass
+    assert set(request_trace.breakdown()) == {"embed", "llm", "total"}
+
+    monkeypatch.setenv("METRICS_SAMPLE_RATE", "0")
+    with trace("test") as unsampled:
+        with span("embed"):
+            pass
+    assert not unsampled.sampled and unsampled.timings == {}
+
+def test_timed_iter_times_only_producing_items():
+    """Time the consumer spends between items is not counted."""
+    def produce():
+        for i in range(3):
+            time.sleep(0.01)
+            yield i
+
+    with trace("test", breakdown=True) as request_trace:
+        for _ in timed_iter("extract", produce()):
+            time.sleep(0.05)
+    assert 30 <= request_trace.timings["extract"] < 100
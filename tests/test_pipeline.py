@@ -30,6 +30,18 @@ def test_chatbot_initialization():
     chatbot = YSJChatbot()
     assert chatbot is not None
 
+def test_chatbot_construction_is_lazy(tmp_path):
+    """Models, index, LLM client and session database load on first use."""
+    chatbot = YSJChatbot(data_dir=str(tmp_path / "processed"))
+    rag = chatbot.rag_pipeline
+    assert rag._embedding_model is None and rag._vector_store is None and rag._bm25 is None
+    assert chatbot._llm is None and chatbot._sessions is None
+
+    chatbot.warm_up()
+    assert rag._vector_store is not None and rag._embedding_model is None  # No cache connection yet
+    assert chatbot.chat("Hello", session_id="lazy")
+    assert chatbot._llm is not None and rag._embedding_model is not None
+
 def test_add_documents(create_test_pdf):
     """Test adding documents to the chatbot."""
     chatbot = YSJChatbot()
@@ -60,3 +72,35 @@ def test_clear_chat_history():
     chatbot.chat("Test message")
     chatbot.clear_chat_history()
     assert len(chatbot.get_chat_history()) == 0
+
+def test_stream_chat_events():
+    """Test that streaming sends sources first, then tokens, then the full response."""
+    chatbot = YSJChatbot()
+    events = list(chatbot.stream_chat("What student services are available?"))
+    
+    assert events[0]["type"] == "sources"
+    assert events[-1]["type"] == "done"
+    tokens = "".join(e["content"] for e in events if e["type"] == "token")
+    assert tokens == events[-1]["response"]
+    assert chatbot.get_chat_history()[-1]["content"] == tokens
+
+def test_query_batch_matches_query(tmp_path):
+    """Batched retrieval returns the same chunks as one query at a time."""
+    from src.rag_pipeline import RAGPipeline
+    rag = RAGPipeline(data_dir=str(tmp_path / "processed"))
+    paths = []
+    for i, topic in enumerate(["library opening hours", "accommodation contracts", "exam timetables"]):
+        path = tmp_path / f"doc{i}.txt"
+        path.write_text(f"Information about {topic}. " * 40, encoding="utf-8")
+        paths.append(str(path))
+    rag.process_documents(paths)
+    
+    questions = ["When is the library open?", "How long are accommodation contracts?", "Exam dates?"]
+    scores, ids, documents = rag.query_batch(questions, top_k=2, batch_size=2)
+    assert ids.shape == scores.shape == (3, 2)
+    for row, question in enumerate(questions):
+        expected = rag.query(question, top_k=2, mode="dense")
+        hits = [idx for idx in ids[row].tolist() if idx >= 0]
+        assert hits == [doc["id"] for doc in expected]
+        assert [documents[idx]["text"] for idx in hits] == [doc["text"] for doc in expected]
+        assert scores[row, :len(hits)].tolist() == pytest.approx([doc["score"] for doc in expected], abs=1e-5)
@@ -0,0 +1,22 @@
+"""Tests for the end-to-end benchmark's baseline comparison."""
+
+from benchmarks.rag_benchmark import check_baseline, compare
+
+BASELINE = {"ingest_chunks_per_s": 1000.0, "retrieval_ms_p95": 10.0, "chat_ms_p99": 50.0, "store_mb": 0.0}
+
+def test_metrics_within_tolerance_pass(capsys):
+    """Small slowdowns, improvements, zero baselines and missing metrics are not regressions."""
+    metrics = {"ingest_chunks_per_s": 850.0, "retrieval_ms_p95": 11.9, "chat_ms_p99": 20.0, "store_mb": 3.0}
+    assert compare(metrics, BASELINE, tolerance=0.2) == []
+    assert check_baseline(metrics, BASELINE, tolerance=0.2) == 0
+    assert "REGRESSION" not in capsys.readouterr().err
+
+def test_metrics_past_tolerance_fail(capsys):
+    """Lower-is-better metrics regress when they rise, higher-is-better ones when they fall."""
+    metrics = {"ingest_chunks_per_s": 700.0, "retrieval_ms_p95": 12.5, "chat_ms_p99": 50.0}
+    regressions = compare(metrics, BASELINE, tolerance=0.2)
+    assert [line.split(":")[0] for line in regressions] == ["ingest_chunks_per_s", "retrieval_ms_p95"]
+    assert "+25% worse" in regressions[1]
+    assert check_baseline(metrics, BASELINE, tolerance=0.2) == 1
+    assert capsys.readouterr().err.count("REGRESSION") == 2
+    assert check_baseline(metrics, BASELINE, tolerance=0.5) == 0
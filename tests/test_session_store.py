@@ -0,0 +1,46 @@
+"""Tests for per-session conversation state."""
+
+import time
+from src.chatbot import YSJChatbot
+from src.session_store import SessionStore, resolve_session_id
+
+def test_history_is_capped_windowed_and_evicted():
+    """Histories keep max_messages, return a window, and idle or excess sessions go."""
+    store = SessionStore(max_sessions=2, max_messages=5, idle_seconds=60, window=3)
+    for i in range(8):
+        store.append("a", "user", f"message {i}")
+
+    assert [m["content"] for m in store.history("a")] == ["message 5", "message 6", "message 7"]
+    assert len(store.history("a", limit=100)) == 5
+
+    store.append("b", "user", "hello")
+    store.append("c", "user", "hello")
+    assert len(store) == 2 and store.history("a", limit=100) == []  # "a" was least recently used
+
+    store._sessions["b"]["last_seen"] = time.time() - 120
+    assert store.history("b") == []  # Idle sessions are dropped
+    assert resolve_session_id("../etc", None, "abc-123") == "abc-123"
+
+def test_sqlite_backend_survives_restart(tmp_path):
+    """With a path, histories are shared across store instances."""
+    path = tmp_path / "sessions.sqlite"
+    store = SessionStore(path=str(path))
+    store.append("s1", "user", "Where is the library?")
+    store.close()
+
+    reopened = SessionStore(path=str(path))
+    assert reopened.history("s1") == [{"role": "user", "content": "Where is the library?"}]
+    reopened.clear("s1")
+    assert SessionStore(path=str(path)).history("s1") == []
+
+def test_chatbot_sessions_are_isolated(tmp_path):
+    """Each session sees only its own turns; clearing one leaves the others."""
+    chatbot = YSJChatbot(data_dir=str(tmp_path / "processed"))
+    chatbot.chat("Hello from Alice", session_id="alice")
+    chatbot.chat("Hello from Bob", session_id="bob")
+
+    assert chatbot.get_chat_history("alice")[0]["content"] == "Hello from Alice"
+    assert len(chatbot.get_chat_history("bob")) == 2
+    chatbot.clear_chat_history("alice")
+    assert chatbot.get_chat_history("alice") == []
+    assert len(chatbot.get_chat_history("bob")) == 2
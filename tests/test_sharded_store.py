@@ -0,0 +1,113 @@
+"""Tests for the sharded vector store."""
+
+import numpy as np
+import pytest
+from src.rag_pipeline import RAGPipeline
+from src.sharded_store import ShardedVectorStore, is_sharded, load_store
+from src.vector_store import VectorStore
+from tests.test_bm25 import HashEmbedder
+from tests.test_vector_store import DIMENSION, SMALL_PARAMS
+
+def make_documents(n, seed=0):
+    """Documents from ten sources and two departments, with random embeddings."""
+    vectors = np.random.default_rng(seed).normal(size=(n, DIMENSION)).astype(np.float32)
+    return [{"text": f"chunk {i}", "source": f"doc{i % 10}.txt", "department": ("arts", "computing")[i % 2],
+             "embedding": vectors[i].tolist()} for i in range(n)]
+
+@pytest.mark.parametrize("shard_by", ["source", "hash"])
+def test_fan_out_search_matches_a_single_store(shard_by):
+    """Merged per-shard results equal one flat store's, filtered or not."""
+    documents = make_documents(300)
+    single = VectorStore(dimension=DIMENSION)
+    sharded = ShardedVectorStore(num_shards=3, shard_by=shard_by, dimension=DIMENSION)
+    assert single.add_documents(documents) == sharded.add_documents(documents)
+    assert all(len(ids) for ids in sharded.shard_ids)
+    single.delete([3, 40])
+    sharded.delete([3, 40])
+
+    queries = np.random.default_rng(1).normal(size=(10, DIMENSION)).astype(np.float32)
+    for filters in (None, {"department": "Computing"}, {"source": "doc4.txt"}):
+        expected_scores, expected_ids = single.search_batch(queries, k=5, filters=filters)
+        scores, ids = sharded.search_batch(queries, k=5, filters=filters)
+        assert np.array_equal(ids, expected_ids)
+        assert np.allclose(scores, expected_scores, atol=1e-4)
+
+    hits = sharded.search(queries[0], k=3, filters={"department": "arts"})
+    expected = single.search(queries[0], k=3, filters={"department": "arts"})
+    assert [doc["id"] for doc in hits] == [doc["id"] for doc in expected]
+    assert all(doc["department"] == "arts" and doc["text"] == f"chunk {doc['id']}" for doc in hits)
+
+def test_flush_writes_only_changed_shards(tmp_path):
+    """A source's chunks land in one shard, and flushing touches only that shard."""
+    path = str(tmp_path / "store")
+    store = ShardedVectorStore(num_shards=4, dimension=DIMENSION, index_type="ivf", index_params=SMALL_PARAMS)
+    store.add_documents(make_documents(200))
+    store.save(path)
+    assert is_sharded(path)
+
+    before = {file.name: file.stat().st_mtime_ns for file in tmp_path.glob("store.shard*")}
+
+    new = [{**doc, "source": "new.txt", "text": f"new {i}"} for i, doc in enumerate(make_documents(5, seed=2))]
+    with store.batch(path):
+        ids = store.add_documents(new)
+    shard = store.shard_for(new[0])
+    changed = {file.name[:len("store.shard00")] for file in tmp_path.glob("store.shard*")
+               if before.get(file.name) != file.stat().st_mtime_ns}
+    assert changed == {f"store.shard{shard:02d}"}
+
+    loaded = load_store(path)
+    assert isinstance(loaded, ShardedVectorStore) and loaded.index_type == "ivf"
+    query = np.array(new[2]["embedding"], dtype=np.float32)
+    assert loaded.search(query, k=1)[0]["id"] == ids[2] == 202
+
+    # One shard can be rebuilt on its own and swapped back in
+    store.rebuild(shards=[shard])
+    store.shards[shard].save(ShardedVectorStore.shard_prefix(path, shard))
+    loaded.load_shard(path, shard)
+    assert loaded.search(query, k=1)[0]["id"] == 202
+    with pytest.raises(ValueError):
+        store.rebuild(index_type="flat", shards=[shard])
+
+def test_vacuum_and_round_trip_keep_global_ids(tmp_path):
+    documents = make_documents(60)
+    single = VectorStore(dimension=DIMENSION)
+    single.add_documents(documents)
+    single.delete(range(0, 60, 3))
+    sharded = ShardedVectorStore.from_store(single, num_shards=3)
+    assert sharded.deleted == single.deleted and len(sharded.documents) == 60
+    assert np.allclose(sharded.get_vectors(), single.get_vectors())
+
+    assert np.array_equal(sharded.vacuum(), single.vacuum())
+    assert [doc["text"] for doc in sharded.documents] == [single.documents[i]["text"] for i in range(40)]
+
+    sharded.save(str(tmp_path / "store"))
+    loaded = ShardedVectorStore.load(str(tmp_path / "store"), mmap=True)
+    assert loaded.read_only and loaded.live_count == 40
+    queries = np.random.default_rng(3).normal(size=(4, DIMENSION)).astype(np.float32)
+    assert np.array_equal(loaded.search_batch(queries, k=4)[1], single.search_batch(queries, k=4)[1])
+
+def test_pipeline_splits_an_existing_store_into_shards(tmp_path, monkeypatch):
+    """Setting VECTOR_SHARDS converts the saved store in place, keeping chunk IDs and the manifest."""
+    paths = []
+    for name in ("fees", "library", "parking"):
+        path = tmp_path / f"{name}.txt"
+        path.write_text(f"The {name} office answers questions about {name}.", encoding="utf-8")
+        paths.append(str(path))
+    rag = RAGPipeline(data_dir=str(tmp_path / "processed"))
+    rag.embedding_model = HashEmbedder()
+    rag.process_documents(paths)
+    expected = [doc["source"] for doc in rag.query("library office", top_k=3)]
+
+    monkeypatch.setenv("VECTOR_SHARDS", "2")
+    rag = RAGPipeline(data_dir=str(tmp_path / "processed"), publish_snapshots=True)
+    rag.embedding_model = HashEmbedder()
+    assert isinstance(rag.vector_store, ShardedVectorStore)
+    assert not rag.vector_store_path.with_suffix(".index").exists()
+    assert [doc["source"] for doc in rag.query("library office", top_k=3)] == expected
+
+    (tmp_path / "library.txt").write_text("The library lends laptops for a week.", encoding="utf-8")
+    rag.process_documents(paths)
+    assert rag.query("library laptops", top_k=1, mode="lexical")[0]["source"].endswith("library.txt")
+    reader = RAGPipeline(data_dir=str(tmp_path / "processed"), read_only=True)
+    reader.embedding_model = HashEmbedder()
+    assert isinstance(reader.vector_store, ShardedVectorStore) and reader.vector_store.live_count == 3
@@ -0,0 +1,89 @@
+"""Tests for shared, versioned index snapshots."""
+
+import threading
+from pathlib import Path
+import pytest
+from src.rag_pipeline import RAGPipeline
+from tests.test_ingestion import HashEmbedder, write_documents
+
+def make_writer(data_dir):
+    rag = RAGPipeline(data_dir=str(data_dir), publish_snapshots=True)
+    rag.embedding_model = HashEmbedder()
+    return rag
+
+def test_readers_map_the_snapshot_and_swap_in_new_generations(tmp_path):
+    """A read-only pipeline serves the published snapshot and picks up later ones."""
+    data_dir = tmp_path / "processed"
+    writer = make_writer(data_dir)
+    writer.process_documents([str(p) for p in write_documents(tmp_path / "raw", 2)])
+
+    reader = RAGPipeline(data_dir=str(data_dir), read_only=True)
+    assert reader.vector_store.read_only
+    assert reader.snapshot_generation == writer.snapshot_generation
+    assert len(reader.vector_store.documents) == len(writer.vector_store.documents)
+    query = writer.vector_store.get_vectors()[0]
+    assert ([doc["id"] for doc in reader.vector_store.search(query, k=3)]
+            == [doc["id"] for doc in writer.vector_store.search(query, k=3)])
+    with pytest.raises(RuntimeError):
+        with reader.batch():
+            pass
+
+    new_file = tmp_path / "raw" / "parking.txt"
+    new_file.write_text("Parking permits COM9999. " * 100, encoding="utf-8")
+    writer.process_documents([str(new_file)])
+    assert not reader.refresh()  # Checked at most once per refresh interval
+    assert reader.refresh(force=True)
+    assert reader.snapshot_generation == writer.snapshot_generation
+    assert reader.lexical_search("COM9999", k=1)[0]["source"].endswith("parking.txt")
+    assert not reader.refresh(force=True)
+
+def test_refresh_waits_for_searches_in_flight(tmp_path):
+    """A query never sees the store of one generation with the BM25 index of another."""
+    data_dir = tmp_path / "processed"
+    writer = make_writer(data_dir)
+    writer.process_documents([str(p) for p in write_documents(tmp_path / "raw", 2)])
+    reader = RAGPipeline(data_dir=str(data_dir), read_only=True)
+    store, bm25 = reader.vector_store, reader.bm25
+    writer.process_documents([str(p) for p in write_documents(tmp_path / "more", 1, prefix="Extra")])
+
+    with reader._search_lock.reading():
+        refresh = threading.Thread(target=reader.refresh, kwargs={"force": True})
+        refresh.start()
+        refresh.join(timeout=0.5)
+        assert refresh.is_alive()
+        assert reader.vector_store is store and reader.bm25 is bm25
+    refresh.join()
+    assert reader.snapshot_generation == writer.snapshot_generation
+    assert len(reader.bm25) == len(reader.vector_store.documents) > len(store.documents)
+
+def test_publishing_keeps_incremental_flushes_and_prunes_old_generations(tmp_path):
+    """Exporting snapshots leaves the working store's segments alone; old generations go."""
+    data_dir = tmp_path / "processed"
+    writer = make_writer(data_dir)
+    writer.snapshots.keep = 2
+    files = write_documents(tmp_path / "raw", 4)
+    for path in files:
+        writer.process_documents([str(path)])
+
+    assert Path(f"{writer.vector_store_path}_segments.json").exists()
+    generations = sorted(p.name for p in (data_dir / "snapshots").iterdir() if p.is_dir())
+    assert len(generations) == 2 and int(generations[-1]) == writer.snapshots.current()
+
+    writer.process_documents([str(path) for path in files])  # Unchanged files publish nothing
+    assert writer.snapshots.current() == int(generations[-1])
+    reopened = make_writer(data_dir)
+    assert len(reopened.vector_store.documents) == len(writer.vector_store.documents)
+    assert reopened.snapshot_generation == writer.snapshot_generation  # Not republished
+
+def test_thread_mode_writers_publish_nothing(tmp_path, monkeypatch):
+    """Without INGEST_WORKER=external no reader consumes snapshots, so none are written."""
+    monkeypatch.setenv("INGEST_WORKER", "thread")
+    rag = RAGPipeline(data_dir=str(tmp_path / "processed"))
+    rag.embedding_model = HashEmbedder()
+    rag.process_documents([str(p) for p in write_documents(tmp_path / "raw", 2)])
+    assert rag.snapshots.current() is None and rag.snapshot_generation is None
+
+    monkeypatch.setenv("INGEST_WORKER", "external")
+    reopened = RAGPipeline(data_dir=str(tmp_path / "processed"))
+    assert len(reopened.vector_store.documents) == len(rag.vector_store.documents)
+    assert reopened.snapshots.current() == reopened.snapshot_generation is not None  # Published on load
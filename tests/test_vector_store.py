@@ -0,0 +1,245 @@
+"""Tests for the FAISS vector store."""
+
+import json
+import faiss
+import numpy as np
+import pytest
+from src.chunk_store import ChunkStore, convert_json_metadata
+from src.vector_store import VectorStore
+
+DIMENSION = 16
+SMALL_PARAMS = {"nlist": 4, "nprobe": 4, "pq_m": 4, "pq_nbits": 4, "hnsw_m": 8}
+
+def make_documents(n, seed=0):
+    """Create documents with random embeddings."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, DIMENSION)).astype(np.float32)
+    return [{"text": f"chunk {i}", "embedding": vectors[i].tolist()} for i in range(n)]
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw", "ivfpq", "fp16", "sq8"])
+def test_index_modes_round_trip(tmp_path, index_type):
+    """Each index mode finds an exact match and is kept through save/load."""
+    documents = make_documents(300)
+    store = VectorStore(dimension=DIMENSION, index_type=index_type, index_params=SMALL_PARAMS)
+    store.add_documents(documents)
+
+    query = np.array(documents[42]["embedding"], dtype=np.float32)
+    assert store.search(query, k=1)[0]["text"] == "chunk 42"
+
+    store.save(str(tmp_path / "store"))
+    loaded = VectorStore.load(str(tmp_path / "store"))
+    assert loaded.index_type == index_type
+    assert loaded.index_params["nprobe"] == 4
+    assert loaded.search(query, k=1)[0]["text"] == "chunk 42"
+
+def test_trainable_index_stages_until_threshold():
+    """IVF stores search a flat staging index until enough vectors are added."""
+    store = VectorStore(dimension=DIMENSION, index_type="ivf", index_params=SMALL_PARAMS)
+    store.add_documents(make_documents(10))
+    assert store._needs_training()
+
+    store.add_documents(make_documents(200, seed=1))
+    assert not store._needs_training()
+    assert store.index.ntotal == 210
+
+@pytest.mark.parametrize("index_type", ["fp16", "sq8"])
+def test_compressed_modes_rerank_at_full_precision(tmp_path, index_type):
+    """Compressed indexes return flat's results and exact scores, from mapped float32 vectors."""
+    documents = make_documents(400)
+    flat = VectorStore(dimension=DIMENSION)
+    flat.add_documents(documents)
+    store = VectorStore(dimension=DIMENSION, index_type=index_type)
+    store.add_documents(documents[:100])
+    store.add_documents(documents[100:])
+    store.delete([7])
+
+    queries = np.random.default_rng(5).normal(size=(20, DIMENSION)).astype(np.float32)
+    flat.delete([7])
+    expected_scores, expected_ids = flat.search_batch(queries, k=5)
+    scores, ids = store.search_batch(queries, k=5)
+    assert np.array_equal(ids, expected_ids)
+    assert np.allclose(scores, expected_scores, rtol=1e-4)
+
+    path = str(tmp_path / "store")
+    store.save(path)
+    assert isinstance(store.exact._base, np.memmap)
+    assert len(faiss.serialize_index(store.index)) < len(faiss.serialize_index(flat.index)) * 0.6
+
+    mapped = VectorStore.load(path, mmap=True)
+    assert np.array_equal(mapped.search_batch(queries, k=5)[1], expected_ids)
+    migrated = VectorStore.migrate(path, "flat")
+    assert migrated.exact is None
+    assert np.array_equal(migrated.search_batch(queries, k=5)[1], expected_ids)
+
+def test_migrate_flat_store(tmp_path):
+    """A saved flat store can be converted to another index mode."""
+    path = str(tmp_path / "store")
+    store = VectorStore(dimension=DIMENSION)
+    store.add_documents(make_documents(100))
+    store.save(path)
+
+    migrated = VectorStore.migrate(path, "hnsw")
+    assert migrated.index_type == "hnsw"
+    assert VectorStore.load(path).index_type == "hnsw"
+    assert VectorStore.load(path).index.ntotal == 100
+
+def test_saved_store_drops_embeddings_and_maps_chunks(tmp_path):
+    """Chunks are persisted without embeddings and decoded on access."""
+    path = str(tmp_path / "store")
+    store = VectorStore(dimension=DIMENSION)
+    store.add_documents(make_documents(20))
+    store.save(path)
+
+    loaded = VectorStore.load(path)
+    assert len(loaded.documents) == 20
+    assert loaded.documents[5] == {"text": "chunk 5"}
+
+    # Chunks added after loading are kept until the next save
+    loaded.add_documents(make_documents(3, seed=1))
+    loaded.save(path)
+    assert [doc["text"] for doc in VectorStore.load(path).documents][-3:] == ["chunk 0", "chunk 1", "chunk 2"]
+
+def test_convert_legacy_json_metadata(tmp_path):
+    """Stores with inline JSON documents load and convert to the chunk store."""
+    path = str(tmp_path / "store")
+    documents = make_documents(5)
+    index = faiss.IndexFlatL2(DIMENSION)
+    index.add(np.array([doc["embedding"] for doc in documents], dtype=np.float32))
+    faiss.write_index(index, f"{path}.index")
+    with open(f"{path}_meta.json", "w", encoding="utf-8") as f:
+        json.dump({"dimension": DIMENSION, "documents": documents}, f, indent=2)
+
+    assert VectorStore.load(path).documents[0]["text"] == "chunk 0"
+    assert convert_json_metadata(path) == 5
+    assert ChunkStore.exists(path)
+
+    loaded = VectorStore.load(path)
+    query = np.array(documents[3]["embedding"], dtype=np.float32)
+    assert loaded.search(query, k=1)[0]["text"] == "chunk 3"
+    assert "embedding" not in loaded.documents[3]
+
+def test_flush_appends_segments_and_compacts(tmp_path):
+    """Flushes write delta segments that are replayed on load and compacted."""
+    path = str(tmp_path / "store")
+    store = VectorStore(dimension=DIMENSION, max_segments=2)
+    store.add_documents(make_documents(10))
+    store.flush(path)  # No snapshot yet, so this is a full save
+
+    for seed in (1, 2):
+        store.add_documents(make_documents(5, seed=seed))
+        store.flush(path)
+    assert len(json.load(open(f"{path}_segments.json"))["segments"]) == 2
+    assert json.load(open(f"{path}_meta.json"))["count"] == 10
+
+    loaded = VectorStore.load(path)
+    assert len(loaded.documents) == loaded.index.ntotal == 20
+    query = np.array(make_documents(5, seed=2)[4]["embedding"], dtype=np.float32)
+    assert loaded.search(query, k=1)[0]["text"] == "chunk 4"
+
+    # The third flush hits the segment limit and compacts into a new snapshot
+    store.add_documents(make_documents(5, seed=3))
+    store.flush(path)
+    assert not (tmp_path / "store_segments.json").exists()
+    assert len(VectorStore.load(path).documents) == 25
+
+def test_batch_commits_once_and_rolls_back_on_error(tmp_path):
+    """Batched additions are persisted together, or not at all if the batch fails."""
+    path = str(tmp_path / "store")
+    store = VectorStore(dimension=DIMENSION)
+    store.add_documents(make_documents(4))
+    store.save(path)
+
+    with pytest.raises(RuntimeError):
+        with store.batch(path):
+            store.add_documents(make_documents(3, seed=1))
+            raise RuntimeError("crash mid-ingest")
+    assert len(store.documents) == 4
+    assert len(VectorStore.load(path).documents) == 4
+
+    with store.batch(path):
+        store.add_documents(make_documents(3, seed=1))
+        store.add_documents(make_documents(3, seed=2))
+        assert len(store.documents) == 4
+    assert len(VectorStore.load(path).documents) == 10
+    assert len(json.load(open(f"{path}_segments.json"))["segments"]) == 1
+
+def test_deleted_chunks_are_excluded_and_vacuumed(tmp_path):
+    """Tombstoned chunks never come back from search, across flush/load and vacuum."""
+    path = str(tmp_path / "store")
+    documents = make_documents(10)
+    store = VectorStore(dimension=DIMENSION)
+    ids = store.add_documents(documents)
+    assert ids == list(range(10))
+    store.save(path)
+
+    store.delete([3, 4])
+    store.flush(path)
+    loaded = VectorStore.load(path)
+    assert loaded.deleted == {3, 4}
+    query = np.array(documents[3]["embedding"], dtype=np.float32)
+    results = loaded.search(query, k=10)
+    assert len(results) == 8
+    assert all(result["id"] not in (3, 4) for result in results)
+
+    mapping = loaded.vacuum()
+    assert mapping[3] == -1 and mapping[5] == 3
+    assert loaded.live_count == len(loaded.documents) == 8
+    assert loaded.documents[3]["text"] == "chunk 5"
+
+def test_search_batch_matches_single_queries():
+    """One matrix search returns the same hits as per-query searches, minus deleted chunks."""
+    rng = np.random.default_rng(3)
+    store = VectorStore(dimension=16)
+    store.add_documents([{"text": f"doc {i}", "embedding": rng.normal(size=16).tolist()} for i in range(50)])
+    store.delete([0, 1, 2])
+    queries = rng.normal(size=(7, 16)).astype(np.float32)
+
+    scores, ids = store.search_batch(queries, k=4)
+    documents = store.get_documents(ids)
+    assert ids.shape == (7, 4) and not set(ids.ravel()) & {0, 1, 2}
+    for query, row_ids, row_scores in zip(queries, ids, scores):
+        single = store.search(query, k=4)
+        assert [doc["id"] for doc in single] == row_ids.tolist()
+        assert np.allclose([doc["score"] for doc in single], row_scores)
+        assert all(documents[idx]["text"] == f"doc {idx}" for idx in row_ids)
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw", "sq8"])
+def test_filtered_search_returns_full_k_inside_the_index(tmp_path, index_type):
+    """Metadata filters are applied inside the search and survive flush, load and vacuum."""
+    documents = make_documents(600)
+    for i, doc in enumerate(documents):
+        doc["department"] = "Computing" if i % 10 == 0 else "Law"
+        doc["year"] = 2023 + i % 3
+    store = VectorStore(dimension=DIMENSION, index_type=index_type,
+                        index_params={**SMALL_PARAMS, "nprobe": 1, "filter_exact": 8})
+    store.add_documents(documents)
+    query = np.array(documents[7]["embedding"], dtype=np.float32)
+
+    # 60 Computing chunks, mostly outside the one probed IVF cell: still k hits, all matching
+    results = store.search(query, k=10, filters={"department": "computing"})
+    assert len(results) == 10 and all(doc["department"] == "Computing" for doc in results)
+    if index_type == "flat":
+        exact = np.sort(np.sum((np.array([d["embedding"] for d in documents[::10]]) - query) ** 2, axis=1))[:10]
+        assert np.allclose([doc["score"] for doc in results], exact, rtol=1e-4)
+
+    results = store.search(query, k=5, filters={"department": ["Law"], "year": {"gte": 2025}})
+    assert len(results) == 5 and all(doc["department"] == "Law" and doc["year"] == 2025 for doc in results)
+    assert store.search(query, k=5, filters={"department": "Music"}) == []
+    with pytest.raises(ValueError):
+        store.search(query, k=5, filters={"colour": "blue"})
+
+    # Deleted chunks stay excluded; a few matches are searched exactly
+    store.delete([0, 10])
+    scores, ids = store.search_batch(query.reshape(1, -1), k=5, filters={"department": "Computing", "year": 2023})
+    assert set(ids[0][ids[0] >= 0]) <= set(range(30, 600, 30)) and (ids[0] >= 0).sum() == 5
+
+    path = str(tmp_path / "store")
+    store.save(path)
+    store.add_documents([{**make_documents(1, seed=9)[0], "department": "Computing", "year": 2026}])
+    store.flush(path)
+    loaded = VectorStore.load(path)
+    assert len(loaded.metadata) == 601
+    assert [doc["id"] for doc in loaded.search(query, k=5, filters={"year": 2026})] == [600]
+
+    loaded.vacuum()
+    assert [doc["text"] for doc in loaded.search(query, k=5, filters={"year": 2026})] == ["chunk 0"]